@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+EBCDIC transcoding micro-benchmark
+Compares per-record cp037 codec calls with the table-driven ebcdic module
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / 'build_system'))
+
+from ebcdic import decode_records, encode_records, iter_records
+
+LRECL = 80
+
+
+def sample_records(count: int, seed: int):
+    """GAMESTAT-like text records of varying length"""
+    rng = random.Random(seed)
+    kinds = ('STATE   ', 'PLAYER  ', 'AMMO    ', 'ENEMY   ', 'COMMAND ')
+    return [
+        rng.choice(kinds) + ''.join(rng.choice('0123456789+- ') for _ in range(rng.randint(10, 60)))
+        for _ in range(count)
+    ]
+
+
+def per_record_encode(records):
+    return b''.join([record.ljust(LRECL).encode('cp037') for record in records])
+
+
+def per_record_decode(data):
+    return [data[i:i + LRECL].decode('cp037') for i in range(0, len(data), LRECL)]
+
+
+def per_record_iterate(data):
+    return sum(len(data[i:i + LRECL]) for i in range(0, len(data), LRECL))
+
+
+def table_iterate(data):
+    return sum(len(record) for record in iter_records(data, LRECL))
+
+
+def measure(func, arg, repeat: int, number: int) -> float:
+    """Best microseconds per call"""
+    return min(timeit.repeat(lambda: func(arg), repeat=repeat, number=number)) / number * 1e6
+
+
+def run_benchmark(records: int, repeat: int, seed: int):
+    text = sample_records(records, seed)
+    data = per_record_encode(text)
+
+    # Both paths must produce identical datasets
+    assert encode_records(text, LRECL) == data
+    assert decode_records(data, LRECL) == per_record_decode(data)
+
+    number = max(1, 20000 // records)
+    results = {'records': records, 'bytes': len(data)}
+    for name, old, new, arg in (
+        ('encode', per_record_encode, lambda r: encode_records(r, LRECL), text),
+        ('decode', per_record_decode, lambda d: decode_records(d, LRECL), data),
+        ('iterate', per_record_iterate, table_iterate, data),
+    ):
+        old_us = measure(old, arg, repeat, number)
+        new_us = measure(new, arg, repeat, number)
+        results[name] = {
+            'per_record_us': round(old_us, 1),
+            'table_us': round(new_us, 1),
+            'speedup': round(old_us / new_us, 2) if new_us else None,
+            'table_mb_per_s': round(len(data) / new_us, 1) if new_us else None,
+        }
+    return results
+
+
+def main():
+    """Run the benchmark and print JSON results"""
+    parser = argparse.ArgumentParser(description='EBCDIC transcoding micro-benchmark')
+    parser.add_argument('--records', type=int, nargs='+', default=[19, 1000, 100000],
+                        help='Dataset sizes in records (19 is one GAMESTAT state)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is kept)')
+    parser.add_argument('--seed', type=int, default=1993, help='Random seed for sample records')
+    args = parser.parse_args()
+
+    print(json.dumps([run_benchmark(n, args.repeat, args.seed) for n in args.records], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+GAMESTAT layout benchmark
+Compares dataset size and encode/decode time of the zoned decimal
+(DOOMSTAT.CPY) and compact COMP/COMP-3 (DOOMSTAC.CPY) record layouts
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / 'build_system'))
+
+from ebcdic import to_ascii, to_ebcdic
+from gamestat_records import LAYOUTS, MAX_ENTITIES, gamestat_codec, iter_states
+from record_formats import reblock
+
+
+def sample_states(count: int, seed: int):
+    """(row, enemies) states shaped like a capture's"""
+    rng = random.Random(seed)
+    states = []
+    for tick in range(count):
+        row = (tick, 1, 1700000000.0 + tick / 35,
+               rng.randint(-2048, 2048) << 16, rng.randint(-2048, 2048) << 16, 0,
+               rng.randint(0, 0xFFFFFFFF), rng.randint(-20, 200), rng.randint(0, 200),
+               rng.randint(0, 200), rng.randint(0, 50), rng.randint(0, 300), rng.randint(0, 50),
+               rng.randint(0, 7))
+        enemies = [(rng.randint(1, 9), rng.randint(0, 400), rng.randint(-2048, 2048) << 16,
+                    rng.randint(-2048, 2048) << 16, rng.randint(0, 4096) << 16)
+                   for _ in range(rng.randint(0, MAX_ENTITIES))]
+        states.append((row, enemies))
+    return states
+
+
+def encode(codec, states) -> bytes:
+    """An EBCDIC FB dataset of the states, as the converter writes it"""
+    data = codec.encode_states(states)
+    return bytes(data) if codec.binary else to_ebcdic(data)
+
+
+def decode(codec, data: bytes):
+    """Every column of an EBCDIC FB dataset"""
+    return codec.decode_dataset(data if codec.binary else to_ascii(data))
+
+
+def measure(func, repeat: int, number: int) -> float:
+    """Best milliseconds per call"""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number * 1e3
+
+
+def run_benchmark(states, repeat: int):
+    records = None
+    results = {'states': len(states)}
+    for layout in sorted(LAYOUTS):
+        codec = gamestat_codec(layout)
+        data = encode(codec, states)
+        records = len(data) // codec.lrecl
+        number = max(1, 20000 // records)
+        results[layout] = {
+            'lrecl': codec.lrecl,
+            'fb_bytes': len(data),
+            'vb_bytes': len(reblock(data, 'VB', codec.lrecl, 27998, codec.fill)),
+            'encode_ms': round(measure(lambda: encode(codec, states), repeat, number), 2),
+            'decode_ms': round(measure(lambda: decode(codec, data), repeat, number), 2),
+        }
+    results['records'] = records
+    display, compact = results['display'], results['compact']
+    results['compact_vs_display'] = {
+        key: round(compact[key] / display[key], 3) if display[key] else None
+        for key in ('fb_bytes', 'vb_bytes', 'encode_ms', 'decode_ms')
+    }
+    return results
+
+
+def main():
+    """Run the benchmark and print JSON results"""
+    parser = argparse.ArgumentParser(description='GAMESTAT record layout benchmark')
+    parser.add_argument('--states', type=int, nargs='+', default=[1, 1000, 20000],
+                        help='Synthetic dataset sizes in states')
+    parser.add_argument('--db', help='Benchmark the states of a capture database instead')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is kept)')
+    parser.add_argument('--seed', type=int, default=1993, help='Random seed for sample states')
+    args = parser.parse_args()
+
+    if args.db:
+        samples = [list(iter_states(sqlite3.connect(args.db)))]
+    else:
+        samples = [sample_states(n, args.seed) for n in args.states]
+    print(json.dumps([run_benchmark(states, args.repeat) for states in samples], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+End-to-end ingest benchmark
+Simulates N DOOM players on UDP and measures the SQLite capture and AI bridges
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import logging
+from pathlib import Path
+
+from simulate_doom_udp import build_state_packet
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / 'build_system'))
+
+from state_hub import StateIngestHub
+from doom_state_sqlite import DoomStateSQLite
+
+ENEMY_TYPES = [1, 2, 4, 9]  # imp, demon, zombie, etc
+
+TARGETS = ('sqlite', 'cobol-bridge', 'doom-bridge')
+
+
+class SimulatedPlayer:
+    """One DOOM instance with its own socket and a deterministic random walk"""
+
+    def __init__(self, index: int, seed: int, enemies: int):
+        self.index = index
+        self.rng = random.Random(seed + index)
+        self.enemies = enemies
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.tick = 0
+        self.health = 100
+        self.armor = 50
+        self.x = (1000 + self.rng.randint(-500, 500)) << 16
+        self.y = (1000 + self.rng.randint(-500, 500)) << 16
+        self.angle = 0
+        self.sent = 0
+
+    def next_packet(self) -> bytes:
+        """Advance one tick and build its state packet"""
+        rng = self.rng
+        self.tick += 1
+        self.x += rng.randint(-10, 10) << 16
+        self.y += rng.randint(-10, 10) << 16
+        self.angle = (self.angle + rng.randint(-0x1000000, 0x1000000)) & 0x7FFFFFFF
+
+        if rng.random() < 0.05:
+            self.health = max(0, self.health - rng.randint(5, 20))
+        if self.health == 0 and rng.random() < 0.1:
+            self.health = 100
+
+        enemies = [
+            (
+                rng.choice(ENEMY_TYPES),
+                rng.randint(20, 100),
+                self.x + (rng.randint(-100, 100) << 16),
+                self.y + (rng.randint(-100, 100) << 16),
+                rng.randint(100, 500) << 16
+            )
+            for _ in range(self.enemies)
+        ]
+
+        return build_state_packet(
+            self.tick, self.health, self.armor, self.x, self.y, 0,
+            self.angle, level=1,
+            kills=rng.randint(0, 10), items=rng.randint(0, 5),
+            secrets=rng.randint(0, 2), enemy_count=self.enemies,
+            enemies=enemies
+        )
+
+    def close(self):
+        self.socket.close()
+
+
+class LoadGenerator:
+    """Sends one packet per player per tick at a fixed tick rate"""
+
+    def __init__(self, port: int, players: int, tick_rate: float,
+                 enemies: int, seed: int, host: str = '127.0.0.1'):
+        self.address = (host, port)
+        self.tick_rate = tick_rate
+        self.players = [SimulatedPlayer(i, seed, enemies) for i in range(players)]
+        self.late_ticks = 0
+
+    def run(self, duration: float) -> dict:
+        """Send for `duration` seconds and return what was sent"""
+        interval = 1.0 / self.tick_rate
+        start = time.perf_counter()
+        deadline = start
+        end = start + duration
+
+        while deadline < end:
+            for player in self.players:
+                player.socket.sendto(player.next_packet(), self.address)
+                player.sent += 1
+
+            deadline += interval
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                self.late_ticks += 1
+
+        elapsed = time.perf_counter() - start
+        sent = sum(p.sent for p in self.players)
+        return {
+            'packets_sent': sent,
+            'send_seconds': elapsed,
+            'send_rate': sent / elapsed if elapsed > 0 else 0.0,
+            'late_ticks': self.late_ticks
+        }
+
+    def close(self):
+        for player in self.players:
+            player.close()
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile, 0.0 for no samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples) -> dict:
+    """p50/p99/max in milliseconds"""
+    samples = list(samples)
+    return {
+        'samples': len(samples),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3) if samples else 0.0
+    }
+
+
+def bridge_results(mailbox) -> dict:
+    """Decision metrics shared by both bridges"""
+    metrics = mailbox.get_metrics()
+    return {
+        'decisions': metrics['decisions'],
+        'superseded': metrics['superseded'],
+        'staleness_avg_ticks': round(metrics['staleness_avg'], 3),
+        'staleness_max_ticks': metrics['staleness_max'],
+        'receive_to_decision': latency_summary(mailbox.decision_latency_ms)
+    }
+
+
+def run_benchmark(args) -> dict:
+    """Start the hub and targets, drive load, collect results"""
+    hub = StateIngestHub(host='127.0.0.1', port=args.port, rcvbuf=args.rcvbuf)
+    hub.start()
+
+    capture = None
+    cobol_bridge = None
+    doom_bridge = None
+    tmpdir = None
+    running = []  # stop callables for whatever has been started
+
+    try:
+        if 'sqlite' in args.targets:
+            db_path = args.db
+            if not db_path:
+                tmpdir = tempfile.TemporaryDirectory(prefix='doom-bench-')
+                db_path = os.path.join(tmpdir.name, 'bench.db')
+            capture = DoomStateSQLite(
+                db_path, args.port,
+                batch_size=args.batch_size, batch_ms=args.batch_ms,
+                journal_mode=args.journal_mode, synchronous=args.synchronous,
+                per_source_sessions=True, cobol_records=args.cobol_records,
+                enemy_storage=args.enemy_storage
+            )
+            capture.start_capture(hub=hub)
+            running.append(capture.stop_capture)
+
+        if 'cobol-bridge' in args.targets or 'doom-bridge' in args.targets:
+            sys.path.insert(0, str(ROOT))
+
+        if 'cobol-bridge' in args.targets:
+            from bridge.state_receiver import COBOLBridge
+            cobol_bridge = COBOLBridge(hub=hub, min_interval=args.decision_interval)
+            cobol_bridge.send_command = lambda command: None  # no COBOL interface in the loop
+            cobol_bridge.start()
+            running.append(cobol_bridge.stop)
+
+        if 'doom-bridge' in args.targets:
+            from bridge.integration_bridge import DoomCOBOLBridge
+            doom_bridge = DoomCOBOLBridge(hub=hub)
+            doom_bridge.start()
+            running.append(doom_bridge.stop)
+
+        generator = LoadGenerator(args.port, args.players, args.tick_rate, args.enemies, args.seed)
+        try:
+            sent = generator.run(args.duration)
+        finally:
+            generator.close()
+
+        # Let subscribers drain before stopping anything
+        drain_deadline = time.time() + args.drain
+        while time.time() < drain_deadline:
+            subscribers = hub.get_stats()['subscribers'].values()
+            if all(sub['depth'] == 0 for sub in subscribers):
+                break
+            time.sleep(0.05)
+
+        hub_stats = hub.get_stats()
+        results = {
+            'config': {
+                'players': args.players,
+                'tick_rate': args.tick_rate,
+                'enemies': args.enemies,
+                'duration': args.duration,
+                'seed': args.seed,
+                'targets': list(args.targets),
+                'batch_size': args.batch_size,
+                'batch_ms': args.batch_ms,
+                'journal_mode': args.journal_mode,
+                'synchronous': args.synchronous,
+                'cobol_records': args.cobol_records,
+                'enemy_storage': args.enemy_storage
+            },
+            'load': sent,
+            'hub': {
+                'packets_received': hub_stats['hub']['packets_received'],
+                'packets_invalid': hub_stats['hub']['packets_invalid'],
+                'socket_loss': sent['packets_sent'] - hub_stats['hub']['packets_received'],
+                'subscribers': {
+                    name: {k: sub[k] for k in ('delivered', 'dropped', 'max_depth')}
+                    for name, sub in hub_stats['subscribers'].items()
+                }
+            }
+        }
+
+        # Stop in start order so the capture drains its writer first
+        while running:
+            running.pop(0)()
+        finished = time.time()
+
+        if capture:
+            writer = capture.writer.stats
+            sequence = capture.sequencer.get_metrics()
+            written = writer['packets_written']
+            elapsed = finished - capture.stats['start_time']
+            results['sqlite'] = {
+                'packets_written': written,
+                'packets_dropped': writer['packets_dropped'],
+                'packets_lost': sent['packets_sent'] - written,
+                'loss_rate': round(1 - written / sent['packets_sent'], 6) if sent['packets_sent'] else 0.0,
+                'sustained_pps': round(written / elapsed, 1) if elapsed > 0 else 0.0,
+                'missing_ticks': sequence['missing_ticks'],
+                'duplicates': sequence['duplicates'],
+                'reordered': sequence['reordered'],
+                'batches': writer['batches'],
+                'batch_size_avg': round(writer['batch_size_avg'], 2),
+                'commit_ms_avg': round(writer['commit_ms_avg'], 3),
+                'commit_ms_max': round(writer['commit_ms_max'], 3),
+                'receive_to_commit': latency_summary(capture.writer.commit_latency_ms)
+            }
+
+        if cobol_bridge:
+            results['cobol_bridge'] = bridge_results(cobol_bridge.mailbox)
+
+        if doom_bridge:
+            results['doom_bridge'] = bridge_results(doom_bridge.mailbox)
+
+        return results
+
+    finally:
+        for stop in running:
+            stop()
+        hub.stop()
+        if tmpdir:
+            tmpdir.cleanup()
+
+
+def main():
+    """Run the benchmark and print JSON results"""
+    parser = argparse.ArgumentParser(description='DOOM state ingest benchmark')
+    parser.add_argument('--players', type=int, default=4, help='Simulated DOOM instances')
+    parser.add_argument('--tick-rate', type=float, default=35, help='Packets per second per player')
+    parser.add_argument('--enemies', type=int, default=2, choices=range(0, 17), metavar='0-16',
+                        help='Enemies per packet')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load')
+    parser.add_argument('--seed', type=int, default=1993, help='Base random seed (player i uses seed+i)')
+    parser.add_argument('--port', type=int, default=41337, help='UDP port for the benchmark hub')
+    parser.add_argument('--rcvbuf', type=int, default=None, help='Hub socket receive buffer size')
+    parser.add_argument('--targets', default='sqlite,cobol-bridge',
+                        help=f"Comma-separated targets: {', '.join(TARGETS)}")
+    parser.add_argument('--db', default=None, help='SQLite path (default: temporary file)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Commit every N packets')
+    parser.add_argument('--batch-ms', type=float, default=50, help='Commit every T milliseconds')
+    parser.add_argument('--journal-mode', default='WAL', help='SQLite journal_mode')
+    parser.add_argument('--synchronous', default='NORMAL', help='SQLite synchronous')
+    parser.add_argument('--cobol-records', choices=('table', 'view'), default='table',
+                        help='Materialize cobol_state rows or format them on read')
+    parser.add_argument('--enemy-storage', choices=('rows', 'packed'), default='rows',
+                        help='One enemies row per enemy or one packed BLOB per state')
+    parser.add_argument('--decision-interval', type=float, default=0.2,
+                        help='COBOLBridge minimum seconds between decisions')
+    parser.add_argument('--drain', type=float, default=5, help='Max seconds to wait for consumers to drain')
+    parser.add_argument('--output', help='Write JSON results here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='Keep component logging')
+
+    args = parser.parse_args()
+    args.targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    for target in args.targets:
+        if target not in TARGETS:
+            parser.error(f"Unknown target: {target}")
+
+    # Per-state INFO logging from the bridges would dominate the run
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    results = run_benchmark(args)
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
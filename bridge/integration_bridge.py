@@ -13,6 +13,7 @@ from typing import Optional
 from dataclasses import dataclass
 from bridge.state_receiver import DoomStateReceiver, DoomState
 from bridge.doom_network_controller import DoomNetworkController
+from state_mailbox import LatestStateMailbox  # build_system/, on sys.path via state_receiver
 
 logging.basicConfig(
     level=logging.INFO,
@@ -105,11 +106,12 @@ class DoomCOBOLBridge:
     Main bridge connecting all components
     """
     
-    def __init__(self):
+    def __init__(self, hub=None):
         self.running = False
-        self.state_receiver = DoomStateReceiver()
+        self.state_receiver = DoomStateReceiver(hub=hub, name='doom-cobol-bridge')
         self.controller = DoomNetworkController()
         self.ai_logic = COBOLAILogic()
+        self.mailbox = LatestStateMailbox()
         self.command_queue = []
         self.stats = {
             'states_received': 0,
@@ -124,6 +126,10 @@ class DoomCOBOLBridge:
         # Start state receiver
         self.state_receiver.start(callback=self.on_state_received)
         
+        # Start decision loop
+        decision_thread = threading.Thread(target=self._decision_loop, daemon=True)
+        decision_thread.start()
+        
         # Start command processor
         cmd_thread = threading.Thread(target=self._process_commands, daemon=True)
         cmd_thread.start()
@@ -139,12 +145,30 @@ class DoomCOBOLBridge:
         """Called when new game state is received"""
         self.stats['states_received'] += 1
         
-        # Make AI decision
-        commands = self.ai_logic.make_decision(state)
+        # Only the newest state per DOOM instance is kept for the AI
+        self.mailbox.post(state.source, state, state.tick)
         
-        # Queue commands
-        for cmd in commands:
-            self.command_queue.append(cmd)
+    def _decision_loop(self):
+        """Decide on the freshest state once the previous commands are sent"""
+        while self.running:
+            if self.command_queue:
+                time.sleep(0.01)
+                continue
+                
+            item = self.mailbox.take(timeout=0.1)
+            if not item:
+                continue
+                
+            key, state, tick = item
+            
+            # Make AI decision
+            commands = self.ai_logic.make_decision(state)
+            
+            # Queue commands
+            for cmd in commands:
+                self.command_queue.append(cmd)
+                
+            self.mailbox.record_decision(key, tick, state.received_at)
             
     def _process_commands(self):
         """Process queued commands"""
@@ -180,10 +204,13 @@ class DoomCOBOLBridge:
             time.sleep(10)
             self.stats['cycles'] += 1
             
+            mailbox = self.mailbox.get_metrics()
             logger.info(
                 f"Stats - Cycles: {self.stats['cycles']}, "
                 f"States: {self.stats['states_received']}, "
-                f"Commands: {self.stats['commands_sent']}"
+                f"Commands: {self.stats['commands_sent']}, "
+                f"Superseded: {mailbox['superseded']}, "
+                f"Staleness: {mailbox['staleness_avg']:.1f} avg/{mailbox['staleness_max']} max ticks"
             )
             
             # Show current state
@@ -4,11 +4,22 @@ MVS Connector Module
 Handles FTP communication with z/OS
 """
 
+import sys
 import ftplib
 import logging
+from pathlib import Path
 from typing import List
 from dataclasses import dataclass
 
+# DOOM.STATE records come from the DOOMSTAT.CPY codec in build_system;
+# an image built from this directory alone falls back to fixed offsets
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from gamestat_records import encode_summary
+    GAMESTAT_CODEC_AVAILABLE = True
+except ImportError:
+    GAMESTAT_CODEC_AVAILABLE = False
+
 
 @dataclass
 class DoomCommand:
@@ -55,7 +66,14 @@ class MVSConnector:
             self.logger.error(f"Failed to upload game state: {e}")
             
     def _format_state_record(self, state):
-        """Format game state as COBOL-readable 80-byte record"""
+        """Format game state as COBOL-readable 80-byte record (DOOM-STATE-SUMMARY)"""
+        if GAMESTAT_CODEC_AVAILABLE:
+            return encode_summary(
+                state.tick, state.player_x, state.player_y, state.player_z,
+                state.player_angle, state.health, state.armor, state.ammo,
+                state.current_weapon, state.level
+            ).encode('cp037')  # EBCDIC
+            
         # Create fixed-width record
         record = (
             f"{state.tick:09d}"
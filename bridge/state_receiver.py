@@ -3,15 +3,22 @@
 Receive state from modified DOOM and bridge to COBOL
 """
 
+import sys
 import socket
-import struct
 import time
 import threading
 import logging
 import subprocess
+from pathlib import Path
 from dataclasses import dataclass
 from typing import List, Optional
 
+# Packet codec is shared with the SQLite capture in build_system/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'build_system'))
+from doom_state_codec import parse_state, MIN_PACKET_SIZE
+from state_mailbox import LatestStateMailbox
+from tick_sequencer import SequenceTracker
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -31,13 +38,18 @@ class DoomState:
     level: int
     enemy_count: int
     enemies: List[dict]
+    source: Optional[tuple] = None  # (host, port) of the sending DOOM instance
+    received_at: Optional[float] = None  # time.time() when the packet arrived
 
 
 class DoomStateReceiver:
     """Receives state from modified DOOM"""
     
-    def __init__(self, port=31337):
+    def __init__(self, port=31337, hub=None, name='receiver', jitter_window=4):
         self.port = port
+        self.hub = hub
+        self.name = name
+        self.sequencer = SequenceTracker(jitter_window)
         self.socket = None
         self.running = False
         self.last_state = None
@@ -48,6 +60,13 @@ class DoomStateReceiver:
         self.state_callback = callback
         self.running = True
         
+        if self.hub:
+            # Shared port: callbacks are cheap, so take the full stream and
+            # let the sequencer see every tick
+            self.hub.subscribe(self.name, self._on_hub_packet, maxsize=256)
+            logger.info(f"State receiver {self.name} subscribed to ingest hub")
+            return
+            
         # Create UDP socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.bind(('0.0.0.0', self.port))
@@ -64,72 +83,71 @@ class DoomStateReceiver:
         while self.running:
             try:
                 data, addr = self.socket.recvfrom(4096)
+                received_at = time.time()
                 state = self._parse_state(data)
                 if state:
-                    self.last_state = state
-                    if self.state_callback:
-                        self.state_callback(state)
+                    state.source = addr
+                    state.received_at = received_at
+                    self._deliver(self.sequencer.push(addr, state.tick, state))
                         
             except socket.timeout:
+                self._deliver(self.sequencer.expire())
                 continue
             except Exception as e:
                 logger.error(f"Receive error: {e}")
                 
+    def _on_hub_packet(self, packet):
+        """Receive an already-decoded packet from the ingest hub"""
+        state = self._to_doom_state(packet.state)
+        state.source = packet.source
+        state.received_at = packet.received_at
+        self._deliver(self.sequencer.push(packet.source, state.tick, state))
+        self._deliver(self.sequencer.expire())
+        
+    def _deliver(self, states: List[DoomState]):
+        """Hand in-order states to the callback"""
+        for state in states:
+            self.last_state = state
+            if self.state_callback:
+                self.state_callback(state)
+            
     def _parse_state(self, data: bytes) -> Optional[DoomState]:
         """Parse binary state packet"""
-        if len(data) < 88:  # Minimum size
+        if len(data) < MIN_PACKET_SIZE:
             return None
             
         try:
-            # Unpack header
-            magic, version, tick = struct.unpack('<III', data[0:12])
-            if magic != 0x4D4F4F44:  # 'DOOM'
-                return None
-                
-            # Player state
-            (health, armor, 
-             ammo0, ammo1, ammo2, ammo3,
-             weapon, x, y, z, angle, momx, momy,
-             level, kills, items, secrets,
-             enemy_count) = struct.unpack('<18i', data[12:84])
-            
-            # Parse enemies
-            enemies = []
-            offset = 88
-            for i in range(min(enemy_count, 16)):
-                if offset + 20 <= len(data):
-                    enemy_data = struct.unpack('<5i', data[offset:offset+20])
-                    enemies.append({
-                        'type': enemy_data[0],
-                        'health': enemy_data[1],
-                        'x': enemy_data[2],
-                        'y': enemy_data[3],
-                        'distance': enemy_data[4]
-                    })
-                    offset += 20
-                    
-            return DoomState(
-                tick=tick,
-                health=health,
-                armor=armor,
-                ammo=[ammo0, ammo1, ammo2, ammo3],
-                weapon=weapon,
-                x=x,
-                y=y,
-                z=z,
-                angle=angle,
-                level=level,
-                enemy_count=enemy_count,
-                enemies=enemies
-            )
-            
+            state = parse_state(data)
+        except ValueError:
+            return None
         except Exception as e:
             logger.error(f"Parse error: {e}")
             return None
             
+        return self._to_doom_state(state)
+        
+    def _to_doom_state(self, state: dict) -> DoomState:
+        """Build a DoomState from a decoded state dict"""
+        return DoomState(
+            tick=state['tick'],
+            health=state['health'],
+            armor=state['armor'],
+            ammo=state['ammo'],
+            weapon=state['weapon'],
+            x=state['x'],
+            y=state['y'],
+            z=state['z'],
+            angle=state['angle'],
+            level=state['level'],
+            enemy_count=state['enemy_count'],
+            enemies=state['enemies']
+        )
+            
     def stop(self):
         """Stop receiver"""
         self.running = False
+        if self.hub:
+            self.hub.unsubscribe(self.name)
         if self.socket:
             self.socket.close()
 
@@ -137,24 +155,57 @@ class DoomStateReceiver:
 class COBOLBridge:
     """Bridge between DOOM state and COBOL AI"""
     
-    def __init__(self):
-        self.receiver = DoomStateReceiver()
+    def __init__(self, hub=None, min_interval=0.2):
+        self.receiver = DoomStateReceiver(hub=hub, name='cobol-bridge')
+        self.mailbox = LatestStateMailbox()
+        self.min_interval = min_interval  # 5Hz max
         self.last_command_time = 0
+        self.running = False
         
     def start(self):
         """Start the bridge"""
-        self.receiver.start(callback=self.process_state)
+        self.running = True
+        
+        # Decisions run at their own pace, off the receive thread
+        decision_thread = threading.Thread(target=self._decision_loop, daemon=True)
+        decision_thread.start()
+        
+        self.receiver.start(callback=self.on_state_received)
         logger.info("COBOL Bridge started")
         
+    def stop(self):
+        """Stop the bridge"""
+        self.running = False
+        self.receiver.stop()
+        
+    def on_state_received(self, state: DoomState):
+        """Receiver callback: only post, never block the socket"""
+        self.mailbox.post(state.source, state, state.tick)
+        
+    def _decision_loop(self):
+        """Pull the newest state whenever the AI is ready for one"""
+        while self.running:
+            # Rate limit commands
+            wait = self.min_interval - (time.time() - self.last_command_time)
+            if wait > 0:
+                time.sleep(wait)
+                
+            item = self.mailbox.take(timeout=0.5)
+            if not item:
+                continue
+                
+            key, state, tick = item
+            self.last_command_time = time.time()
+            
+            try:
+                self.process_state(state)
+            except Exception as e:
+                logger.error(f"Decision failed: {e}")
+                
+            self.mailbox.record_decision(key, tick, state.received_at)
+            
     def process_state(self, state: DoomState):
         """Process state with AI logic"""
-        # Rate limit commands
-        now = time.time()
-        if now - self.last_command_time < 0.2:  # 5Hz max
-            return
-            
-        self.last_command_time = now
-        
         # Log state
         logger.info(f"State: Health={state.health}, Enemies={state.enemy_count}, "
                    f"Ammo={state.ammo[0]}, Pos=({state.x>>16},{state.y>>16})")
@@ -241,13 +292,16 @@ def main():
             time.sleep(1)
             state = bridge.receiver.last_state
             if state:
-                print(f"Latest: Health={state.health}, Level=E{1}M{state.level}")
+                metrics = bridge.mailbox.get_metrics()
+                print(f"Latest: Health={state.health}, Level=E{1}M{state.level}, "
+                      f"Superseded={metrics['superseded']}, "
+                      f"Staleness={metrics['staleness_last']} ticks (max {metrics['staleness_max']})")
             else:
                 print("Waiting for state data...")
                 
     except KeyboardInterrupt:
         print("\nShutting down...")
-        bridge.receiver.stop()
+        bridge.stop()
 
 
 if __name__ == "__main__":
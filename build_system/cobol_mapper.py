@@ -5,11 +5,16 @@ Reads from SQLite and writes proper COBOL datasets
 """
 
 import sqlite3
-import struct
 import os
 import logging
 from typing import List, Dict, Any
-from datetime import datetime
+
+from doom_state_codec import iter_enemies
+from enemy_storage import has_packed_enemies
+from gamestat_records import DISPLAY_LAYOUT, LAYOUTS, gamestat_codec, iter_states
+from dataset_catalog import LINE_SEQUENTIAL, dataset_catalog
+from ebcdic import to_ebcdic
+from record_formats import dataset_lrecl, reblock
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,149 +23,100 @@ logger = logging.getLogger(__name__)
 class COBOLMapper:
     """Maps game state to COBOL data structures"""
     
-    def __init__(self, db_path="doom_state.db"):
+    def __init__(self, db_path="doom_state.db", recfm=LINE_SEQUENTIAL, blksize=3200,
+                 layout=DISPLAY_LAYOUT):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
+        self.enemy_column = 'enemy_data' if has_packed_enemies(self.conn) else 'NULL'
+        # A compacted idle run stands for its states up to tick_last, so
+        # the newest of them is the run's last tick and time
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(game_state)')}
+        self.run_end = (('COALESCE(tick_last, tick)', 'COALESCE(timestamp_last, timestamp)')
+                        if 'tick_last' in columns else ('tick', 'timestamp'))
         self.datasets_dir = "cobol_datasets"
         os.makedirs(self.datasets_dir, exist_ok=True)
+        # GAMESTAT datasets are newline-terminated text for GnuCOBOL, or
+        # EBCDIC FB/VB datasets ready to ship (VB drops trailing blanks).
+        # The compact layout's binary records only go in FB/VB datasets.
+        if layout != DISPLAY_LAYOUT and recfm == LINE_SEQUENTIAL:
+            raise ValueError(f"The {layout} GAMESTAT layout needs RECFM=FB or VB")
+        self.recfm = recfm
+        self.blksize = blksize
+        self.layout = layout
+        self.gamestat = gamestat_codec(layout)
+        
+    def publish_dataset(self, name: str, data: bytes):
+        """Publish a GAMESTAT dataset through the process-wide catalog of
+        the datasets directory (shared with the command monitor)"""
+        catalog = dataset_catalog(self.datasets_dir)
+        catalog.define(name, recfm=self.recfm, lrecl=dataset_lrecl(self.recfm, self.gamestat.lrecl),
+                       blksize=self.blksize, layout=self.layout)
+        return catalog.publish(name, data)
+        
+    def publish_gamestat(self, name: str, states) -> int:
+        """Publish (row, enemies) states as a GAMESTAT dataset in the
+        mapper's layout and record format; returns the record count"""
+        terminator = '\n' if self.recfm == LINE_SEQUENTIAL else ''
+        data = self.gamestat.encode_states(states, terminator=terminator)
+        lrecl = self.gamestat.lrecl
+        records = len(data) // (lrecl + len(terminator))
+        if not terminator:
+            if not self.gamestat.binary:
+                data = to_ebcdic(data)
+            data = reblock(data, self.recfm, lrecl, self.blksize, self.gamestat.fill)
+        self.publish_dataset(name, data)
+        return records
         
-    def map_state_to_cobol(self, state_id: int) -> Dict[str, str]:
-        """Map a game state to COBOL records"""
+    def fetch_state(self, state_id: int):
+        """(row, enemies) of one state, as iter_states() yields them (None if missing)"""
         cursor = self.conn.cursor()
         
         # Get main state
-        cursor.execute('''
-            SELECT tick, level, health, armor, x, y, z, angle,
+        tick, timestamp = self.run_end
+        cursor.execute(f'''
+            SELECT {tick}, level, health, armor, x, y, z, angle,
                    ammo_bullets, ammo_shells, ammo_cells, ammo_rockets,
-                   weapon, enemy_count, timestamp
+                   weapon, enemy_count, {timestamp}, {self.enemy_column}
             FROM game_state WHERE id = ?
         ''', (state_id,))
         
         row = cursor.fetchone()
         if not row:
-            return {}
+            return None
             
         (tick, level, health, armor, x, y, z, angle,
-         bullets, shells, cells, rockets, weapon, enemy_count, timestamp) = row
-        
-        records = {}
-        
-        # STATE-HEADER record (80 bytes)
-        state_header = self._format_state_header(tick, level, timestamp)
-        records['STATE'] = state_header
-        
-        # PLAYER-RECORD (80 bytes)
-        player_record = self._format_player_record(x, y, z, angle, health, armor)
-        records['PLAYER'] = player_record
-        
-        # AMMUNITION-RECORD (80 bytes)
-        ammo_record = self._format_ammo_record(bullets, shells, cells, rockets, weapon)
-        records['AMMO'] = ammo_record
-        
-        # ENTITY records
-        cursor.execute('''
-            SELECT enemy_index, type, health, x, y, distance
-            FROM enemies WHERE state_id = ?
-            ORDER BY enemy_index
-        ''', (state_id,))
-        
-        enemies = cursor.fetchall()
-        entity_records = []
-        
-        for idx, (_, etype, ehealth, ex, ey, distance) in enumerate(enemies[:16]):
-            entity_rec = self._format_entity_record(idx, etype, ehealth, ex, ey, distance)
-            entity_records.append(entity_rec)
+         bullets, shells, cells, rockets, weapon, enemy_count, timestamp, enemy_data) = row
+        
+        # ENTITY records (packed states carry them in the same row)
+        if enemy_data is not None:
+            enemies = list(iter_enemies(enemy_data))
+        else:
+            cursor.execute('''
+                SELECT type, health, x, y, distance
+                FROM enemies WHERE state_id = ?
+                ORDER BY enemy_index
+            ''', (state_id,))
+            enemies = cursor.fetchall()
             
-        records['ENTITIES'] = entity_records
+        row = (tick, level, timestamp, x, y, z, angle, health, armor,
+               bullets, shells, cells, rockets, weapon)
+        return row, enemies
+        
+    def map_state_to_cobol(self, state_id: int) -> Dict[str, Any]:
+        """Map a game state to COBOL records (in the mapper's layout)"""
+        state = self.fetch_state(state_id)
+        if not state:
+            return {}
+            
+        records = {'ENTITIES': []}
+        for record_type, record in self.gamestat.records(*state):
+            if record_type == 'ENEMY':
+                records['ENTITIES'].append(record)
+            else:
+                records[record_type] = record
         
         return records
         
-    def _format_state_header(self, tick: int, level: int, timestamp: float) -> str:
-        """Format STATE-HEADER record"""
-        # Convert timestamp to YYYYMMDD
-        dt = datetime.fromtimestamp(timestamp)
-        date_str = dt.strftime('%Y%m%d')
-        
-        record = (
-            f"{'STATE   ':<8}"       # STATE-RECORD-TYPE
-            f"{tick:08d}"            # STATE-TICK
-            f"{level:02d}"           # STATE-LEVEL
-            f"{date_str:>8}"         # STATE-TIMESTAMP
-            f"{' ' * 52}"            # FILLER
-        )
-        
-        assert len(record) == 80, f"STATE record wrong length: {len(record)}"
-        return record
-        
-    def _format_player_record(self, x: int, y: int, z: int, angle: int, health: int, armor: int) -> str:
-        """Format PLAYER-RECORD"""
-        # Convert fixed point to map units
-        map_x = x >> 16
-        map_y = y >> 16
-        map_z = z >> 16
-        
-        # Convert angle to degrees
-        degrees = (angle * 360) // 0xFFFFFFFF if angle >= 0 else 0
-        
-        # Determine status
-        status = 'D' if health <= 0 else 'A'
-        
-        record = (
-            f"{'PLAYER  ':<8}"       # PLAYER-RECORD-TYPE
-            f"{map_x:+08d}"          # PLAYER-X
-            f"{map_y:+08d}"          # PLAYER-Y
-            f"{map_z:+08d}"          # PLAYER-Z
-            f"{degrees:+04d}"        # PLAYER-ANGLE
-            f"{health:03d}"          # PLAYER-HEALTH
-            f"{armor:03d}"           # PLAYER-ARMOR
-            f"{status}"              # PLAYER-STATUS
-            f"{' ' * 8}"             # PLAYER-FLAGS
-            f"{' ' * 28}"            # FILLER
-        )
-        
-        assert len(record) == 80, f"PLAYER record wrong length: {len(record)}"
-        return record
-        
-    def _format_ammo_record(self, bullets: int, shells: int, cells: int, rockets: int, weapon: int) -> str:
-        """Format AMMUNITION-RECORD"""
-        record = (
-            f"{'AMMO    ':<8}"      # AMMO-RECORD-TYPE
-            f"{bullets:04d}"         # AMMO-BULLETS
-            f"{shells:04d}"          # AMMO-SHELLS
-            f"{cells:04d}"           # AMMO-CELLS
-            f"{rockets:04d}"         # AMMO-ROCKETS
-            f"{weapon:01d}"          # CURRENT-WEAPON
-            f"{' ' * 55}"            # FILLER
-        )
-        
-        assert len(record) == 80, f"AMMO record wrong length: {len(record)}"
-        return record
-        
-    def _format_entity_record(self, idx: int, etype: int, health: int, x: int, y: int, distance: int) -> str:
-        """Format ENTITY record"""
-        # Convert positions
-        map_x = x >> 16
-        map_y = y >> 16
-        map_dist = distance >> 16
-        
-        # Calculate angle to entity (simplified)
-        angle_to = 0  # Would need player position to calculate properly
-        
-        record = (
-            f"{'ENEMY   ':<8}"       # ENTITY-RECORD-TYPE
-            f"{etype:02d}"           # ENTITY-TYPE
-            f"{health:03d}"          # ENTITY-HEALTH
-            f"{map_x:+08d}"          # ENTITY-X
-            f"{map_y:+08d}"          # ENTITY-Y
-            f"{map_dist:05d}"        # ENTITY-DISTANCE
-            f"{angle_to:+03d}"       # ENTITY-ANGLE-TO
-            f"{' ' * 8}"             # ENTITY-FLAGS
-            f"{' ' * 30}"            # FILLER
-        )
-        
-        assert len(record) == 80, f"ENTITY record wrong length: {len(record)}"
-        return record
-        
     def write_datasets(self, state_id: int):
         """Write COBOL datasets for a game state"""
         records = self.map_state_to_cobol(state_id)
@@ -169,52 +125,62 @@ class COBOLMapper:
             logger.error(f"No state found for ID {state_id}")
             return
             
-        # Write STATE dataset
-        with open(f"{self.datasets_dir}/DOOM.STATE", 'w') as f:
-            f.write(records['STATE'] + '\n')
-            
-        # Write PLAYER dataset
-        with open(f"{self.datasets_dir}/DOOM.PLAYER", 'w') as f:
-            f.write(records['PLAYER'] + '\n')
-            
-        # Write AMMO dataset
-        with open(f"{self.datasets_dir}/DOOM.AMMO", 'w') as f:
-            f.write(records['AMMO'] + '\n')
+        # Write STATE, PLAYER and AMMO datasets
+        for record_type in ('STATE', 'PLAYER', 'AMMO'):
+            self._write_records(f"DOOM.{record_type}", [records[record_type]])
             
         # Write ENTITIES dataset
-        with open(f"{self.datasets_dir}/DOOM.ENTITIES", 'w') as f:
-            for entity in records['ENTITIES']:
-                f.write(entity + '\n')
+        self._write_records("DOOM.ENTITIES", records['ENTITIES'])
                 
         logger.info(f"Wrote COBOL datasets for state {state_id}")
         
+    def _write_records(self, name: str, records: List[Any]):
+        """One line per record, or back-to-back EBCDIC records for binary layouts"""
+        path = f"{self.datasets_dir}/{name}"
+        if self.gamestat.binary:
+            with open(path, 'wb') as f:
+                f.write(b''.join(records))
+        else:
+            with open(path, 'w') as f:
+                for record in records:
+                    f.write(record + '\n')
+        
     def write_gamestat_dataset(self, state_id: int):
         """Write combined GAMESTAT dataset (all records)"""
-        records = self.map_state_to_cobol(state_id)
+        state = self.fetch_state(state_id)
         
-        if not records:
+        if not state:
             return
             
-        with open(f"{self.datasets_dir}/DOOM.GAMESTAT", 'w') as f:
-            f.write(records['STATE'] + '\n')
-            f.write(records['PLAYER'] + '\n')
-            f.write(records['AMMO'] + '\n')
-            for entity in records['ENTITIES']:
-                f.write(entity + '\n')
+        # Published through the catalog: renamed into place, so readers
+        # never see a partial dataset
+        self.publish_gamestat('DOOM.GAMESTAT', [state])
                 
         logger.info(f"Wrote DOOM.GAMESTAT for state {state_id}")
         
+    def write_gamestat_range(self, start_tick=None, end_tick=None, session_id=None,
+                             first_id=None, filename="DOOM.GAMESTAT") -> int:
+        """Write every state in a tick range as one multi-state GAMESTAT dataset
+
+        States are read with one joined query and formatted as they
+        stream in; each starts with its own (tick-tagged) STATE record.
+        The dataset is written in a single call. Returns the record count.
+        """
+        records = self.publish_gamestat(
+            filename, iter_states(self.conn, start_tick, end_tick, session_id, first_id)
+        )
+            
+        logger.info(f"Wrote {filename}: {records} records ({self.layout} layout)")
+        return records
+        
     def process_latest_states(self, count=10):
-        """Process the latest N states"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT id FROM game_state
-            ORDER BY id DESC
-            LIMIT ?
-        ''', (count,))
+        """Write the latest N states as one multi-state DOOM.GAMESTAT"""
+        first_id = self.conn.execute('''
+            SELECT MIN(id) FROM (SELECT id FROM game_state ORDER BY id DESC LIMIT ?)
+        ''', (count,)).fetchone()[0]
         
-        for (state_id,) in cursor.fetchall():
-            self.write_gamestat_dataset(state_id)
+        if first_id is not None:
+            self.write_gamestat_range(first_id=first_id)
             
     def verify_mapping(self):
         """Verify COBOL mapping is correct"""
@@ -227,22 +193,24 @@ class COBOLMapper:
             return
             
         records = self.map_state_to_cobol(test_state_id)
+        lrecl = self.gamestat.lrecl
         
-        # Verify all records are 80 bytes
+        # Verify all records are LRECL bytes
         for rec_type, rec_data in records.items():
             if rec_type == 'ENTITIES':
                 for entity in rec_data:
-                    assert len(entity) == 80, f"Entity record wrong length: {len(entity)}"
+                    assert len(entity) == lrecl, f"Entity record wrong length: {len(entity)}"
             else:
-                assert len(rec_data) == 80, f"{rec_type} record wrong length: {len(rec_data)}"
+                assert len(rec_data) == lrecl, f"{rec_type} record wrong length: {len(rec_data)}"
                 
-        logger.info("✓ All COBOL records are properly formatted (80 bytes)")
+        logger.info(f"✓ All COBOL records are properly formatted ({lrecl} bytes, {self.layout} layout)")
         
-        # Show sample
+        # Show sample (binary records in hex)
+        sample = (lambda record: record[:20].hex()) if self.gamestat.binary else (lambda record: record[:40])
         logger.info("\nSample COBOL records:")
-        logger.info("STATE:  " + records['STATE'][:40] + "...")
-        logger.info("PLAYER: " + records['PLAYER'][:40] + "...")
-        logger.info("AMMO:   " + records['AMMO'][:40] + "...")
+        logger.info("STATE:  " + sample(records['STATE']) + "...")
+        logger.info("PLAYER: " + sample(records['PLAYER']) + "...")
+        logger.info("AMMO:   " + sample(records['AMMO']) + "...")
 
 
 def main():
@@ -254,10 +222,18 @@ def main():
     parser.add_argument('--verify', action='store_true', help='Verify mapping')
     parser.add_argument('--latest', type=int, help='Process latest N states')
     parser.add_argument('--state', type=int, help='Process specific state ID')
+    parser.add_argument('--ticks', type=int, nargs=2, metavar=('START', 'END'),
+                        help='Write all states in a tick range as one dataset')
+    parser.add_argument('--session', type=int, help='Limit --ticks to one session')
+    parser.add_argument('--recfm', choices=[LINE_SEQUENTIAL, 'FB', 'VB'], default=LINE_SEQUENTIAL,
+                        help='GAMESTAT format: LS text, or EBCDIC FB/VB for shipping')
+    parser.add_argument('--blksize', type=int, default=3200, help='FB/VB block size')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default=DISPLAY_LAYOUT,
+                        help='GAMESTAT records: zoned decimal text, or compact COMP/COMP-3 (FB/VB only)')
     
     args = parser.parse_args()
     
-    mapper = COBOLMapper(args.db)
+    mapper = COBOLMapper(args.db, recfm=args.recfm, blksize=args.blksize, layout=args.layout)
     
     if args.verify:
         mapper.verify_mapping()
@@ -269,6 +245,9 @@ def main():
         mapper.write_gamestat_dataset(args.state)
         logger.info(f"\nDatasets written to {mapper.datasets_dir}/")
         
+    if args.ticks:
+        mapper.write_gamestat_range(*args.ticks, session_id=args.session)
+        
     # Show what's available
     cursor = mapper.conn.cursor()
     count = cursor.execute("SELECT COUNT(*) FROM game_state").fetchone()[0]
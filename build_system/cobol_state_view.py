@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+On-demand COBOL records for DOOM state capture
+Replaces the materialized cobol_state table with a view over game_state + enemies
+"""
+
+import logging
+
+from gamestat_records import MAX_ENTITIES, gamestat_codec
+
+logger = logging.getLogger(__name__)
+
+COBOL_MODES = ('table', 'view')
+
+# Where the old materialized rows go when a database switches to view mode
+MATERIALIZED_TABLE = 'cobol_state_materialized'
+
+# Record ids are state_id * 32 + position (STATE, PLAYER, AMMO, then one
+# ENEMY per slot), so ORDER BY id gives the same order as the table did
+RECORD_ID_STRIDE = 32
+
+
+def _cobol_state_view() -> str:
+    """cobol_state as a view, built from the same copybook layouts"""
+    codecs = gamestat_codec().codecs
+    state = codecs['STATE'].sql_printf({
+        'STATE-TICK': 'g.tick',
+        'STATE-LEVEL': 'g.level',
+        'STATE-TIMESTAMP': "CAST(strftime('%Y%m%d', g.timestamp, 'unixepoch', 'localtime') AS INTEGER)",
+    })
+    player = codecs['PLAYER'].sql_printf({
+        'PLAYER-X': 'g.x >> 16',
+        'PLAYER-Y': 'g.y >> 16',
+        'PLAYER-Z': 'g.z >> 16',
+        'PLAYER-ANGLE': '((g.angle & 4294967295) * 360) >> 32',
+        'PLAYER-HEALTH': 'max(g.health, 0)',
+        'PLAYER-ARMOR': 'g.armor',
+        'PLAYER-STATUS': "CASE WHEN g.health <= 0 THEN 'D' ELSE 'A' END",
+    })
+    ammo = codecs['AMMO'].sql_printf({
+        'AMMO-BULLETS': 'g.ammo_bullets',
+        'AMMO-SHELLS': 'g.ammo_shells',
+        'AMMO-CELLS': 'g.ammo_cells',
+        'AMMO-ROCKETS': 'g.ammo_rockets',
+        'CURRENT-WEAPON': 'g.weapon',
+    })
+    enemy = codecs['ENEMY'].sql_printf({
+        'ENTITY-TYPE': 'e.type',
+        'ENTITY-HEALTH': 'max(e.health, 0)',
+        'ENTITY-X': 'e.x >> 16',
+        'ENTITY-Y': 'e.y >> 16',
+        'ENTITY-DISTANCE': 'e.distance >> 16',
+    })
+    # Must produce exactly what DoomStateSQLite._cobol_records() writes
+    return f'''CREATE VIEW cobol_state (id, state_id, record_type, record_data) AS
+    SELECT g.id * {RECORD_ID_STRIDE}, g.id, 'STATE', {state}
+    FROM game_state g
+    UNION ALL
+    SELECT g.id * {RECORD_ID_STRIDE} + 1, g.id, 'PLAYER', {player}
+    FROM game_state g
+    UNION ALL
+    SELECT g.id * {RECORD_ID_STRIDE} + 2, g.id, 'AMMO', {ammo}
+    FROM game_state g
+    UNION ALL
+    SELECT e.state_id * {RECORD_ID_STRIDE} + 3 + e.enemy_index, e.state_id, 'ENEMY', {enemy}
+    FROM enemies e
+    WHERE e.enemy_index < {MAX_ENTITIES}'''
+
+
+COBOL_STATE_VIEW = _cobol_state_view()
+
+COBOL_STATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS cobol_state (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        state_id INTEGER,
+        record_type TEXT,
+        record_data TEXT,
+        FOREIGN KEY (state_id) REFERENCES game_state(id)
+    )
+'''
+
+
+def _object_type(cursor, name: str):
+    """'table', 'view' or None for a schema object"""
+    row = cursor.execute(
+        'SELECT type FROM sqlite_master WHERE name = ? AND type IN (?, ?)',
+        (name, 'table', 'view')
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _view_sql(cursor):
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'cobol_state' AND type = 'view'").fetchone()
+    return row[0] if row else None
+
+
+def ensure_cobol_state(cursor, mode: str = 'table'):
+    """Make cobol_state a materialized table or an on-demand view
+
+    Switching to view mode keeps any existing rows in
+    cobol_state_materialized; the view regenerates them identically from
+    game_state and enemies. Switching back restores that table, so states
+    captured in view mode have no materialized rows. A view from an older
+    record layout is replaced.
+    """
+    if mode not in COBOL_MODES:
+        raise ValueError(f"Unknown COBOL record mode: {mode}")
+
+    current = _object_type(cursor, 'cobol_state')
+
+    if mode == 'view':
+        if current == 'view':
+            if _view_sql(cursor) == COBOL_STATE_VIEW:
+                return
+            cursor.execute('DROP VIEW cobol_state')
+        elif current == 'table':
+            if _object_type(cursor, MATERIALIZED_TABLE):
+                raise RuntimeError(f"Both cobol_state and {MATERIALIZED_TABLE} exist")
+            cursor.execute(f'ALTER TABLE cobol_state RENAME TO {MATERIALIZED_TABLE}')
+            logger.info(f"Materialized COBOL records kept in {MATERIALIZED_TABLE}")
+        cursor.execute(COBOL_STATE_VIEW)
+        return
+
+    if current == 'view':
+        cursor.execute('DROP VIEW cobol_state')
+        if _object_type(cursor, MATERIALIZED_TABLE):
+            cursor.execute(f'ALTER TABLE {MATERIALIZED_TABLE} RENAME TO cobol_state')
+    cursor.execute(COBOL_STATE_TABLE)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Process-wide MVS dataset catalog
+Each dataset is mapped into memory once per generation and served as
+zero-copy slices of the mapping, instead of being re-read and re-parsed
+on every request
+"""
+
+import os
+import mmap
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from ebcdic import decode_records, decode_text
+from gamestat_publisher import (GENERATION_SUFFIX, LINE_SEQUENTIAL, DatasetPublisher,
+                                dataset_digest, read_generation)
+from record_formats import DESCRIPTOR_SIZE, is_variable, read_records
+
+PathLike = Union[str, Path]
+
+
+def _lines(data) -> Iterator[memoryview]:
+    """Zero-copy views of each newline-terminated record"""
+    view = memoryview(data)
+    start, end = 0, len(view)
+    while start < end:
+        stop = data.find(b'\n', start)
+        if stop < 0:
+            stop = end
+        yield view[start:stop]
+        start = stop + 1
+
+
+@dataclass
+class CatalogEntry:
+    """One cataloged dataset and its current generation
+
+    `mapped` datasets must only ever be replaced by rename (publish() or
+    atomic_write), never rewritten in place: a mapping of a file that is
+    truncated under it faults. Files other programs rewrite in place are
+    read into memory once per change instead. `layout` names the record
+    layout (GAMESTAT datasets may be 'compact', binary records).
+    Readers keep view()s, not `data`: a replaced mapping is closed
+    unless views of it are still held.
+    """
+    name: str
+    path: Path
+    recfm: str = 'FB'
+    lrecl: int = 80
+    blksize: int = 3200
+    layout: str = 'display'
+    mapped: bool = True
+    generation: int = 0
+    data: Union[bytes, mmap.mmap] = b''
+    stamp: Optional[Tuple] = None
+
+    def view(self) -> memoryview:
+        """The whole dataset, without copying"""
+        return memoryview(self.data)
+
+    def records(self) -> Iterator[memoryview]:
+        """Zero-copy views of each record"""
+        if self.recfm == LINE_SEQUENTIAL:
+            return _lines(self.data)
+        return read_records(self.data, self.recfm, self.lrecl)
+
+    @property
+    def record_count(self) -> int:
+        if self.recfm == LINE_SEQUENTIAL or is_variable(self.recfm):
+            return sum(1 for _ in self.records())
+        return -(-len(self.data) // self.lrecl)
+
+    def text_records(self) -> List[str]:
+        """Records as text (EBCDIC records are decoded)"""
+        if self.recfm == LINE_SEQUENTIAL:
+            return [bytes(record).decode('latin-1') for record in _lines(self.data)]
+        if is_variable(self.recfm):
+            return [decode_text(record) for record in self.records()]
+        return decode_records(self.view(), self.lrecl, partial=True)
+
+
+class DatasetCatalog:
+    """Datasets of one directory by name: attributes, generation, contents
+
+    Lookups cost one stat() of the dataset and its generation sidecar;
+    the file is only mapped again when it has been replaced.
+    """
+
+    def __init__(self, root: PathLike):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[str, CatalogEntry] = {}
+        self.lock = threading.RLock()
+
+    def define(self, name: str, recfm: str = 'FB', lrecl: int = 80, blksize: int = 3200,
+               path: Optional[PathLike] = None, mapped: bool = True, layout: str = 'display') -> CatalogEntry:
+        """Catalog a dataset (default path: <root>/<name>)
+
+        Attributes recorded in the dataset's generation sidecar by its
+        publisher take precedence over the ones given here.
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                entry = self.entries[name] = CatalogEntry(name, Path(path) if path else self.root / name)
+            elif path:
+                entry.path = Path(path)
+            entry.recfm, entry.lrecl, entry.blksize, entry.mapped = recfm, lrecl, blksize, mapped
+            entry.layout = layout
+            return entry
+
+    def get(self, name: str) -> Optional[CatalogEntry]:
+        """The dataset's current generation (None if it does not exist yet)"""
+        with self.lock:
+            entry = self.entries.get(name) or self.define(name)
+            return entry if self._refresh(entry) else None
+
+    def publish(self, name: str, data: bytes, recfm: Optional[str] = None, lrecl: Optional[int] = None,
+                blksize: Optional[int] = None, layout: Optional[str] = None) -> CatalogEntry:
+        """Atomically replace a dataset with its next generation (DatasetPublisher)
+
+        The data is recorded as having the given attributes (default:
+        the ones the dataset was defined with). Publishing the bytes of
+        the current generation again changes nothing.
+        """
+        with self.lock:
+            entry = self.entries.get(name) or self.define(name)
+            attributes = (recfm or entry.recfm, lrecl or entry.lrecl, blksize or entry.blksize,
+                          layout or entry.layout)
+            self._refresh(entry)
+            entry.recfm, entry.lrecl, entry.blksize, entry.layout = attributes
+            # The publisher takes the record width; variable LRECL counts the RDW
+            width = entry.lrecl - DESCRIPTOR_SIZE if is_variable(entry.recfm) else entry.lrecl
+            DatasetPublisher(entry.path, width, recfm=entry.recfm, blksize=entry.blksize,
+                             layout=entry.layout).publish_bytes(data)
+            self._refresh(entry)
+            return entry
+
+    def _refresh(self, entry: CatalogEntry) -> bool:
+        """Map the dataset again if it changed since the last lookup"""
+        try:
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            return False
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns, _mtime_ns(f'{entry.path}{GENERATION_SUFFIX}'))
+        if stamp == entry.stamp:
+            return True
+
+        generation = entry.generation
+        remapped = entry.stamp is None or stamp[:3] != entry.stamp[:3]
+        if remapped:
+            with open(entry.path, 'rb') as f:
+                if entry.mapped and os.fstat(f.fileno()).st_size:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = f.read()
+            previous, entry.data = entry.data, data
+            if isinstance(previous, mmap.mmap):
+                try:
+                    previous.close()
+                except BufferError:
+                    # Views handed out for it are still held; it is
+                    # unmapped once their holders drop them
+                    pass
+            generation += 1
+
+        # Publishers keep the generation (and attributes) in the sidecar;
+        # datasets written by other programs count the changes this
+        # process has seen
+        info = read_generation(entry.path)
+        if remapped and info.get('digest') and info['digest'] != dataset_digest(entry.data):
+            # Newer than its sidecar (renamed in just before it, or
+            # rewritten by another program): a generation past the sidecar's
+            info['generation'] = max(info.get('generation', 0) + 1, generation)
+        entry.generation = info.get('generation', generation)
+        entry.recfm = info.get('recfm', entry.recfm)
+        entry.lrecl = info.get('lrecl', entry.lrecl)
+        entry.blksize = info.get('blksize', entry.blksize)
+        entry.layout = info.get('layout', entry.layout)
+        entry.stamp = stamp
+        return True
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+_catalogs: Dict[Path, DatasetCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def dataset_catalog(root: PathLike = 'mvs_datasets') -> DatasetCatalog:
+    """The process-wide catalog of a dataset directory"""
+    key = Path(root).resolve()
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = DatasetCatalog(key)
+        return catalog
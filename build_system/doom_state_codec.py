@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+DOOM State Packet Codec
+Shared decoder for the UDP state packets sent on port 31337
+"""
+
+import struct
+import logging
+from typing import Dict, Any, Iterator, List, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Packet layout (must match x_state.c structure)
+STATE_MAGIC = 0x4D4F4F44  # 'DOOM'
+MAX_ENEMIES = 16
+
+HEADER_STRUCT = struct.Struct('<III')   # magic, version, tick
+PLAYER_STRUCT = struct.Struct('<18i')   # player block at offset 12
+ENEMY_STRUCT = struct.Struct('<5i')     # type, health, x, y, distance
+
+PLAYER_OFFSET = HEADER_STRUCT.size                      # 12
+ENEMY_OFFSET = 88                                       # 4 bytes padding after player block
+MIN_PACKET_SIZE = ENEMY_OFFSET
+PACKET_SIZE = ENEMY_OFFSET + MAX_ENEMIES * ENEMY_STRUCT.size  # 408
+
+PLAYER_FIELDS = (
+    'health', 'armor',
+    'ammo0', 'ammo1', 'ammo2', 'ammo3',
+    'weapon', 'x', 'y', 'z', 'angle', 'momx', 'momy',
+    'level', 'kills', 'items', 'secrets',
+    'enemy_count'
+)
+
+ENEMY_FIELDS = ('type', 'health', 'x', 'y', 'distance')
+
+if NUMPY_AVAILABLE:
+    # One row per packet. enemy_n lives in the 4 padding bytes before the
+    # enemy block, so a padded packet buffer can be viewed in place.
+    STATE_DTYPE = np.dtype({
+        'names': ['magic', 'version', 'tick'] + list(PLAYER_FIELDS) + ['enemy_n', 'enemies'],
+        'formats': ['<u4', '<u4', '<u4'] + ['<i4'] * len(PLAYER_FIELDS) + ['<i4', ('<i4', (MAX_ENEMIES, 5))],
+        'offsets': [0, 4, 8] + [PLAYER_OFFSET + 4 * i for i in range(len(PLAYER_FIELDS))] + [84, ENEMY_OFFSET],
+        'itemsize': PACKET_SIZE
+    })
+    # One row per enemy in a packed enemy block (game_state.enemy_data)
+    ENEMY_DTYPE = np.dtype([(name, '<i4') for name in ENEMY_FIELDS])
+else:
+    STATE_DTYPE = None
+    ENEMY_DTYPE = None
+
+
+def enemy_slots(data: bytes, enemy_count: int) -> int:
+    """Number of enemy entries actually present in a packet"""
+    available = (len(data) - ENEMY_OFFSET) // ENEMY_STRUCT.size
+    return max(0, min(enemy_count, MAX_ENEMIES, available))
+
+
+def enemy_block(data: bytes, count: int) -> bytes:
+    """The packed enemy entries of a packet, exactly as sent on the wire"""
+    return bytes(data[ENEMY_OFFSET:ENEMY_OFFSET + count * ENEMY_STRUCT.size])
+
+
+def pack_enemies(enemies: Sequence[Dict[str, int]]) -> bytes:
+    """Pack enemy dicts into the wire layout (20 bytes per enemy)"""
+    return b''.join(
+        ENEMY_STRUCT.pack(e['type'], e['health'], e['x'], e['y'], e['distance'])
+        for e in enemies[:MAX_ENEMIES]
+    )
+
+
+def iter_enemies(blob: bytes) -> Iterator[Tuple[int, int, int, int, int]]:
+    """(type, health, x, y, distance) tuples from a packed enemy block"""
+    return ENEMY_STRUCT.iter_unpack(blob or b'')
+
+
+def enemies_array(blob: bytes):
+    """Packed enemy block as a NumPy structured array (ENEMY_DTYPE), no copy"""
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy is required for enemies_array")
+    return np.frombuffer(blob or b'', dtype=ENEMY_DTYPE)
+
+
+def parse_state(data: bytes) -> Dict[str, Any]:
+    """Parse one binary state packet into a state dict"""
+    if len(data) < MIN_PACKET_SIZE:
+        raise ValueError(f"Packet too short: {len(data)} bytes")
+
+    view = memoryview(data)
+    magic, version, tick = HEADER_STRUCT.unpack_from(view, 0)
+
+    if magic != STATE_MAGIC:
+        raise ValueError("Invalid magic number")
+
+    (health, armor,
+     ammo0, ammo1, ammo2, ammo3,
+     weapon, x, y, z, angle, momx, momy,
+     level, kills, items, secrets,
+     enemy_count) = PLAYER_STRUCT.unpack_from(view, PLAYER_OFFSET)
+
+    count = enemy_slots(data, enemy_count)
+    end = ENEMY_OFFSET + count * ENEMY_STRUCT.size
+    enemies = [
+        {'type': e[0], 'health': e[1], 'x': e[2], 'y': e[3], 'distance': e[4]}
+        for e in ENEMY_STRUCT.iter_unpack(view[ENEMY_OFFSET:end])
+    ]
+
+    return {
+        'tick': tick,
+        'level': level,
+        'health': health,
+        'armor': armor,
+        'x': x,
+        'y': y,
+        'z': z,
+        'angle': angle,
+        'momx': momx,
+        'momy': momy,
+        'weapon': weapon,
+        'ammo': [ammo0, ammo1, ammo2, ammo3],
+        'kills': kills,
+        'items': items,
+        'secrets': secrets,
+        'enemy_count': enemy_count,
+        'enemies': enemies
+    }
+
+
+def decode_batch(packets: Sequence[bytes], drop_invalid: bool = True):
+    """Decode many packets into one NumPy structured array (STATE_DTYPE)
+
+    Each packet is copied into a fixed 408-byte slot and the whole buffer
+    is viewed as STATE_DTYPE, so decoding is one memcpy per packet plus a
+    handful of vectorized fixups. Enemy slots beyond `enemy_n` are zeroed.
+    Short or bad-magic packets are dropped unless `drop_invalid` is False,
+    in which case they come back as rows with magic == 0.
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy is required for decode_batch")
+
+    count = len(packets)
+    buf = bytearray(count * PACKET_SIZE)
+    lengths = np.empty(count, dtype=np.int64)
+
+    view = memoryview(buf)
+    for i, packet in enumerate(packets):
+        size = len(packet)
+        lengths[i] = size
+        if size < MIN_PACKET_SIZE:
+            continue
+        size = min(size, PACKET_SIZE)
+        start = i * PACKET_SIZE
+        view[start:start + size] = packet[:size]
+
+    states = np.frombuffer(buf, dtype=STATE_DTYPE)
+
+    available = np.clip((lengths - ENEMY_OFFSET) // ENEMY_STRUCT.size, 0, MAX_ENEMIES)
+    states['enemy_n'] = np.clip(np.minimum(states['enemy_count'], available), 0, MAX_ENEMIES)
+    states['enemies'][np.arange(MAX_ENEMIES) >= states['enemy_n'][:, None]] = 0
+
+    valid = states['magic'] == STATE_MAGIC
+    if drop_invalid:
+        return states[valid]
+
+    states['magic'][~valid] = 0
+    return states
+
+
+def states_from_batch(states) -> List[Dict[str, Any]]:
+    """Convert a decoded batch back into per-packet state dicts"""
+    result = []
+
+    for row in states.tolist():
+        fields = dict(zip(STATE_DTYPE.names, row))
+        enemy_n = fields['enemy_n']
+        result.append({
+            'tick': fields['tick'],
+            'level': fields['level'],
+            'health': fields['health'],
+            'armor': fields['armor'],
+            'x': fields['x'],
+            'y': fields['y'],
+            'z': fields['z'],
+            'angle': fields['angle'],
+            'momx': fields['momx'],
+            'momy': fields['momy'],
+            'weapon': fields['weapon'],
+            'ammo': [fields['ammo0'], fields['ammo1'], fields['ammo2'], fields['ammo3']],
+            'kills': fields['kills'],
+            'items': fields['items'],
+            'secrets': fields['secrets'],
+            'enemy_count': fields['enemy_count'],
+            'enemies': [dict(zip(ENEMY_FIELDS, e)) for e in fields['enemies'][:enemy_n]]
+        })
+
+    return result
@@ -5,28 +5,104 @@ Captures game state from UDP and stores in SQLite for analysis
 """
 
 import socket
-import struct
 import sqlite3
 import time
 import json
 import threading
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from state_writer import StateWriter, apply_pragmas
+from doom_state_codec import parse_state, HEADER_STRUCT, MIN_PACKET_SIZE, STATE_MAGIC
+from ingest_sessions import SessionTracker, ensure_column, migrate_sessions_schema
+from tick_sequencer import SequenceTracker
+from cobol_state_view import COBOL_MODES, ensure_cobol_state
+from gamestat_records import gamestat_codec
+from enemy_storage import ENEMY_STORAGE_MODES, ensure_enemy_storage
+from state_partitions import PartitionManager, PartitionedStateView, ensure_partition_tables
+from flight_recorder import FlightRecorder, RecorderIndexer
+from state_notify import CommitNotifier
+from latest_state import StateReadPool, ensure_latest_state
+from state_aggregates import StateAggregator, StateAnalytics, ensure_aggregate_tables
+from spatial_index import SpatialIndexer, SpatialQueries, ensure_spatial_tables
+from state_compaction import ensure_compaction_columns, ensure_expanded_view
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Seconds between partition retention passes
+MAINTENANCE_INTERVAL = 60
+
 
 class DoomStateSQLite:
     """Captures DOOM state and stores in SQLite database"""
     
-    def __init__(self, db_path="doom_state.db", port=31337):
+    def __init__(self, db_path="doom_state.db", port=31337,
+                 batch_size=64, batch_ms=50, queue_size=4096,
+                 journal_mode='WAL', synchronous='NORMAL',
+                 reuse_port=False, per_source_sessions=False,
+                 jitter_window=4, jitter_ms=100, cobol_records='table',
+                 enemy_storage='rows', partition_seconds=None,
+                 raw_retention=None, rollup_after=None, retention=None,
+                 recorder_dir=None, segment_mb=64, aggregates=True,
+                 spatial_index=False, compact_idle=False):
+        if cobol_records not in COBOL_MODES:
+            raise ValueError(f"Unknown COBOL record mode: {cobol_records}")
+        if enemy_storage not in ENEMY_STORAGE_MODES:
+            raise ValueError(f"Unknown enemy storage mode: {enemy_storage}")
+            
         self.db_path = db_path
+        self.cobol_records = cobol_records
+        self.enemy_storage = enemy_storage
+        self.partitions = None
+        if partition_seconds:
+            self.partitions = PartitionManager(
+                db_path, self._create_state_tables, partition_seconds, journal_mode
+            )
+        self.retention_policy = {
+            'raw_retention': raw_retention,
+            'rollup_after': rollup_after,
+            'retention': retention
+        }
+        self.last_maintenance = 0
+        # Flight recorder mode: receive appends raw packets to segments and
+        # RecorderIndexer builds the SQLite rows from them in the background
+        self.recorder = None
+        self.indexer = None
+        if recorder_dir:
+            self.recorder = FlightRecorder(recorder_dir, segment_mb * 1024 * 1024)
         self.port = port
+        self.reuse_port = reuse_port
+        self.per_source_sessions = per_source_sessions
+        self.sessions = None
+        self.sequencer = SequenceTracker(jitter_window, jitter_ms / 1000.0)
         self.socket = None
+        self.hub = None
+        self.capture_thread = None
         self.conn = None
+        self.read_pool = None
+        self.analytics = None
+        self.aggregates = aggregates
+        self.spatial = None
+        self.spatial_index = spatial_index
         self.running = False
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        # Readers wait on this (or a StateSubscriber) instead of polling
+        self.notifier = CommitNotifier(db_path)
+        self.gamestat = gamestat_codec()
+        self.writer = StateWriter(
+            db_path, self._cobol_records if cobol_records == 'table' else None,
+            batch_size=batch_size, batch_ms=batch_ms, queue_size=queue_size,
+            journal_mode=journal_mode, synchronous=synchronous,
+            packed_enemies=enemy_storage == 'packed',
+            partitions=self.partitions,
+            store_raw=not self.recorder, blocking=bool(self.recorder),
+            notifier=self.notifier,
+            aggregator=StateAggregator() if aggregates else None,
+            spatial=SpatialIndexer() if spatial_index else None,
+            compact_idle=compact_idle
+        )
         self.stats = {
             'packets_received': 0,
             'last_tick': 0,
@@ -36,8 +112,76 @@ class DoomStateSQLite:
     def init_database(self):
         """Initialize SQLite database schema"""
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        apply_pragmas(self.conn, self.journal_mode, self.synchronous)
         cursor = self.conn.cursor()
         
+        # State tables (game_state, enemies, cobol_state)
+        self._create_state_tables(cursor)
+        
+        # Session info table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                start_time REAL,
+                end_time REAL,
+                total_packets INTEGER,
+                notes TEXT
+            )
+        ''')
+        
+        # Older databases predate per-instance sessions
+        migrate_sessions_schema(cursor)
+        
+        # One row per tick, expanding idle runs
+        ensure_expanded_view(cursor)
+        
+        # Newest state per session, upserted by the writer
+        ensure_latest_state(cursor)
+        
+        if self.aggregates:
+            # Per-second/per-minute analytics, maintained by the writer
+            ensure_aggregate_tables(cursor)
+            
+        if self.spatial_index:
+            # R*Tree over player positions and enemy sightings
+            ensure_spatial_tables(cursor)
+        
+        if self.partitions:
+            # The partition files are this capture's until stop_capture();
+            # maintenance in other processes then leaves them in place
+            if not self.partitions.claim():
+                raise RuntimeError(f"Partitions of {self.db_path} are in use by another process")
+            # New states go to per-window partition files; main keeps
+            # sessions, the partition registry and per-second rollups
+            ensure_partition_tables(cursor)
+        
+        self.conn.commit()
+        self.read_pool = StateReadPool(self.db_path)
+        self.analytics = StateAnalytics(self.read_pool)
+        if self.spatial_index:
+            self.spatial = SpatialQueries(self.read_pool)
+        
+        logger.info(f"Database initialized: {self.db_path}")
+        
+        if self.per_source_sessions:
+            # One session per DOOM instance, opened on its first packet
+            self.sessions = SessionTracker(self.conn)
+            self.session_id = None
+            return
+            
+        # Start new session
+        cursor.execute(
+            'INSERT INTO sessions (start_time, total_packets) VALUES (?, 0)',
+            (time.time(),)
+        )
+        self.session_id = cursor.lastrowid
+        self.writer.session_id = self.session_id
+        self.conn.commit()
+        
+        logger.info(f"Session ID: {self.session_id}")
+        
+    def _create_state_tables(self, cursor):
+        """Create per-state tables and indexes (main database or a partition)"""
         # Main game state table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS game_state (
@@ -66,256 +210,210 @@ class DoomStateSQLite:
             )
         ''')
         
-        # Enemy tracking table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS enemies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                state_id INTEGER,
-                enemy_index INTEGER,
-                type INTEGER,
-                health INTEGER,
-                x INTEGER,
-                y INTEGER,
-                distance INTEGER,
-                FOREIGN KEY (state_id) REFERENCES game_state(id)
-            )
-        ''')
+        # Enemy tracking: a row per enemy, or packed into game_state.enemy_data
+        # behind an enemies view
+        ensure_enemy_storage(cursor, self.enemy_storage)
         
-        # Session info table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time REAL,
-                end_time REAL,
-                total_packets INTEGER,
-                notes TEXT
-            )
-        ''')
-        
-        # COBOL format table (for easy mapping)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cobol_state (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                state_id INTEGER,
-                record_type TEXT,
-                record_data TEXT,
-                FOREIGN KEY (state_id) REFERENCES game_state(id)
-            )
-        ''')
+        # COBOL format records (for easy mapping): a table, or a view
+        # that formats them from game_state + enemies on read
+        ensure_cobol_state(cursor, self.cobol_records)
         
         # Create indexes
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tick ON game_state(tick)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON game_state(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_health ON game_state(health)')
         
-        self.conn.commit()
-        
-        # Start new session
-        cursor.execute(
-            'INSERT INTO sessions (start_time, total_packets) VALUES (?, 0)',
-            (time.time(),)
-        )
-        self.session_id = cursor.lastrowid
-        self.conn.commit()
+        # Covering indexes for the per-state record reads
+        if self.enemy_storage == 'rows':
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_enemies_covering '
+                           'ON enemies(state_id, enemy_index, type, health, x, y, distance)')
+        if self.cobol_records == 'table':
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cobol_state_covering '
+                           'ON cobol_state(state_id, id, record_data)')
         
-        logger.info(f"Database initialized: {self.db_path}")
-        logger.info(f"Session ID: {self.session_id}")
+        # Per-instance sessions
+        ensure_column(cursor, 'game_state', 'session_id', 'INTEGER')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_session_tick ON game_state(session_id, tick)')
         
-    def start_capture(self):
-        """Start capturing state from UDP"""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(('0.0.0.0', self.port))
-        self.socket.settimeout(0.1)
+        # Tick ranges of run-length compacted idle states
+        ensure_compaction_columns(cursor)
         
+    def start_capture(self, hub=None):
+        """Start capturing state from UDP, or from a shared StateIngestHub"""
         self.running = True
         self.init_database()
+        self.writer.start()
         
-        logger.info(f"Listening for DOOM state on UDP port {self.port}")
-        
-        # Start capture thread
-        capture_thread = threading.Thread(target=self._capture_loop)
-        capture_thread.start()
+        if self.recorder:
+            self.recorder.start()
+            self.indexer = RecorderIndexer(
+                self.recorder.directory, self.db_path,
+                self._index_record, self._index_checkpoint
+            )
+            self.indexer.start()
+        
+        if hub:
+            # Hub owns the port and has already decoded the packet
+            hub.subscribe('sqlite', self._on_hub_packet, maxsize=self.writer.queue.maxsize)
+            self.hub = hub
+            logger.info(f"Recording DOOM state from ingest hub on UDP port {hub.port}")
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if self.reuse_port:
+                # Several worker processes share the port; the kernel
+                # hashes each sender to one of them
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.socket.bind(('0.0.0.0', self.port))
+            self.socket.settimeout(0.1)
+            
+            logger.info(f"Listening for DOOM state on UDP port {self.port}")
+            
+            # Start capture thread
+            self.capture_thread = threading.Thread(target=self._capture_loop)
+            self.capture_thread.start()
         
         # Start stats thread
         stats_thread = threading.Thread(target=self._stats_loop)
         stats_thread.start()
         
+    def _on_hub_packet(self, packet):
+        """Receive an already-decoded packet from the ingest hub"""
+        self.stats['packets_received'] += 1
+        session_id = self._session_for(packet.source, packet.state['tick'])
+        if self.recorder:
+            self.recorder.append(session_id, packet.state['tick'], packet.received_at, packet.raw)
+            return
+        self._sequence(session_id, packet.state, packet.raw, packet.received_at)
+        self._store_ready(self.sequencer.expire())
+        
+    def _session_for(self, addr, tick: int) -> Optional[int]:
+        """Session id for a packet from addr"""
+        if self.sessions:
+            return self.sessions.resolve(addr, tick)
+        return self.session_id
+        
     def _capture_loop(self):
         """Main capture loop"""
         while self.running:
             try:
                 data, addr = self.socket.recvfrom(4096)
-                self._process_packet(data)
+                self._process_packet(data, time.time(), addr)
                 self.stats['packets_received'] += 1
                 
             except socket.timeout:
+                # Quiet socket: release anything held in the jitter window
+                self._store_ready(self.sequencer.expire())
                 continue
             except Exception as e:
                 logger.error(f"Capture error: {e}")
                 
-    def _process_packet(self, data: bytes):
+    def _process_packet(self, data: bytes, received_at: Optional[float] = None, addr=None):
         """Process received state packet"""
-        if len(data) < 88:  # Minimum packet size
+        if len(data) < MIN_PACKET_SIZE:
+            return
+            
+        if self.recorder:
+            self._record_packet(data, received_at, addr)
             return
             
         try:
             # Parse binary state structure
             state = self._parse_state(data)
             
-            # Store in database
-            self._store_state(state, data)
-            
-            # Update stats
-            self.stats['last_tick'] = state['tick']
+            # Drop gaps/duplicates/late packets, then hand off to the writer thread
+            session_id = self._session_for(addr, state['tick'])
+            self._sequence(session_id, state, data, received_at)
             
         except Exception as e:
             logger.error(f"Failed to process packet: {e}")
             
-    def _parse_state(self, data: bytes) -> Dict[str, Any]:
-        """Parse binary state packet"""
-        # Header (12 bytes)
-        magic, version, tick = struct.unpack('<III', data[0:12])
-        
-        if magic != 0x4D4F4F44:  # 'DOOM'
-            raise ValueError("Invalid magic number")
+    def _record_packet(self, data: bytes, received_at: Optional[float], addr):
+        """Append a raw packet to the flight recorder; parsing happens in the indexer"""
+        try:
+            magic, _, tick = HEADER_STRUCT.unpack_from(data, 0)
+            if magic != STATE_MAGIC:
+                raise ValueError("Invalid magic number")
+            session_id = self._session_for(addr, tick)
+            self.recorder.append(session_id, tick, received_at or time.time(), data)
             
-        # Player state (52 bytes)
-        (health, armor, 
-         ammo0, ammo1, ammo2, ammo3,
-         weapon, x, y, z, angle, momx, momy,
-         level, kills, items, secrets,
-         enemy_count) = struct.unpack('<18i', data[12:84])
-        
-        state = {
-            'tick': tick,
-            'level': level,
-            'health': health,
-            'armor': armor,
-            'x': x,
-            'y': y,
-            'z': z,
-            'angle': angle,
-            'momx': momx,
-            'momy': momy,
-            'weapon': weapon,
-            'ammo': [ammo0, ammo1, ammo2, ammo3],
-            'kills': kills,
-            'items': items,
-            'secrets': secrets,
-            'enemy_count': enemy_count,
-            'enemies': []
-        }
-        
-        # Parse enemies
-        offset = 88
-        for i in range(min(enemy_count, 16)):
-            if offset + 20 <= len(data):
-                enemy = struct.unpack('<5i', data[offset:offset+20])
-                state['enemies'].append({
-                    'type': enemy[0],
-                    'health': enemy[1],
-                    'x': enemy[2],
-                    'y': enemy[3],
-                    'distance': enemy[4]
-                })
-                offset += 20
-                
-        return state
-        
-    def _store_state(self, state: Dict[str, Any], raw_data: bytes):
-        """Store state in database"""
-        cursor = self.conn.cursor()
-        
-        # Insert main state
-        cursor.execute('''
-            INSERT INTO game_state (
-                timestamp, tick, level, health, armor,
-                x, y, z, angle, momx, momy, weapon,
-                ammo_bullets, ammo_shells, ammo_cells, ammo_rockets,
-                kills, items, secrets, enemy_count, raw_data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            time.time(), state['tick'], state['level'],
-            state['health'], state['armor'],
-            state['x'], state['y'], state['z'], state['angle'],
-            state['momx'], state['momy'], state['weapon'],
-            state['ammo'][0], state['ammo'][1], state['ammo'][2], state['ammo'][3],
-            state['kills'], state['items'], state['secrets'],
-            state['enemy_count'], raw_data
-        ))
-        
-        state_id = cursor.lastrowid
-        
-        # Insert enemies
-        for i, enemy in enumerate(state['enemies']):
-            cursor.execute('''
-                INSERT INTO enemies (
-                    state_id, enemy_index, type, health, x, y, distance
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                state_id, i, enemy['type'], enemy['health'],
-                enemy['x'], enemy['y'], enemy['distance']
-            ))
+        except Exception as e:
+            logger.error(f"Failed to record packet: {e}")
             
-        # Generate COBOL format records
-        self._store_cobol_format(cursor, state_id, state)
-        
-        self.conn.commit()
-        
-    def _store_cobol_format(self, cursor, state_id: int, state: Dict[str, Any]):
-        """Store COBOL-formatted records"""
-        # STATE record
-        cursor.execute(
-            'INSERT INTO cobol_state (state_id, record_type, record_data) VALUES (?, ?, ?)',
-            (state_id, 'STATE', f"STATE {state['tick']:08d} {state['level']:02d}")
-        )
-        
-        # PLAYER record
-        x = state['x'] >> 16  # Convert fixed point
-        y = state['y'] >> 16
-        z = state['z'] >> 16
-        angle = (state['angle'] * 360) // 0xFFFFFFFF  # BAM to degrees
-        
-        player_rec = f"PLAYER{x:+08d}{y:+08d}{z:+08d}{angle:+04d}{state['health']:03d}{state['armor']:03d}"
-        cursor.execute(
-            'INSERT INTO cobol_state (state_id, record_type, record_data) VALUES (?, ?, ?)',
-            (state_id, 'PLAYER', player_rec)
-        )
+    def _index_record(self, session_id: int, tick: int, received_at: float, raw_data: bytes):
+        """Index one recorded packet: parse, sequence and queue it for the writer"""
+        state = self._parse_state(raw_data)
+        self._sequence(session_id or self.session_id, state, raw_data, received_at)
+        
+    def _index_checkpoint(self):
+        """Commit everything the indexer has handed over so far"""
+        # Releasing the jitter window here means a packet reordered across
+        # a checkpoint counts as late; checkpoints are seconds apart
+        self._store_ready(self.sequencer.flush())
+        self.writer.flush()
+        
+    def _sequence(self, session_id, state: Dict[str, Any], raw_data: bytes,
+                  received_at: Optional[float]):
+        """Pass a packet through the per-session tick sequencer"""
+        ready = self.sequencer.push(session_id, state['tick'], (state, raw_data, received_at, session_id))
+        self._store_ready(ready)
+        
+    def _store_ready(self, ready):
+        """Store packets released by the sequencer, in tick order"""
+        for state, raw_data, received_at, session_id in ready:
+            self._store_state(state, raw_data, received_at, session_id)
+            self.stats['last_tick'] = state['tick']
+            
+    def _parse_state(self, data: bytes) -> Dict[str, Any]:
+        """Parse binary state packet"""
+        return parse_state(data)
         
-        # AMMO record
-        ammo_rec = f"AMMO  {state['ammo'][0]:04d}{state['ammo'][1]:04d}{state['ammo'][2]:04d}{state['ammo'][3]:04d} {state['weapon']}"
-        cursor.execute(
-            'INSERT INTO cobol_state (state_id, record_type, record_data) VALUES (?, ?, ?)',
-            (state_id, 'AMMO', ammo_rec)
-        )
+    def _store_state(self, state: Dict[str, Any], raw_data: bytes,
+                     received_at: Optional[float] = None, session_id: Optional[int] = None):
+        """Queue state for the group-commit writer"""
+        self.writer.submit(state, raw_data, received_at, session_id)
         
-        # ENEMY records
-        for enemy in state['enemies']:
-            enemy_x = enemy['x'] >> 16
-            enemy_y = enemy['y'] >> 16
-            enemy_dist = enemy['distance'] >> 16
-            
-            enemy_rec = f"ENEMY {enemy['type']:02d} {enemy['health']:03d} {enemy_x:+08d} {enemy_y:+08d} {enemy_dist:05d}"
-            cursor.execute(
-                'INSERT INTO cobol_state (state_id, record_type, record_data) VALUES (?, ?, ?)',
-                (state_id, 'ENEMY', enemy_rec)
-            )
+    def _cobol_records(self, state: Dict[str, Any], timestamp: float) -> List[Tuple[str, str]]:
+        """Build COBOL-formatted records for a state (DOOMSTAT.CPY layouts)"""
+        return [(record_type, record.rstrip())
+                for record_type, record in self.gamestat.state_records(state, timestamp)]
             
     def _stats_loop(self):
         """Report statistics periodically"""
         while self.running:
             time.sleep(5)
+            if not self.running:
+                break
+            
+            self._store_ready(self.sequencer.expire())
             
             runtime = time.time() - self.stats['start_time']
             pps = self.stats['packets_received'] / runtime if runtime > 0 else 0
             
+            writer = self.writer.stats
             logger.info(
                 f"Stats - Packets: {self.stats['packets_received']}, "
                 f"Last tick: {self.stats['last_tick']}, "
-                f"Rate: {pps:.1f}/sec"
+                f"Rate: {pps:.1f}/sec, "
+                f"Batch: {writer['batch_size_avg']:.1f} avg/{writer['batch_size_max']} max, "
+                f"Commit: {writer['commit_ms_avg']:.2f}ms avg/{writer['commit_ms_max']:.2f}ms max, "
+                f"Dropped: {writer['packets_dropped']}, "
+                f"Folded: {writer['states_folded']}"
+            )
+            
+            seq = self.sequencer.get_metrics()
+            logger.info(
+                f"Sequence - Loss: {seq['loss_rate']:.2%} ({seq['missing_ticks']} ticks), "
+                f"Duplicates: {seq['duplicates']}, Late: {seq['late_dropped']}, "
+                f"Reordered: {seq['reordered']} (max depth {seq['reorder_depth_max']})"
             )
             
+            self._maintain_partitions()
+            
             # Update session
+            if self.sessions:
+                self.sessions.update_counts()
+                continue
+                
             cursor = self.conn.cursor()
             cursor.execute(
                 'UPDATE sessions SET total_packets = ? WHERE id = ?',
@@ -323,32 +421,60 @@ class DoomStateSQLite:
             )
             self.conn.commit()
             
+    def _maintain_partitions(self):
+        """Apply the retention policy every MAINTENANCE_INTERVAL seconds"""
+        if not self.partitions or not any(v is not None for v in self.retention_policy.values()):
+            return
+        if time.time() - self.last_maintenance < MAINTENANCE_INTERVAL:
+            return
+            
+        self.last_maintenance = time.time()
+        try:
+            self.partitions.maintain(**self.retention_policy)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+            
+    def _read(self, sql, params=()):
+        """Run a read query, across recent partitions when partitioned"""
+        if not self.partitions:
+            return self.read_pool.fetchall(sql, params)
+            
+        # The two newest windows cover any "recent" query
+        view = PartitionedStateView(self.db_path, recent=2)
+        try:
+            return view.conn.execute(sql, params).fetchall()
+        finally:
+            view.close()
+            
+    def get_latest_state(self, session_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Newest committed state (of one session) from latest_state"""
+        return self.read_pool.latest_state(session_id)
+        
     def query_recent_states(self, limit=10):
         """Query recent game states"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        return self._read('''
             SELECT tick, health, armor, x, y, enemy_count
             FROM game_state
             ORDER BY id DESC
             LIMIT ?
         ''', (limit,))
         
-        return cursor.fetchall()
-        
     def export_cobol_format(self, output_file='doom_state_cobol.txt'):
         """Export recent states in COBOL format"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        # A literal lower bound lets SQLite push the filter into the
+        # cobol_state view instead of formatting every state
+        first = self._read('''
+            SELECT MIN(id) FROM (SELECT id FROM game_state ORDER BY id DESC LIMIT 10)
+        ''')[0][0]
+        rows = self._read('''
             SELECT record_data
             FROM cobol_state
-            WHERE state_id IN (
-                SELECT id FROM game_state ORDER BY id DESC LIMIT 10
-            )
+            WHERE state_id >= ?
             ORDER BY state_id DESC, id
-        ''')
+        ''', (first or 0,))
         
         with open(output_file, 'w') as f:
-            for row in cursor.fetchall():
+            for row in rows:
                 f.write(row[0] + '\n')
                 
         logger.info(f"Exported COBOL format to {output_file}")
@@ -357,21 +483,84 @@ class DoomStateSQLite:
         """Stop capturing"""
         self.running = False
         
+        # No more packets: hub packets already queued for us are delivered
+        # first, and the capture thread leaves recv (0.1 s timeout) before
+        # its socket is closed below
+        if self.hub:
+            self.hub.unsubscribe('sqlite')
+            self.hub = None
+        if self.capture_thread:
+            self.capture_thread.join()
+            self.capture_thread = None
+        
+        if self.recorder:
+            # Index the recorded tail before the writer goes away
+            self.recorder.close()
+            self.indexer.stop()
+        
+        # Commit whatever is still queued
+        self._store_ready(self.sequencer.flush())
+        self.writer.stop()
+        if self.partitions:
+            self.partitions.release()
+        
         if self.conn:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                'UPDATE sessions SET end_time = ? WHERE id = ?',
-                (time.time(), self.session_id)
-            )
-            self.conn.commit()
+            if self.sessions:
+                self.sessions.close_all()
+            else:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    'UPDATE sessions SET end_time = ? WHERE id = ?',
+                    (time.time(), self.session_id)
+                )
+                self.conn.commit()
             self.conn.close()
             
+        if self.read_pool:
+            self.read_pool.close()
+            
         if self.socket:
             self.socket.close()
             
+        self.notifier.close()
+            
 
 def main():
     """Run the state capture"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='DOOM State SQLite Capture')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--port', type=int, default=31337, help='UDP state port')
+    parser.add_argument('--batch-size', type=int, default=64, help='Commit every N packets')
+    parser.add_argument('--batch-ms', type=float, default=50, help='Commit every T milliseconds')
+    parser.add_argument('--queue-size', type=int, default=4096, help='Writer queue bound')
+    parser.add_argument('--journal-mode', default='WAL', help='SQLite journal mode')
+    parser.add_argument('--synchronous', default='NORMAL', help='SQLite synchronous mode')
+    parser.add_argument('--cobol-records', choices=COBOL_MODES, default='table',
+                        help='Store COBOL records (table) or format them on read (view)')
+    parser.add_argument('--enemy-storage', choices=ENEMY_STORAGE_MODES, default='rows',
+                        help='One enemies row per enemy (rows) or one BLOB per state (packed)')
+    parser.add_argument('--partition-minutes', type=int, default=0,
+                        help='Write states to one database file per N minutes (0 = single file)')
+    parser.add_argument('--raw-retention-hours', type=float, help='Drop raw packets from partitions after N hours')
+    parser.add_argument('--rollup-after-hours', type=float, help='Roll partitions up to per-second after N hours')
+    parser.add_argument('--retention-hours', type=float, help='Delete partitions after N hours')
+    parser.add_argument('--recorder-dir', help='Append raw packets to flight recorder segments here '
+                        'and index them into SQLite in the background')
+    parser.add_argument('--segment-mb', type=int, default=64, help='Flight recorder segment size')
+    parser.add_argument('--no-aggregates', action='store_true',
+                        help='Do not maintain the per-second/per-minute analytics tables')
+    parser.add_argument('--spatial-index', action='store_true',
+                        help='Maintain R*Tree indexes of player and enemy positions')
+    parser.add_argument('--compact-idle', action='store_true',
+                        help='Store runs of identical consecutive states as one row with a tick range')
+    
+    args = parser.parse_args()
+    
+    def hours(value):
+        return value * 3600 if value is not None else None
+    
     print("DOOM State SQLite Capture")
     print("=" * 50)
     print()
@@ -379,13 +568,26 @@ def main():
     print("and stores it in SQLite for analysis")
     print()
     
-    capture = DoomStateSQLite()
+    capture = DoomStateSQLite(
+        args.db, args.port,
+        batch_size=args.batch_size, batch_ms=args.batch_ms, queue_size=args.queue_size,
+        journal_mode=args.journal_mode, synchronous=args.synchronous,
+        cobol_records=args.cobol_records, enemy_storage=args.enemy_storage,
+        partition_seconds=args.partition_minutes * 60,
+        raw_retention=hours(args.raw_retention_hours),
+        rollup_after=hours(args.rollup_after_hours),
+        retention=hours(args.retention_hours),
+        recorder_dir=args.recorder_dir, segment_mb=args.segment_mb,
+        aggregates=not args.no_aggregates,
+        spatial_index=args.spatial_index,
+        compact_idle=args.compact_idle
+    )
     capture.start_capture()
     
     print("Capture running. Press Ctrl+C to stop")
     print()
     print("To query the database:")
-    print("  sqlite3 doom_state.db")
+    print(f"  sqlite3 {args.db}")
     print("  SELECT * FROM game_state ORDER BY id DESC LIMIT 10;")
     print()
     
@@ -409,7 +611,7 @@ def main():
         # Export COBOL format
         capture.export_cobol_format()
         
-        print(f"\nDatabase saved to: doom_state.db")
+        print(f"\nDatabase saved to: {args.db}")
         print(f"Total packets: {capture.stats['packets_received']}")
         
 
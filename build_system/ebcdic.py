@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Table-driven EBCDIC transcoding for MVS datasets
+Whole datasets are converted with one bytes.translate() call over
+precomputed 256-byte tables instead of a codec call per record
+"""
+
+from typing import Iterable, Iterator, List, Union
+
+CODEPAGE = 'cp037'
+
+# cp037 maps the 256 Latin-1 code points one to one, so translating
+# through these tables gives exactly what str.encode('cp037') and
+# bytes.decode('cp037') would
+ASCII_TO_EBCDIC = bytes(range(256)).decode('latin-1').encode(CODEPAGE)
+EBCDIC_TO_ASCII = bytes(range(256)).decode(CODEPAGE).encode('latin-1')
+
+EBCDIC_SPACE = ASCII_TO_EBCDIC[ord(' ')]
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def to_ebcdic(data: Union[str, BytesLike]) -> bytes:
+    """Latin-1 text or bytes to EBCDIC bytes"""
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    elif not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)  # memoryview, mmap
+    return data.translate(ASCII_TO_EBCDIC)
+
+
+def to_ascii(data: BytesLike) -> bytes:
+    """EBCDIC bytes to Latin-1 bytes"""
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)  # memoryview, mmap
+    return data.translate(EBCDIC_TO_ASCII)
+
+
+def decode_text(data: BytesLike) -> str:
+    """EBCDIC bytes to str; same result as data.decode('cp037')"""
+    return to_ascii(data).decode('latin-1')
+
+
+def fixed_records(records: Iterable[str], lrecl: int = 80) -> str:
+    """Records padded with spaces or truncated to `lrecl`, concatenated"""
+    pad = f'{{:<{lrecl}.{lrecl}}}'.format
+    return ''.join([pad(record) for record in records])
+
+
+def encode_records(records: Iterable[str], lrecl: int = 80) -> bytes:
+    """A RECFM=FB EBCDIC dataset from text records, in one translate"""
+    return fixed_records(records, lrecl).encode('latin-1').translate(ASCII_TO_EBCDIC)
+
+
+def pad_record(data: BytesLike, lrecl: int = 80, fill: int = EBCDIC_SPACE) -> bytes:
+    """One EBCDIC record padded with `fill` or truncated to `lrecl`"""
+    data = bytes(data[:lrecl])
+    return data + bytes((fill,)) * (lrecl - len(data)) if len(data) < lrecl else data
+
+
+def iter_records(data: BytesLike, lrecl: int = 80, partial: bool = False) -> Iterator[memoryview]:
+    """Zero-copy views of each record of a fixed-length dataset
+
+    A short trailing record is yielded only with `partial`.
+    """
+    view = memoryview(data)
+    end = len(view) if partial else len(view) - len(view) % lrecl
+    for offset in range(0, end, lrecl):
+        yield view[offset:offset + lrecl]
+
+
+def decode_records(data: BytesLike, lrecl: int = 80, partial: bool = False) -> List[str]:
+    """Every record of an EBCDIC fixed-length dataset as text"""
+    text = decode_text(data)
+    end = len(text) if partial else len(text) - len(text) % lrecl
+    return [text[offset:offset + lrecl] for offset in range(0, end, lrecl)]
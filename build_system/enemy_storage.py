@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Packed enemy storage for DOOM state capture
+One enemy_data BLOB per game_state row instead of one enemies row per enemy
+"""
+
+import logging
+from collections import defaultdict
+
+from doom_state_codec import ENEMY_FIELDS, ENEMY_STRUCT, MAX_ENEMIES, iter_enemies, pack_enemies
+from ingest_sessions import ensure_column
+
+logger = logging.getLogger(__name__)
+
+ENEMY_STORAGE_MODES = ('rows', 'packed')
+
+# Where the old per-enemy rows go when a database switches to packed mode
+ENEMY_ROWS_TABLE = 'enemies_rows'
+
+ENEMIES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS enemies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        state_id INTEGER,
+        enemy_index INTEGER,
+        type INTEGER,
+        health INTEGER,
+        x INTEGER,
+        y INTEGER,
+        distance INTEGER,
+        FOREIGN KEY (state_id) REFERENCES game_state(id)
+    )
+'''
+
+
+def _sql_int32(hex_column: str) -> str:
+    """SQL expression decoding 8 hex digits of a little-endian int32"""
+    digits = [f"(instr('0123456789ABCDEF', substr({hex_column}, {pos}, 1)) - 1)" for pos in range(1, 9)]
+    unsigned = ' + '.join(
+        f"({digits[2 * byte]} * 16 + {digits[2 * byte + 1]}) * {256 ** byte}"
+        for byte in range(4)
+    )
+    return f"(CASE WHEN ({unsigned}) >= 2147483648 THEN ({unsigned}) - 4294967296 ELSE ({unsigned}) END)"
+
+
+def _enemies_view_sql() -> str:
+    """Compatibility view exposing enemy_data as the old enemies table
+
+    Plain SQL so the sqlite3 shell and attached shard views can read it;
+    Python readers should decode enemy_data directly instead.
+    """
+    size = ENEMY_STRUCT.size
+    hex_fields = ',\n               '.join(
+        f"hex(substr(g.enemy_data, slot.i * {size} + {4 * k + 1}, 4)) AS h_{name}"
+        for k, name in enumerate(ENEMY_FIELDS)
+    )
+    int_fields = ',\n           '.join(f"{_sql_int32('h_' + name)} AS {name}" for name in ENEMY_FIELDS)
+
+    return f'''
+    CREATE VIEW enemies (id, state_id, enemy_index, {', '.join(ENEMY_FIELDS)}) AS
+    WITH RECURSIVE slot(i) AS (
+        SELECT 0 UNION ALL SELECT i + 1 FROM slot WHERE i < {MAX_ENEMIES - 1}
+    )
+    SELECT state_id * {MAX_ENEMIES} + enemy_index, state_id, enemy_index,
+           {int_fields}
+    FROM (
+        SELECT g.id AS state_id, slot.i AS enemy_index,
+               {hex_fields}
+        FROM game_state g JOIN slot ON slot.i < length(g.enemy_data) / {size}
+        WHERE g.enemy_data IS NOT NULL
+    )
+'''
+
+
+def _object_type(cursor, name: str):
+    """'table', 'view' or None for a schema object"""
+    row = cursor.execute(
+        'SELECT type FROM sqlite_master WHERE name = ? AND type IN (?, ?)',
+        (name, 'table', 'view')
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _rename_table(cursor, old: str, new: str):
+    """Rename without rewriting views that refer to the old name
+
+    The replacement view or table takes over the old name, so existing
+    views (cobol_state) keep working against it.
+    """
+    cursor.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        cursor.execute(f'ALTER TABLE {old} RENAME TO {new}')
+    finally:
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+
+
+def has_packed_enemies(conn) -> bool:
+    """True if game_state has the enemy_data column"""
+    return any(row[1] == 'enemy_data' for row in conn.execute('PRAGMA table_info(game_state)'))
+
+
+def _pack_existing_rows(cursor, table: str):
+    """Fill enemy_data from per-enemy rows for states that have none"""
+    rows = cursor.execute(f'''
+        SELECT e.state_id, e.type, e.health, e.x, e.y, e.distance
+        FROM {table} e JOIN game_state g ON g.id = e.state_id
+        WHERE g.enemy_data IS NULL
+        ORDER BY e.state_id, e.enemy_index
+    ''')
+
+    grouped = defaultdict(list)
+    for state_id, *values in rows:
+        grouped[state_id].append(dict(zip(ENEMY_FIELDS, values)))
+
+    cursor.executemany(
+        'UPDATE game_state SET enemy_data = ? WHERE id = ?',
+        [(pack_enemies(enemies), state_id) for state_id, enemies in grouped.items()]
+    )
+    if grouped:
+        logger.info(f"Packed enemy rows for {len(grouped)} existing states")
+
+
+def _unpack_existing_blobs(cursor):
+    """Write per-enemy rows for states that only have enemy_data"""
+    states = cursor.execute('''
+        SELECT g.id, g.enemy_data FROM game_state g
+        WHERE g.enemy_data IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM enemies e WHERE e.state_id = g.id)
+    ''').fetchall()
+
+    cursor.executemany(
+        'INSERT INTO enemies (state_id, enemy_index, type, health, x, y, distance) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [
+            (state_id, i, *enemy)
+            for state_id, blob in states
+            for i, enemy in enumerate(iter_enemies(blob))
+        ]
+    )
+    if states:
+        logger.info(f"Unpacked enemy data into rows for {len(states)} states")
+
+
+def ensure_enemy_storage(cursor, mode: str = 'rows'):
+    """Make enemies a table of rows, or a view over game_state.enemy_data
+
+    Switching to packed mode packs existing rows into enemy_data and keeps
+    the rows table as enemies_rows. Switching back restores it and writes
+    rows for states captured in packed mode.
+    """
+    if mode not in ENEMY_STORAGE_MODES:
+        raise ValueError(f"Unknown enemy storage mode: {mode}")
+
+    ensure_column(cursor, 'game_state', 'enemy_data', 'BLOB')
+    current = _object_type(cursor, 'enemies')
+
+    if mode == 'packed':
+        if current == 'view':
+            return
+        if current == 'table':
+            if _object_type(cursor, ENEMY_ROWS_TABLE):
+                raise RuntimeError(f"Both enemies and {ENEMY_ROWS_TABLE} exist")
+            _pack_existing_rows(cursor, 'enemies')
+            _rename_table(cursor, 'enemies', ENEMY_ROWS_TABLE)
+        cursor.execute(_enemies_view_sql())
+        return
+
+    if current == 'view':
+        cursor.execute('DROP VIEW enemies')
+        if _object_type(cursor, ENEMY_ROWS_TABLE):
+            _rename_table(cursor, ENEMY_ROWS_TABLE, 'enemies')
+    cursor.execute(ENEMIES_TABLE)
+    if current == 'view':
+        _unpack_existing_blobs(cursor)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+DOOM State Flight Recorder
+Appends raw state packets to preallocated memory-mapped segment files;
+SQLite rows are built from the segments afterwards by RecorderIndexer
+"""
+
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import logging
+from typing import Callable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'DOOMFR01'
+SEGMENT_HEADER = struct.Struct('<8sQdQ')   # magic, segment number, created, segment size
+SEGMENT_HEADER_SIZE = 64                   # header padded so records start aligned
+
+# marker, session, tick, receive timestamp, payload length. The marker is
+# written last, so a record without it was never completed.
+RECORD_HEADER = struct.Struct('<IIIdI')
+RECORD_MARKER = 0x43455244  # 'DREC'
+RECORD_ALIGN = 8
+
+SEGMENT_SUFFIX = '.dfr'
+
+PROGRESS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS recorder_progress (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        segment INTEGER,
+        offset INTEGER,
+        updated REAL
+    )
+'''
+
+
+def segment_path(directory: str, number: int) -> str:
+    """Path of a numbered segment file"""
+    return os.path.join(directory, f"segment-{number:08d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """(number, path) of every segment, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith('segment-') and name.endswith(SEGMENT_SUFFIX):
+            number = int(name[len('segment-'):-len(SEGMENT_SUFFIX)])
+            segments.append((number, os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def _aligned(size: int) -> int:
+    return (size + RECORD_ALIGN - 1) & ~(RECORD_ALIGN - 1)
+
+
+def read_records(path: str, offset: int = SEGMENT_HEADER_SIZE
+                 ) -> Iterator[Tuple[int, int, int, float, bytes, int]]:
+    """Yield (session, tick, received_at, payload, offset, next_offset) from a segment
+
+    Stops at the first incomplete record, which is where the writer will
+    append next (or where it stopped, for a crashed recorder).
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < SEGMENT_HEADER_SIZE:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            magic = SEGMENT_HEADER.unpack_from(view, 0)[0]
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"Not a flight recorder segment: {path}")
+
+            end = len(view)
+            while offset + RECORD_HEADER.size <= end:
+                marker, session, tick, received_at, length = RECORD_HEADER.unpack_from(view, offset)
+                payload_start = offset + RECORD_HEADER.size
+                if marker != RECORD_MARKER or payload_start + length > end:
+                    return
+
+                next_offset = offset + _aligned(RECORD_HEADER.size + length)
+                yield session, tick, received_at, view[payload_start:payload_start + length], offset, next_offset
+                offset = next_offset
+
+
+class FlightRecorder:
+    """Append-only segment writer
+
+    Each append is a bounds check plus two memcpys into the current
+    mapped segment. Segments are preallocated at `segment_size` and
+    msync'd every `flush_interval` seconds by a background thread, so a
+    process crash loses nothing and a machine crash loses at most the
+    unflushed tail of the current segment.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1.0):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.file = None
+        self.map = None
+        self.segment = 0
+        self.offset = 0
+        self.dirty = False
+        self.running = False
+        self.thread = None
+        self.stats = {
+            'records': 0,
+            'bytes': 0,
+            'segments': 0,
+            'flushes': 0,
+            'oversize_dropped': 0
+        }
+
+    def start(self):
+        """Open a fresh segment after any existing ones and start flushing"""
+        os.makedirs(self.directory, exist_ok=True)
+        existing = list_segments(self.directory)
+        self.segment = existing[-1][0] if existing else 0
+
+        with self.lock:
+            self._open_segment()
+
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, name="recorder-flush", daemon=True)
+        self.thread.start()
+        logger.info(f"Flight recorder writing to {self.directory} "
+                    f"({self.segment_size // (1024 * 1024)} MiB segments)")
+
+    def append(self, session_id: int, tick: int, received_at: float, data: bytes) -> Tuple[int, int]:
+        """Append one raw packet, returning (segment, offset) of its record"""
+        length = len(data)
+        size = _aligned(RECORD_HEADER.size + length)
+        if size > self.segment_size - SEGMENT_HEADER_SIZE:
+            self.stats['oversize_dropped'] += 1
+            raise ValueError(f"Packet of {length} bytes does not fit in a segment")
+
+        with self.lock:
+            if self.offset + size > self.segment_size:
+                self._seal_segment()
+                self._open_segment()
+
+            offset = self.offset
+            start = offset + RECORD_HEADER.size
+            self.map[start:start + length] = data
+            # Everything but the marker first; the marker commits the record
+            RECORD_HEADER.pack_into(self.map, offset, 0, session_id or 0, tick, received_at, length)
+            struct.pack_into('<I', self.map, offset, RECORD_MARKER)
+
+            self.offset += size
+            self.dirty = True
+            self.stats['records'] += 1
+            self.stats['bytes'] += length
+            return self.segment, offset
+
+    def flush(self):
+        """msync the current segment"""
+        with self.lock:
+            if self.map and self.dirty:
+                self.map.flush()
+                self.dirty = False
+                self.stats['flushes'] += 1
+
+    def close(self):
+        """Flush and close the current segment"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+        with self.lock:
+            if self.map:
+                self._seal_segment()
+
+    def _open_segment(self):
+        """Create and map the next preallocated segment"""
+        self.segment += 1
+        path = segment_path(self.directory, self.segment)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, self.segment_size)
+            else:
+                os.ftruncate(fd, self.segment_size)
+        except OSError:
+            os.ftruncate(fd, self.segment_size)
+
+        self.file = os.fdopen(fd, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), self.segment_size)
+        SEGMENT_HEADER.pack_into(self.map, 0, SEGMENT_MAGIC, self.segment, time.time(), self.segment_size)
+        self.offset = SEGMENT_HEADER_SIZE
+        self.stats['segments'] += 1
+
+    def _seal_segment(self):
+        """Flush and unmap the current segment"""
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+        self.map = None
+        self.file = None
+        self.dirty = False
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class RecorderIndexer:
+    """Builds SQLite rows from recorder segments in the background
+
+    Records are handed to `on_record(session_id, tick, received_at, raw)`
+    in segment order. Every `checkpoint_interval` seconds `checkpoint()`
+    is called to make everything handed over so far durable, and then
+    the segment/offset reached is saved in recorder_progress, so a
+    restart resumes where the last checkpoint left off.
+    """
+
+    def __init__(self, directory: str, db_path: str,
+                 on_record: Callable[[int, int, float, bytes], None],
+                 checkpoint: Callable[[], None],
+                 checkpoint_interval: float = 5.0, poll_interval: float = 0.05):
+        self.directory = directory
+        self.db_path = db_path
+        self.on_record = on_record
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.poll_interval = poll_interval
+        self.running = False
+        self.thread = None
+        self.conn = None
+        self.segment = 0
+        self.offset = SEGMENT_HEADER_SIZE
+        self.stats = {
+            'indexed': 0,
+            'errors': 0,
+            'checkpoints': 0
+        }
+
+    def start(self):
+        """Resume from the saved position and start indexing"""
+        self.running = True
+        self.thread = threading.Thread(target=self._index_loop, name="recorder-index", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Index everything recorded so far, checkpoint and stop"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _load_progress(self):
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute(PROGRESS_TABLE)
+        self.conn.commit()
+
+        row = self.conn.execute('SELECT segment, offset FROM recorder_progress WHERE id = 1').fetchone()
+        if row:
+            self.segment, self.offset = row
+            logger.info(f"Recorder indexer resuming at segment {self.segment} offset {self.offset}")
+
+    def _save_progress(self):
+        self.checkpoint()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO recorder_progress (id, segment, offset, updated) VALUES (1, ?, ?, ?)',
+            (self.segment, self.offset, time.time())
+        )
+        self.conn.commit()
+        self.stats['checkpoints'] += 1
+
+    def _index_loop(self):
+        self._load_progress()
+        last_checkpoint = time.monotonic()
+
+        while True:
+            stopping = not self.running
+            progressed = self._index_available()
+
+            if time.monotonic() - last_checkpoint >= self.checkpoint_interval or stopping:
+                self._save_progress()
+                last_checkpoint = time.monotonic()
+
+            if stopping:
+                break
+            if not progressed:
+                time.sleep(self.poll_interval)
+
+        self.conn.close()
+        self.conn = None
+
+    def _index_available(self) -> bool:
+        """Index whatever is readable now; True if anything was indexed"""
+        progressed = False
+
+        for number, path in list_segments(self.directory):
+            if number < self.segment:
+                continue
+            if number > self.segment:
+                # Previous segment is sealed; move on to the next one
+                self.segment = number
+                self.offset = SEGMENT_HEADER_SIZE
+
+            for session, tick, received_at, payload, _, next_offset in read_records(path, self.offset):
+                try:
+                    self.on_record(session, tick, received_at, bytes(payload))
+                    self.stats['indexed'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f"Indexing record at {number}:{self.offset} failed: {e}")
+                self.offset = next_offset
+                progressed = True
+
+        return progressed
+
+
+def main():
+    """Print a summary of recorder segments"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DOOM state flight recorder segments')
+    parser.add_argument('directory', help='Recorder segment directory')
+    args = parser.parse_args()
+
+    for number, path in list_segments(args.directory):
+        records = 0
+        size = 0
+        first = last = None
+        for session, tick, received_at, payload, _, next_offset in read_records(path):
+            records += 1
+            size = next_offset
+            first = first or received_at
+            last = received_at
+        span = f"{time.strftime('%H:%M:%S', time.localtime(first))}-{time.strftime('%H:%M:%S', time.localtime(last))}" if records else '-'
+        print(f"segment {number:08d}: {records:>8} records, {size / 1e6:7.1f} MB used, {span}")
+
+
+if __name__ == "__main__":
+    main()
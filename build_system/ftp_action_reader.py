@@ -12,6 +12,8 @@ from typing import List, Dict, Optional
 import threading
 import queue
 
+from ebcdic import decode_records
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -169,24 +171,20 @@ class FTPActionReader:
                 with open(filepath, 'rb') as f:
                     data = f.read()
                     
-                # Process 80-byte records
-                for i in range(0, len(data), 80):
-                    record = data[i:i+80]
-                    if len(record) == 80:
-                        # Convert from EBCDIC
-                        try:
-                            text = record.decode('cp037')
-                            cmd = COBOLCommandParser.parse_record(text)
-                            if cmd:
-                                doom_cmd = COBOLCommandParser.command_to_doom_format(cmd)
-                                self.command_queue.put({
-                                    'source': 'cobol_ebcdic',
-                                    'command': doom_cmd,
-                                    'cobol': cmd,
-                                    'timestamp': time.time()
-                                })
-                        except Exception as e:
-                            logger.error(f"EBCDIC decode error: {e}")
+                # Process 80-byte records, converted from EBCDIC in one pass
+                for text in decode_records(data):
+                    try:
+                        cmd = COBOLCommandParser.parse_record(text)
+                        if cmd:
+                            doom_cmd = COBOLCommandParser.command_to_doom_format(cmd)
+                            self.command_queue.put({
+                                'source': 'cobol_ebcdic',
+                                'command': doom_cmd,
+                                'cobol': cmd,
+                                'timestamp': time.time()
+                            })
+                    except Exception as e:
+                        logger.error(f"EBCDIC record error: {e}")
                             
             logger.info(f"Queued {self.command_queue.qsize()} commands")
             
@@ -16,6 +16,9 @@ from datetime import datetime
 import ftplib
 from io import BytesIO
 
+from ebcdic import decode_text, encode_records, iter_records, to_ebcdic
+from dataset_catalog import dataset_catalog
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -37,9 +40,9 @@ class DoomCommand:
         try:
             # Convert from EBCDIC if needed
             if record[0] > 127:  # Likely EBCDIC
-                ascii_record = record.decode('cp037')
+                ascii_record = decode_text(record)
             else:
-                ascii_record = record.decode('ascii')
+                ascii_record = bytes(record).decode('ascii')
                 
             # Parse fixed-width fields according to DOOM-COMMAND-RECORD
             record_type = ascii_record[0:8].strip()
@@ -97,23 +100,23 @@ class CommandFileMonitor:
     def __init__(self, commands_path: str = "cobol_datasets/DOOM.COMMANDS"):
         self.commands_path = Path(commands_path)
         self.last_mtime = 0
-        self.last_size = 0
+        self.last_generation = 0
         self.commands_buffer: List[DoomCommand] = []
         self.lock = threading.Lock()
         
-        # Create directory if needed
-        self.commands_path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared with the mapper; DOOMAI2 rewrites the file in place, so
+        # it is read once per change rather than mapped
+        self.catalog = dataset_catalog(self.commands_path.parent)
+        self.dataset = self.commands_path.name
+        self.catalog.define(self.dataset, recfm='FB', lrecl=80, mapped=False)
         
     def check_for_updates(self) -> bool:
         """Check if commands file has been updated"""
-        if not self.commands_path.exists():
-            return False
-            
         try:
-            stat = os.stat(self.commands_path)
-            if stat.st_mtime > self.last_mtime or stat.st_size != self.last_size:
-                self.last_mtime = stat.st_mtime
-                self.last_size = stat.st_size
+            entry = self.catalog.get(self.dataset)
+            if entry and entry.generation != self.last_generation:
+                self.last_generation = entry.generation
+                self.last_mtime = entry.stamp[2] / 1e9
                 return True
                 
         except Exception as e:
@@ -126,18 +129,17 @@ class CommandFileMonitor:
         commands = []
         
         try:
-            with open(self.commands_path, 'rb') as f:
-                # Read 80-byte records
-                while True:
-                    record = f.read(80)
-                    if not record or len(record) < 80:
-                        break
-                        
-                    cmd = DoomCommand.from_cobol_record(record)
-                    if cmd:
-                        commands.append(cmd)
-                        logger.info(f"Parsed command: {cmd.action} {cmd.direction} {cmd.value}")
-                        
+            entry = self.catalog.get(self.dataset)
+            if not entry:
+                return commands
+                
+            # Parse 80-byte records in place
+            for record in iter_records(entry.view()):
+                cmd = DoomCommand.from_cobol_record(record)
+                if cmd:
+                    commands.append(cmd)
+                    logger.info(f"Parsed command: {cmd.action} {cmd.direction} {cmd.value}")
+                    
         except Exception as e:
             logger.error(f"Error reading commands: {e}")
             
@@ -207,14 +209,7 @@ class FTPCommandGateway:
             
         try:
             # Convert commands to EBCDIC records
-            data = BytesIO()
-            for cmd in commands:
-                # Format for FTP transfer
-                record = cmd.to_ftp_format().ljust(80)
-                ebcdic_record = record.encode('cp037')
-                data.write(ebcdic_record)
-                
-            data.seek(0)
+            data = BytesIO(encode_records(cmd.to_ftp_format() for cmd in commands))
             
             # Upload to output dataset
             self.ftp.voidcmd('SITE RECFM=FB LRECL=80')
@@ -277,7 +272,7 @@ class FTPCommandGateway:
                     status += f"LAST_UPLOAD: {datetime.fromtimestamp(last_upload)}\n"
                     
                     # Upload status
-                    status_data = BytesIO(status.encode('cp037'))
+                    status_data = BytesIO(to_ebcdic(status))
                     self.ftp.storbinary("STOR 'DOOM.STATUS.OUT'", status_data)
                     self.clear_dataset('DOOM.STATUS.REQ')
                     
@@ -311,6 +306,7 @@ class CommandStatusServer:
                         status = {
                             'pending_commands': len(self.server.monitor.commands_buffer),
                             'last_check': self.server.monitor.last_mtime,
+                            'generation': self.server.monitor.last_generation,
                             'commands_file': str(self.server.monitor.commands_path)
                         }
                         
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Atomic, change-aware MVS dataset publishing
+Datasets are written to a temporary file and renamed over the old one,
+so readers such as the FTP gateway always see a complete generation
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Sequence, Union
+
+from ebcdic import decode_text, encode_records, pad_record
+from record_formats import dataset_lrecl, read_records, reblock
+
+logger = logging.getLogger(__name__)
+
+# Sidecar next to each published dataset: generation, digest, size
+GENERATION_SUFFIX = '.GEN'
+ASCII_SUFFIX = '.ASCII'
+
+# Newline-terminated text records (the mapper's datasets), in the
+# GnuCOBOL sense of ORGANIZATION LINE SEQUENTIAL. Every other record
+# format (F/FB/V/VB) holds EBCDIC records.
+LINE_SEQUENTIAL = 'LS'
+
+PathLike = Union[str, Path]
+
+
+def atomic_write(path: PathLike, data: bytes):
+    """Replace `path` with `data` in one rename (temp file in the same directory)"""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def dataset_digest(data: bytes) -> str:
+    """Content hash used to tell dataset generations apart"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def write_generation(path: PathLike, generation: int, digest: str, size: int, records: int,
+                     **attributes):
+    """Record a dataset's generation info (and RECFM/LRECL/BLKSIZE/layout) in its sidecar"""
+    atomic_write(f'{path}{GENERATION_SUFFIX}', json.dumps({
+        'generation': generation,
+        'digest': digest,
+        'bytes': size,
+        'records': records,
+        'published': time.time(),
+        **attributes,
+    }).encode('ascii'))
+
+
+def read_generation(path: PathLike) -> Dict[str, Any]:
+    """Generation info of a published dataset ({} if never published)"""
+    try:
+        with open(f'{path}{GENERATION_SUFFIX}') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class DatasetPublisher:
+    """Publishes successive versions of one EBCDIC dataset
+
+    Each publish that changes the encoded bytes is written atomically and
+    bumps the generation number (kept in the .GEN sidecar, so it survives
+    restarts); a publish with the same bytes as the current generation
+    writes nothing. The .ASCII debug copy is only kept with `ascii_copy`.
+    Records are `lrecl` columns wide; with recfm='VB' they are stored
+    without trailing blanks, in BLKSIZE blocks. Records of a binary
+    `layout` (anything but 'display', e.g. COMP/COMP-3 GAMESTAT records)
+    are EBCDIC bytes already: VB keeps them whole, and they have no
+    .ASCII copy. recfm='LS' (line sequential) datasets are published
+    as given through publish_bytes().
+    """
+
+    def __init__(self, path: PathLike, lrecl: int = 80, ascii_copy: bool = False,
+                 recfm: str = 'FB', blksize: int = 3200, layout: str = 'display'):
+        self.path = Path(path)
+        self.lrecl = lrecl
+        self.ascii_copy = ascii_copy
+        self.recfm = recfm
+        self.blksize = blksize
+        self.layout = layout
+        info = read_generation(self.path) if self.path.exists() else {}
+        self.generation = info.get('generation', 0)
+        self.digest = info.get('digest')
+        self.stats = {'published': 0, 'unchanged': 0}
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """Dataset attributes as recorded in the sidecar"""
+        return {'recfm': self.recfm, 'lrecl': dataset_lrecl(self.recfm, self.lrecl), 'blksize': self.blksize,
+                'layout': self.layout}
+
+    @property
+    def binary(self) -> bool:
+        return self.layout != 'display'
+
+    def publish(self, records: Sequence[Union[str, bytes]]) -> bool:
+        """Publish text records (EBCDIC records if binary); True if a new generation was written"""
+        if self.binary:
+            data = b''.join([pad_record(record, self.lrecl) for record in records])
+            return self.publish_bytes(reblock(data, self.recfm, self.lrecl, self.blksize, fill=None))
+        return self.publish_bytes(reblock(encode_records(records, self.lrecl), self.recfm, self.lrecl, self.blksize))
+
+    def publish_bytes(self, data: bytes) -> bool:
+        """Publish an already encoded (and blocked) dataset"""
+        digest = dataset_digest(data)
+        if digest == self.digest:
+            self.stats['unchanged'] += 1
+            return False
+
+        attributes = self.attributes
+        text = self.recfm == LINE_SEQUENTIAL
+        records = [] if text else list(read_records(data, self.recfm, attributes['lrecl']))
+        atomic_write(self.path, data)
+        # Other writers (the catalog) may have published since
+        self.generation = max(self.generation, read_generation(self.path).get('generation', 0)) + 1
+        self.digest = digest
+        write_generation(self.path, self.generation, digest, len(data),
+                         data.count(b'\n') if text else len(records), **attributes)
+
+        if self.ascii_copy and not self.binary and not text:
+            text = ''.join(decode_text(record) + '\n' for record in records)
+            atomic_write(f'{self.path}{ASCII_SUFFIX}', text.encode('latin-1'))
+
+        self.stats['published'] += 1
+        return True
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+DOOM.GAMESTAT Record Codec
+Every DOOMSTAT.CPY record this project writes or reads, encoded and
+decoded through one copybook-driven layout; DOOMSTAC.CPY is the same
+GAMESTAT records with binary and packed decimal numbers
+"""
+
+import os
+import time
+import logging
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from copybook import Copybook, NUMPY_AVAILABLE
+from doom_state_codec import iter_enemies
+from ebcdic import EBCDIC_SPACE, iter_records, to_ascii, to_ebcdic
+from state_compaction import run_ticks
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LRECL = 80
+COMPACT_LRECL = 32
+
+# DOOMSTAT_COPYBOOK (DOOMSTAC_COPYBOOK) overrides the copybook shipped in cobol/
+COPYBOOK_PATH = os.environ.get(
+    'DOOMSTAT_COPYBOOK', str(Path(__file__).resolve().parent.parent / 'cobol' / 'DOOMSTAT.CPY')
+)
+COMPACT_COPYBOOK_PATH = os.environ.get(
+    'DOOMSTAC_COPYBOOK', str(Path(__file__).resolve().parent.parent / 'cobol' / 'DOOMSTAC.CPY')
+)
+
+# GAMESTAT record layouts: zoned decimal text, or COMP/COMP-3 EBCDIC
+DISPLAY_LAYOUT = 'display'
+COMPACT_LAYOUT = 'compact'
+LAYOUTS = {
+    DISPLAY_LAYOUT: (COPYBOOK_PATH, LRECL),
+    COMPACT_LAYOUT: (COMPACT_COPYBOOK_PATH, COMPACT_LRECL),
+}
+
+# game_state columns a GAMESTAT dataset is built from, in row order
+GAMESTAT_COLUMNS = (
+    'tick', 'level', 'timestamp', 'x', 'y', 'z', 'angle', 'health', 'armor',
+    'ammo_bullets', 'ammo_shells', 'ammo_cells', 'ammo_rockets', 'weapon'
+)
+
+# Record type (cobol_state.record_type) -> copybook group
+RECORD_GROUPS = {
+    'STATE': 'STATE-HEADER',
+    'PLAYER': 'PLAYER-RECORD',
+    'AMMO': 'AMMUNITION-RECORD',
+    'ENEMY': 'ENTITY-ENTRY',
+}
+
+MAX_ENTITIES = 16
+
+# Binary records of fewer states are packed one record at a time: below
+# this the set-up of the column-at-a-time encoder costs more than it saves
+COLUMN_STATES = 16
+
+# ASCII text for display layouts, EBCDIC bytes for binary ones
+Record = Union[str, bytes]
+
+
+def angle_degrees(angle: int) -> int:
+    """BAM angle (any sign) to whole degrees 0..359"""
+    return ((angle & 0xFFFFFFFF) * 360) >> 32
+
+
+def gamestat_date(timestamp: float) -> int:
+    """STATE-TIMESTAMP value: local date as YYYYMMDD"""
+    t = time.localtime(timestamp)
+    return t.tm_year * 10000 + t.tm_mon * 100 + t.tm_mday
+
+
+@lru_cache(maxsize=None)
+def load_copybook(path: str = COPYBOOK_PATH) -> Copybook:
+    """Parse a copybook once per process"""
+    return Copybook.load(path)
+
+
+class GamestatCodec:
+    """Compiled encoders for the STATE, PLAYER, AMMO and ENEMY records
+
+    Positions are map units (fixed point >> 16), angles whole degrees and
+    health is clamped at 0, since the unsigned PIC fields would otherwise
+    show a dead player's negative health as positive.
+
+    With a copybook whose records have COMP/COMP-3 fields (DOOMSTAC.CPY)
+    the codec is `binary`: records are EBCDIC bytes, ready to be blocked
+    as they are.
+    """
+
+    def __init__(self, copybook: Optional[Copybook] = None, lrecl: int = LRECL):
+        book = copybook or load_copybook()
+        self.lrecl = lrecl
+        self.codecs = {rtype: book.codec(group, lrecl) for rtype, group in RECORD_GROUPS.items()}
+        self.binary = any(codec.binary for codec in self.codecs.values())
+        # Records are told apart by their first (record-type) field
+        self.type_tags = {}
+        for rtype, codec in self.codecs.items():
+            tag = codec.encoder()()[:codec.layout.fields[0].size]
+            self.type_tags[rtype] = tag if self.binary else tag.encode('ascii')
+        self._state = self.codecs['STATE'].encoder('STATE-TICK', 'STATE-LEVEL', 'STATE-TIMESTAMP')
+        self._player = self.codecs['PLAYER'].encoder(
+            'PLAYER-X', 'PLAYER-Y', 'PLAYER-Z', 'PLAYER-ANGLE',
+            'PLAYER-HEALTH', 'PLAYER-ARMOR', 'PLAYER-STATUS'
+        )
+        self._ammo = self.codecs['AMMO'].encoder(
+            'AMMO-BULLETS', 'AMMO-SHELLS', 'AMMO-CELLS', 'AMMO-ROCKETS', 'CURRENT-WEAPON'
+        )
+        self._enemy = self.codecs['ENEMY'].encoder(
+            'ENTITY-TYPE', 'ENTITY-HEALTH', 'ENTITY-X', 'ENTITY-Y', 'ENTITY-DISTANCE'
+        )
+        # DOOM.STATE (DOOMAI's input) only exists in the display layout
+        self.summary = None
+        if 'DOOM-STATE-SUMMARY' in book.items:
+            self.summary = book.codec('DOOM-STATE-SUMMARY', LRECL)
+            self._summary = self.summary.encoder(
+                'SUMMARY-TICK', 'SUMMARY-PLAYER-X', 'SUMMARY-PLAYER-Y', 'SUMMARY-PLAYER-Z',
+                'SUMMARY-PLAYER-ANGLE', 'SUMMARY-HEALTH', 'SUMMARY-ARMOR',
+                *(f'SUMMARY-AMMO({i})' for i in range(1, 7)), 'SUMMARY-WEAPON', 'SUMMARY-LEVEL'
+            )
+
+    @property
+    def fill(self) -> Optional[int]:
+        """Padding VB records may drop (none for binary records, whose last bytes can be data)"""
+        return None if self.binary else EBCDIC_SPACE
+
+    def records(self, row: Sequence, enemies: Iterable[Sequence] = ()) -> List[Tuple[str, Record]]:
+        """(record type, LRECL-byte record) for one state
+
+        `row` holds GAMESTAT_COLUMNS in order; `enemies` yields
+        (type, health, x, y, distance) tuples, of which the first 16 are kept.
+        """
+        (tick, level, timestamp, x, y, z, angle, health, armor,
+         bullets, shells, cells, rockets, weapon) = row
+        records = [
+            ('STATE', self._state(tick, level, gamestat_date(timestamp))),
+            ('PLAYER', self._player(x >> 16, y >> 16, z >> 16, angle_degrees(angle),
+                                    max(health, 0), armor, 'D' if health <= 0 else 'A')),
+            ('AMMO', self._ammo(bullets, shells, cells, rockets, weapon)),
+        ]
+        enemy = self._enemy
+        for n, (etype, ehealth, ex, ey, distance) in enumerate(enemies):
+            if n == MAX_ENTITIES:
+                break
+            records.append(('ENEMY', enemy(etype, max(ehealth, 0), ex >> 16, ey >> 16, distance >> 16)))
+        return records
+
+    def state_records(self, state: Dict[str, Any], timestamp: float) -> List[Tuple[str, Record]]:
+        """records() for a parsed state packet"""
+        ammo = state['ammo']
+        return self.records(
+            (state['tick'], state['level'], timestamp, state['x'], state['y'], state['z'],
+             state['angle'], state['health'], state['armor'],
+             ammo[0], ammo[1], ammo[2], ammo[3], state['weapon']),
+            ((e['type'], e['health'], e['x'], e['y'], e['distance']) for e in state['enemies'])
+        )
+
+    def latest_records(self, latest: Dict[str, Any]) -> List[Tuple[str, Record]]:
+        """records() for a latest_state row (as a column -> value dict)
+
+        latest_state carries the tick and time a run of idle states has
+        reached, and always holds packed enemies.
+        """
+        return self.records([latest[column] for column in GAMESTAT_COLUMNS],
+                            iter_enemies(latest['enemy_data']))
+
+    def encode_states(self, states: Iterable[Tuple[Sequence, Iterable[Sequence]]],
+                      out: Optional[bytearray] = None, terminator: str = '') -> bytearray:
+        """GAMESTAT records of many (row, enemies) states, appended to one buffer
+
+        Display layouts give ASCII records; `terminator` follows every
+        record ('\n' for the line-per-record text datasets). Binary
+        (COMP/COMP-3) layouts give EBCDIC records, which have no
+        terminator.
+        """
+        out = bytearray() if out is None else out
+        if self.binary:
+            if terminator:
+                raise ValueError("Binary GAMESTAT records cannot be line sequential")
+            states = list(states)
+            if NUMPY_AVAILABLE and len(states) >= COLUMN_STATES:
+                out += self._encode_columns(states)
+            else:
+                for row, enemies in states:
+                    out += b''.join([record for _, record in self.records(row, enemies)])
+            return out
+        for row, enemies in states:
+            out += ''.join([record + terminator for _, record in self.records(row, enemies)]).encode('ascii')
+        return out
+
+    def _encode_columns(self, states: Iterable[Tuple[Sequence, Iterable[Sequence]]]) -> bytes:
+        """records() of many states, each field of each record type encoded for all states at once"""
+        rows, enemies, counts = [], [], []
+        for row, state_enemies in states:
+            rows.append(row)
+            before = len(enemies)
+            enemies.extend(islice(state_enemies, MAX_ENTITIES))
+            counts.append(len(enemies) - before)
+        if not rows:
+            return b''
+
+        # Each state is STATE, PLAYER, AMMO, then its ENEMY records
+        counts = np.asarray(counts, dtype=np.int64)
+        starts = np.cumsum(counts + 3) - (counts + 3)
+        table = np.empty((int(starts[-1] + counts[-1] + 3), self.lrecl), dtype=np.uint8)
+
+        (tick, level, timestamp, x, y, z, angle, health, armor,
+         bullets, shells, cells, rockets, weapon) = (np.asarray(column) for column in zip(*rows))
+        table[starts] = self.codecs['STATE'].encode_columns({
+            'STATE-TICK': tick, 'STATE-LEVEL': level,
+            'STATE-TIMESTAMP': [gamestat_date(t) for t in timestamp.tolist()],
+        })
+        table[starts + 1] = self.codecs['PLAYER'].encode_columns({
+            'PLAYER-X': x >> 16, 'PLAYER-Y': y >> 16, 'PLAYER-Z': z >> 16,
+            'PLAYER-ANGLE': ((angle.astype(np.int64) & 0xFFFFFFFF) * 360) >> 32,
+            'PLAYER-HEALTH': np.maximum(health, 0), 'PLAYER-ARMOR': armor,
+            'PLAYER-STATUS': np.where(health <= 0, 'D', 'A'),
+        })
+        table[starts + 2] = self.codecs['AMMO'].encode_columns({
+            'AMMO-BULLETS': bullets, 'AMMO-SHELLS': shells, 'AMMO-CELLS': cells,
+            'AMMO-ROCKETS': rockets, 'CURRENT-WEAPON': weapon,
+        })
+        if enemies:
+            first = np.repeat(starts + 3, counts)
+            rank = np.arange(len(enemies)) - np.repeat(np.cumsum(counts) - counts, counts)
+            etype, ehealth, ex, ey, distance = (np.asarray(column) for column in zip(*enemies))
+            table[first + rank] = self.codecs['ENEMY'].encode_columns({
+                'ENTITY-TYPE': etype, 'ENTITY-HEALTH': np.maximum(ehealth, 0),
+                'ENTITY-X': ex >> 16, 'ENTITY-Y': ey >> 16, 'ENTITY-DISTANCE': distance >> 16,
+            })
+        return table.tobytes()
+
+    def decode_dataset(self, data: bytes) -> Dict[str, Dict[str, Any]]:
+        """Columns of every record type in a fixed-length GAMESTAT dataset
+
+        Records are grouped by their type field, then each group is
+        decoded with RecordCodec.decode_many (NumPy arrays when available).
+        The dataset is ASCII, or EBCDIC for binary layouts.
+        """
+        lrecl = self.lrecl
+        width = len(next(iter(self.type_tags.values())))
+        count = len(data) // lrecl
+        if not NUMPY_AVAILABLE:
+            groups = {rtype: bytearray() for rtype in self.codecs}
+            tags = {tag: rtype for rtype, tag in self.type_tags.items()}
+            for i in range(0, count * lrecl, lrecl):
+                rtype = tags.get(bytes(data[i:i + width]))
+                if rtype:
+                    groups[rtype] += data[i:i + lrecl]
+            return {rtype: self.codecs[rtype].decode_many(bytes(groups[rtype])) for rtype in self.codecs}
+
+        table = np.frombuffer(data, dtype=np.uint8, count=count * lrecl).reshape(count, lrecl)
+        tags = np.ascontiguousarray(table[:, :width]).view(f'S{width}').ravel()
+        return {
+            rtype: self.codecs[rtype].decode_many(table[tags == tag].tobytes())
+            for rtype, tag in self.type_tags.items()
+        }
+
+    def encode_summary(self, tick: int, player_x: int, player_y: int, player_z: int,
+                       player_angle: int, health: int, armor: int, ammo: Sequence[int],
+                       current_weapon: int, level: int) -> str:
+        """DOOM.STATE record (DOOM-STATE-SUMMARY), as read by DOOMAI"""
+        if self.summary is None:
+            raise ValueError("This copybook has no DOOM-STATE-SUMMARY record")
+        ammo = (list(ammo) + [0] * 6)[:6]
+        return self._summary(tick, player_x, player_y, player_z, player_angle,
+                             max(health, 0), armor, *ammo, current_weapon, level)
+
+    def decode_summary(self, record) -> Dict[str, Any]:
+        """DOOM.STATE record (str or ASCII bytes) back into encode_summary() fields"""
+        if self.summary is None:
+            raise ValueError("This copybook has no DOOM-STATE-SUMMARY record")
+        values = self.summary.decode(record)
+        return {
+            'tick': values['SUMMARY-TICK'],
+            'player_x': values['SUMMARY-PLAYER-X'],
+            'player_y': values['SUMMARY-PLAYER-Y'],
+            'player_z': values['SUMMARY-PLAYER-Z'],
+            'player_angle': values['SUMMARY-PLAYER-ANGLE'],
+            'health': values['SUMMARY-HEALTH'],
+            'armor': values['SUMMARY-ARMOR'],
+            'ammo': [values[f'SUMMARY-AMMO({i})'] for i in range(1, 7)],
+            'current_weapon': values['SUMMARY-WEAPON'],
+            'level': values['SUMMARY-LEVEL'],
+        }
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def iter_states(conn, start_tick: Optional[int] = None, end_tick: Optional[int] = None,
+                session_id: Optional[int] = None, first_id: Optional[int] = None,
+                chunk: int = 4096) -> Iterator[Tuple[Tuple, List[Tuple]]]:
+    """(row, enemies) for every state in a tick range, from one joined query
+
+    Rows hold GAMESTAT_COLUMNS; enemies come from enemy_data when a state
+    has it and from the joined enemies rows otherwise. Run-length rows
+    (state_compaction) are expanded to one state per tick, clipped to the
+    range, so every STATE header carries its own tick. States are read
+    `chunk` rows at a time in id order.
+    """
+    columns = _columns(conn, 'game_state')
+    select = [f'g.{name}' for name in GAMESTAT_COLUMNS]
+    select.append('g.tick_last' if 'tick_last' in columns else 'NULL')
+    select.append('g.timestamp_last' if 'timestamp_last' in columns else 'NULL')
+    select.append('g.enemy_data' if 'enemy_data' in columns else 'NULL')
+
+    where, params = [], []
+    if start_tick is not None:
+        where.append('COALESCE(g.tick_last, g.tick) >= ?' if 'tick_last' in columns else 'g.tick >= ?')
+        params.append(start_tick)
+    if end_tick is not None:
+        where.append('g.tick <= ?')
+        params.append(end_tick)
+    if session_id is not None:
+        where.append('g.session_id = ?')
+        params.append(session_id)
+    if first_id is not None:
+        where.append('g.id >= ?')
+        params.append(first_id)
+
+    join, order = '', 'g.id'
+    enemy_select = 'NULL, NULL, NULL, NULL, NULL'
+    # In packed databases enemies is a view decoding enemy_data; skip it
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'enemies' AND type = 'table'").fetchone():
+        join = f'LEFT JOIN enemies e ON e.state_id = g.id AND e.enemy_index < {MAX_ENTITIES}'
+        enemy_select = 'e.type, e.health, e.x, e.y, e.distance'
+        order = 'g.id, e.enemy_index'
+
+    cursor = conn.execute(f'''
+        SELECT g.id, {', '.join(select)}, {enemy_select}
+        FROM game_state g {join}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {order}
+    ''', params)
+
+    width = len(GAMESTAT_COLUMNS)
+    current_id = row = tick_last = timestamp_last = None
+    enemies: List[Tuple] = []
+
+    def states():
+        tick, timestamp = row[0], row[2]
+        for t, ts in run_ticks(tick, timestamp, tick_last, timestamp_last):
+            if (start_tick is None or t >= start_tick) and (end_tick is None or t <= end_tick):
+                yield (t, row[1], ts, *row[3:]), enemies
+
+    while True:
+        batch = cursor.fetchmany(chunk)
+        if not batch:
+            break
+        for record in batch:
+            if record[0] != current_id:
+                if current_id is not None:
+                    yield from states()
+                current_id = record[0]
+                row = record[1:1 + width]
+                tick_last, timestamp_last, blob = record[1 + width:4 + width]
+                enemies = list(iter_enemies(blob))[:MAX_ENTITIES] if blob is not None else []
+            if record[-5] is not None and blob is None:
+                enemies.append(record[-5:])
+    if current_id is not None:
+        yield from states()
+
+
+@lru_cache(maxsize=None)
+def gamestat_codec(layout: str = DISPLAY_LAYOUT) -> GamestatCodec:
+    """The process-wide codec for one of the shipped copybooks"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown GAMESTAT layout {layout!r} (choose from {', '.join(LAYOUTS)})")
+    path, lrecl = LAYOUTS[layout]
+    return GamestatCodec(load_copybook(path), lrecl)
+
+
+def convert_layout(data: bytes, source: str, target: str) -> bytes:
+    """A fixed-length EBCDIC GAMESTAT dataset in another layout
+
+    Records are decoded by type and encoded again in the target layout,
+    a column at a time when NumPy is available. Record order is kept;
+    records of no known type are dropped.
+    """
+    src, dst = gamestat_codec(source), gamestat_codec(target)
+    data = data if src.binary else to_ascii(data)
+    width = len(next(iter(src.type_tags.values())))
+    type_fields = {rtype: codec.layout.fields[0].name for rtype, codec in src.codecs.items()}
+
+    if not NUMPY_AVAILABLE:
+        tags = {tag: rtype for rtype, tag in src.type_tags.items()}
+        records = []
+        for record in iter_records(data, src.lrecl):
+            rtype = tags.get(bytes(record[:width]))
+            if rtype:
+                values = src.codecs[rtype].decode(record)
+                del values[type_fields[rtype]]
+                records.append(dst.codecs[rtype].encode(values))
+        return b''.join(records) if dst.binary else to_ebcdic(''.join(records))
+
+    count = len(data) // src.lrecl
+    table = np.frombuffer(data, dtype=np.uint8, count=count * src.lrecl).reshape(count, src.lrecl)
+    tags = np.ascontiguousarray(table[:, :width]).view(f'S{width}').ravel()
+    out = np.empty((count, dst.lrecl), dtype=np.uint8)
+    known = np.zeros(count, dtype=bool)
+    for rtype, tag in src.type_tags.items():
+        rows = tags == tag
+        columns = src.codecs[rtype].decode_many(table[rows].tobytes())
+        del columns[type_fields[rtype]]
+        out[rows] = dst.codecs[rtype].encode_columns(columns, int(rows.sum()))
+        known |= rows
+    out = out[known].tobytes()
+    return out if dst.binary else to_ebcdic(out)
+
+
+def encode_summary(*args, **kwargs) -> str:
+    return gamestat_codec().encode_summary(*args, **kwargs)
+
+
+def decode_summary(record) -> Dict[str, Any]:
+    return gamestat_codec().decode_summary(record)
@@ -5,11 +5,20 @@ Converts SQLite game state to MVS dataset format for FTP to z/OS
 """
 
 import sqlite3
-import struct
 import os
+import time
 import logging
 from pathlib import Path
-from datetime import datetime
+
+from doom_state_codec import iter_enemies
+from enemy_storage import has_packed_enemies
+from state_notify import StateSubscriber
+from latest_state import LATEST_STATE_COLUMNS, LATEST_STATE_SELECT, has_latest_state
+from gamestat_records import DISPLAY_LAYOUT, LAYOUTS, gamestat_codec, iter_states
+from ebcdic import encode_records, pad_record, to_ebcdic
+from gamestat_publisher import DatasetPublisher, atomic_write
+from dataset_catalog import dataset_catalog
+from record_formats import dataset_lrecl, read_records, reblock
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,34 +27,55 @@ logger = logging.getLogger(__name__)
 class GameStateToMVS:
     """Convert game state to MVS dataset format"""
     
-    def __init__(self, db_path="doom_state.db", output_dir="mvs_datasets"):
+    def __init__(self, db_path="doom_state.db", output_dir="mvs_datasets", ascii_copy=False,
+                 recfm="FB", blksize=3200, layout=DISPLAY_LAYOUT):
         self.db_path = db_path
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.ascii_copy = ascii_copy
+        # GAMESTAT datasets are FB 80, or VB 84 without trailing blanks;
+        # the compact layout (DOOMSTAC.CPY) is FB 32 or VB 36
+        self.recfm = recfm
+        self.blksize = blksize
+        self.layout = layout
+        self.codec = gamestat_codec(layout)
+        # DOOM.GAMESTAT is swapped in atomically, and only when it changes
+        self.publisher = DatasetPublisher(self.output_dir / "DOOM.GAMESTAT", lrecl=self.codec.lrecl,
+                                          ascii_copy=ascii_copy, recfm=recfm, blksize=blksize, layout=layout)
         self.conn = sqlite3.connect(db_path)
+        self.enemy_column = 'enemy_data' if has_packed_enemies(self.conn) else 'NULL'
+        # A compacted idle run stands for its states up to tick_last, so
+        # the newest of them is the run's last tick and time
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(game_state)')}
+        self.run_end = (('COALESCE(tick_last, tick)', 'COALESCE(timestamp_last, timestamp)')
+                        if 'tick_last' in columns else ('tick', 'timestamp'))
+        # Capture databases keep the newest state per session in latest_state
+        self.latest_source = ('latest_state', 'state_id') if has_latest_state(self.conn) else ('game_state', 'id')
         
     def get_latest_state(self):
         """Get the most recent game state"""
+        table, id_column = self.latest_source
         cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT id, tick, level, health, armor, x, y, z, angle,
+        cursor.execute(f'''
+            SELECT {id_column}, tick, level, health, armor, x, y, z, angle,
                    ammo_bullets, ammo_shells, ammo_cells, ammo_rockets,
                    weapon, enemy_count, timestamp
-            FROM game_state
-            ORDER BY id DESC
+            FROM {table}
+            ORDER BY {id_column} DESC
             LIMIT 1
         ''')
         return cursor.fetchone()
         
     def format_as_mvs_dataset(self, state_id):
-        """Format game state as MVS dataset (RECFM=FB LRECL=80)"""
+        """Format game state as MVS dataset records (LRECL 80, or 32 compact)"""
         cursor = self.conn.cursor()
         
         # Get main state
-        cursor.execute('''
-            SELECT tick, level, health, armor, x, y, z, angle,
+        tick, timestamp = self.run_end
+        cursor.execute(f'''
+            SELECT {tick}, level, health, armor, x, y, z, angle,
                    ammo_bullets, ammo_shells, ammo_cells, ammo_rockets,
-                   weapon, enemy_count, timestamp
+                   weapon, enemy_count, {timestamp}, {self.enemy_column}
             FROM game_state WHERE id = ?
         ''', (state_id,))
         
@@ -54,174 +84,167 @@ class GameStateToMVS:
             return []
             
         (tick, level, health, armor, x, y, z, angle,
-         bullets, shells, cells, rockets, weapon, enemy_count, timestamp) = row
-        
-        records = []
-        
-        # Record 1: STATE header (80 bytes)
-        dt = datetime.fromtimestamp(timestamp)
-        state_rec = (
-            f"{'STATE   ':<8}"
-            f"{tick:08d}"
-            f"{level:02d}"
-            f"{dt.strftime('%Y%m%d'):>8}"
-            f"{' ' * 52}"
-        )
-        records.append(state_rec)
+         bullets, shells, cells, rockets, weapon, enemy_count, timestamp, enemy_data) = row
         
-        # Record 2: PLAYER data (80 bytes)
-        map_x = x >> 16  # Convert fixed point
-        map_y = y >> 16
-        map_z = z >> 16
-        degrees = (angle * 360) // 0xFFFFFFFF if angle >= 0 else 0
-        status = 'D' if health <= 0 else 'A'
-        
-        player_rec = (
-            f"{'PLAYER  ':<8}"
-            f"{map_x:+08d}"
-            f"{map_y:+08d}"
-            f"{map_z:+08d}"
-            f"{degrees:+04d}"
-            f"{health:03d}"
-            f"{armor:03d}"
-            f"{status}"
-            f"{' ' * 8}"
-            f"{' ' * 28}"
-        )
-        records.append(player_rec)
-        
-        # Record 3: AMMO data (80 bytes)
-        ammo_rec = (
-            f"{'AMMO    ':<8}"
-            f"{bullets:04d}"
-            f"{shells:04d}"
-            f"{cells:04d}"
-            f"{rockets:04d}"
-            f"{weapon:01d}"
-            f"{' ' * 55}"
-        )
-        records.append(ammo_rec)
-        
-        # Records 4+: ENEMY data (80 bytes each)
-        cursor.execute('''
-            SELECT enemy_index, type, health, x, y, distance
-            FROM enemies WHERE state_id = ?
-            ORDER BY enemy_index
-            LIMIT 16
-        ''', (state_id,))
-        
-        for idx, (_, etype, ehealth, ex, ey, distance) in enumerate(cursor.fetchall()):
-            map_ex = ex >> 16
-            map_ey = ey >> 16
-            map_dist = distance >> 16
+        # ENEMY records, packed states carry them in the same row
+        if enemy_data is not None:
+            enemies = list(iter_enemies(enemy_data))[:16]
+        else:
+            cursor.execute('''
+                SELECT type, health, x, y, distance
+                FROM enemies WHERE state_id = ?
+                ORDER BY enemy_index
+                LIMIT 16
+            ''', (state_id,))
+            enemies = cursor.fetchall()
             
-            enemy_rec = (
-                f"{'ENEMY   ':<8}"
-                f"{etype:02d}"
-                f"{ehealth:03d}"
-                f"{map_ex:+08d}"
-                f"{map_ey:+08d}"
-                f"{map_dist:05d}"
-                f"{0:+03d}"  # angle_to
-                f"{' ' * 8}"
-                f"{' ' * 30}"
-            )
-            records.append(enemy_rec)
+        # STATE, PLAYER and AMMO records then one ENEMY record each (LRECL bytes)
+        row = (tick, level, timestamp, x, y, z, angle, health, armor,
+               bullets, shells, cells, rockets, weapon)
+        return [record for _, record in self.codec.records(row, enemies)]
+        
+    def format_latest(self):
+        """(state id, MVS dataset records) of the newest state; (None, []) if there is none
+
+        A latest_state row carries everything GAMESTAT needs (packed
+        enemies, the tick an idle run has reached), so the state's own
+        row, which may live in a partition database, is not read.
+        """
+        if self.latest_source[0] == 'latest_state':
+            row = self.conn.execute(LATEST_STATE_SELECT + ' ORDER BY state_id DESC LIMIT 1').fetchone()
+            if not row:
+                return None, []
+            latest = dict(zip(LATEST_STATE_COLUMNS, row))
+            return latest['state_id'], [record for _, record in self.codec.latest_records(latest)]
             
-        return records
+        state = self.get_latest_state()
+        if not state:
+            return None, []
+        return state[0], self.format_as_mvs_dataset(state[0])
         
     def write_mvs_dataset(self, records, filename):
-        """Write records as MVS dataset file"""
+        """Write records as MVS dataset file (in the converter's RECFM and layout)"""
         filepath = self.output_dir / filename
+        lrecl = self.codec.lrecl
         
-        # Write as EBCDIC encoded fixed-block dataset
-        with open(filepath, 'wb') as f:
-            for record in records:
-                # Ensure exactly 80 bytes
-                if len(record) != 80:
-                    logger.warning(f"Record wrong length: {len(record)}")
-                    record = record[:80].ljust(80)
-                    
-                # Convert to EBCDIC
-                ebcdic_record = record.encode('cp037')
-                f.write(ebcdic_record)
-                
-        # Also write ASCII version for debugging
-        ascii_path = self.output_dir / f"{filename}.ASCII"
-        with open(ascii_path, 'w') as f:
-            for record in records:
-                f.write(record + '\n')
+        # Records are padded or truncated to LRECL bytes
+        short = sum(1 for record in records if len(record) != lrecl)
+        if short:
+            logger.warning(f"{short} records wrong length")
+            
+        # Write as EBCDIC encoded dataset, text translated in one pass (compact
+        # records already are EBCDIC), renamed into place so readers never
+        # see a partial file
+        if self.codec.binary:
+            data = b''.join([pad_record(record, lrecl) for record in records])
+        else:
+            data = encode_records(records, lrecl)
+        atomic_write(filepath, reblock(data, self.recfm, lrecl, self.blksize, self.codec.fill))
                 
         logger.info(f"Wrote MVS dataset: {filepath}")
         logger.info(f"  Records: {len(records)}")
-        logger.info(f"  LRECL: 80")
-        logger.info(f"  ASCII copy: {ascii_path}")
+        logger.info(f"  LRECL: {dataset_lrecl(self.recfm, lrecl)} (RECFM={self.recfm}, layout {self.layout})")
+        
+        # ASCII version for debugging, on request
+        if self.ascii_copy and not self.codec.binary:
+            ascii_path = self.output_dir / f"{filename}.ASCII"
+            atomic_write(ascii_path, ''.join(record + '\n' for record in records).encode('latin-1'))
+            logger.info(f"  ASCII copy: {ascii_path}")
+        
+    def create_gamestat_range(self, start_tick=None, end_tick=None, session_id=None,
+                              filename="DOOM.GAMESTAT"):
+        """Write every state in a tick range as one multi-state MVS dataset
+
+        One joined query feeds the record formatter as rows stream in;
+        the records are translated to EBCDIC (compact records are encoded
+        as EBCDIC) and written in one call. Each state starts with its
+        own (tick-tagged) STATE record. Returns the number of records
+        written.
+        """
+        data = self.codec.encode_states(iter_states(self.conn, start_tick, end_tick, session_id))
+        if not self.codec.binary:
+            data = to_ebcdic(data)
+        lrecl = self.codec.lrecl
+        records = len(data) // lrecl
+        entry = dataset_catalog(self.output_dir).publish(
+            filename, reblock(data, self.recfm, lrecl, self.blksize, self.codec.fill),
+            recfm=self.recfm, lrecl=dataset_lrecl(self.recfm, lrecl), blksize=self.blksize, layout=self.layout
+        )
+            
+        logger.info(f"Wrote MVS dataset: {entry.path} ({records} records, RECFM={self.recfm}, "
+                    f"layout {self.layout}, ticks {start_tick}-{end_tick})")
+        return records
         
     def create_current_gamestat(self):
         """Create GAMESTAT.CURRENT dataset from latest state"""
-        state = self.get_latest_state()
-        if not state:
+        state_id, records = self.format_latest()
+        if state_id is None:
             logger.error("No game state found in database")
             return False
+        if not records:
+            # Never replace DOOM.GAMESTAT with an empty generation
+            logger.error(f"State {state_id} has no game_state row, DOOM.GAMESTAT not rewritten")
+            return False
             
-        state_id = state[0]
-        logger.info(f"Converting state {state_id} to MVS dataset")
-        
-        records = self.format_as_mvs_dataset(state_id)
-        self.write_mvs_dataset(records, "DOOM.GAMESTAT")
+        if self.publisher.publish(records):
+            logger.info(f"Published state {state_id} as DOOM.GAMESTAT generation {self.publisher.generation}")
+        else:
+            logger.debug(f"State {state_id} unchanged, DOOM.GAMESTAT not rewritten")
         
-        # Create symlink for FTP
+        # Symlink for FTP; it follows each rename, so it is only made once
         current_link = self.output_dir / "GAMESTAT.CURRENT"
-        if current_link.exists():
-            current_link.unlink()
-        current_link.symlink_to("DOOM.GAMESTAT")
+        if not current_link.is_symlink():
+            current_link.symlink_to("DOOM.GAMESTAT")
         
         return True
         
     def monitor_and_convert(self, interval=1):
-        """Monitor database and convert new states"""
-        logger.info(f"Monitoring game states every {interval} seconds")
+        """Convert each newly committed state
+
+        Wakes on the capture writer's commit notifications; every
+        `interval` seconds it also re-checks, as it polled before, for
+        writers that do not notify (other processes, no Unix sockets).
+        """
+        logger.info(f"Waiting for committed game states (fallback check every {interval} seconds)")
         
-        last_state_id = None
+        subscriber = StateSubscriber(self.db_path)
+        last_state = None
         
         try:
             while True:
                 state = self.get_latest_state()
-                if state:
-                    state_id = state[0]
-                    if state_id != last_state_id:
-                        logger.info(f"New state detected: {state_id}")
-                        self.create_current_gamestat()
-                        last_state_id = state_id
+                # An idle run (--compact-idle) keeps its id while its tick advances
+                if state and state[:2] != last_state:
+                    logger.info(f"New state detected: {state[0]} (tick {state[1]})")
+                    self.create_current_gamestat()
+                    last_state = state[:2]
                         
-                import time
-                time.sleep(interval)
+                subscriber.wait(interval)
                 
         except KeyboardInterrupt:
             logger.info("Monitoring stopped")
+        finally:
+            subscriber.close()
             
     def test_conversion(self):
         """Test with sample data"""
-        # Create test records
-        test_records = [
-            "STATE   00001234012025010100000000000000000000000000000000000000000000000000000",
-            "PLAYER  +0001024+0001024+0000000+090075050A        0000000000000000000000000000",
-            "AMMO    0050002001000040200000000000000000000000000000000000000000000000000000",
-            "ENEMY   09100+0001200+0001100002560000        000000000000000000000000000000000",
-            "ENEMY   02075+0000800+0000900001280000        000000000000000000000000000000000",
-        ]
+        # Create test records: tick 1234 at (1024, 1024) facing 90, two enemies
+        test_records = [record for _, record in self.codec.records(
+            (1234, 1, time.time(), 1024 << 16, 1024 << 16, 0, 1 << 30, 75, 50, 50, 20, 100, 40, 2),
+            [(9, 100, 1200 << 16, 1100 << 16, 256 << 16), (2, 75, 800 << 16, 900 << 16, 128 << 16)]
+        )]
         
         self.write_mvs_dataset(test_records, "TEST.GAMESTAT")
         
         # Verify
         test_file = self.output_dir / "TEST.GAMESTAT"
-        size = test_file.stat().st_size
-        expected = len(test_records) * 80
+        data = test_file.read_bytes()
+        written = sum(1 for _ in read_records(data, self.recfm, dataset_lrecl(self.recfm, self.codec.lrecl)))
         
-        if size == expected:
-            logger.info(f"✓ Test passed: {size} bytes written")
+        if written == len(test_records):
+            logger.info(f"✓ Test passed: {written} records, {len(data)} bytes written")
         else:
-            logger.error(f"✗ Test failed: expected {expected} bytes, got {size}")
+            logger.error(f"✗ Test failed: expected {len(test_records)} records, got {written}")
 
 
 def main():
@@ -234,13 +257,26 @@ def main():
     parser.add_argument('--monitor', action='store_true', help='Monitor continuously')
     parser.add_argument('--test', action='store_true', help='Run test conversion')
     parser.add_argument('--once', action='store_true', help='Convert once and exit')
+    parser.add_argument('--ticks', type=int, nargs=2, metavar=('START', 'END'),
+                        help='Write all states in a tick range as one dataset')
+    parser.add_argument('--session', type=int, help='Limit --ticks to one session')
+    parser.add_argument('--ascii', action='store_true', help='Also write .ASCII debug copies')
+    parser.add_argument('--recfm', choices=['FB', 'VB'], default='FB',
+                        help='GAMESTAT record format (VB drops trailing blanks)')
+    parser.add_argument('--blksize', type=int, default=3200, help='GAMESTAT block size')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default=DISPLAY_LAYOUT,
+                        help='GAMESTAT records: zoned decimal text, or compact COMP/COMP-3')
     
     args = parser.parse_args()
     
-    converter = GameStateToMVS(args.db, args.output)
+    converter = GameStateToMVS(args.db, args.output, ascii_copy=args.ascii,
+                               recfm=args.recfm, blksize=args.blksize, layout=args.layout)
     
     if args.test:
         converter.test_conversion()
+    elif args.ticks:
+        records = converter.create_gamestat_range(*args.ticks, session_id=args.session)
+        print(f"{records} records written to {args.output}/DOOM.GAMESTAT")
     elif args.monitor:
         converter.monitor_and_convert()
     elif args.once:
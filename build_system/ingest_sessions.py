@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Per-instance session tracking for DOOM state capture
+One sessions row per DOOM instance (source address + packet stream)
+"""
+
+import threading
+import time
+import logging
+from typing import Dict, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# A tick this far behind the last one from the same address means the
+# engine restarted (new game or new process) rather than a late packet
+STREAM_RESET_TICKS = 350
+
+
+def ensure_column(cursor, table: str, column: str, decl: str):
+    """Add a column to an existing table if it is missing"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+def migrate_sessions_schema(cursor):
+    """Columns needed to key sessions by source address and stream"""
+    ensure_column(cursor, 'sessions', 'source_host', 'TEXT')
+    ensure_column(cursor, 'sessions', 'source_port', 'INTEGER')
+    ensure_column(cursor, 'sessions', 'stream', 'INTEGER')
+    ensure_column(cursor, 'game_state', 'session_id', 'INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_session_tick ON game_state(session_id, tick)')
+
+
+class SessionTracker:
+    """Maps (source address, packet stream) to a sessions row"""
+
+    def __init__(self, conn, reset_ticks: int = STREAM_RESET_TICKS):
+        self.conn = conn
+        self.reset_ticks = reset_ticks
+        self.lock = threading.Lock()
+        self.sources: Dict[Tuple[str, int], dict] = {}
+
+    def resolve(self, addr: Optional[Tuple[str, int]], tick: int) -> int:
+        """Session id for a packet, opening a new session when needed"""
+        key = tuple(addr[:2]) if addr else ('', 0)
+
+        with self.lock:
+            entry = self.sources.get(key)
+
+            if entry is None:
+                entry = self._open_session(key, stream=1)
+            elif tick + self.reset_ticks < entry['last_tick']:
+                logger.info(f"Tick reset from {key[0]}:{key[1]} "
+                            f"({entry['last_tick']} -> {tick}), new stream")
+                self._close_session(entry, time.time())
+                entry = self._open_session(key, stream=entry['stream'] + 1)
+
+            entry['last_tick'] = max(entry['last_tick'], tick)
+            entry['packets'] += 1
+            return entry['session_id']
+
+    def _open_session(self, key, stream: int) -> dict:
+        """Insert a sessions row for a new instance or stream"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            'INSERT INTO sessions (start_time, total_packets, source_host, source_port, stream) '
+            'VALUES (?, 0, ?, ?, ?)',
+            (time.time(), key[0], key[1], stream)
+        )
+        self.conn.commit()
+
+        entry = {
+            'session_id': cursor.lastrowid,
+            'stream': stream,
+            'last_tick': 0,
+            'packets': 0
+        }
+        self.sources[key] = entry
+        logger.info(f"Session {entry['session_id']} opened for {key[0]}:{key[1]} stream {stream}")
+        return entry
+
+    def _close_session(self, entry: dict, end_time: float):
+        """Write final counts for a session"""
+        self.conn.execute(
+            'UPDATE sessions SET end_time = ?, total_packets = ? WHERE id = ?',
+            (end_time, entry['packets'], entry['session_id'])
+        )
+        self.conn.commit()
+
+    def update_counts(self):
+        """Persist running packet counts"""
+        with self.lock:
+            self.conn.executemany(
+                'UPDATE sessions SET total_packets = ? WHERE id = ?',
+                [(e['packets'], e['session_id']) for e in self.sources.values()]
+            )
+            self.conn.commit()
+
+    def close_all(self):
+        """Close every open session"""
+        now = time.time()
+        with self.lock:
+            for entry in self.sources.values():
+                self._close_session(entry, now)
+            self.sources.clear()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Latest-state cache and read pool for DOOM state capture
+One latest_state row per session, upserted by the writer in each batch
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from doom_state_codec import ENEMY_FIELDS, pack_enemies
+
+logger = logging.getLogger(__name__)
+
+LATEST_STATE_COLUMNS = (
+    'session_id', 'state_id', 'timestamp', 'tick', 'level', 'health', 'armor',
+    'x', 'y', 'z', 'angle', 'momx', 'momy', 'weapon',
+    'ammo_bullets', 'ammo_shells', 'ammo_cells', 'ammo_rockets',
+    'kills', 'items', 'secrets', 'enemy_count', 'enemy_data'
+)
+
+# session_id 0 holds states captured without a session
+LATEST_STATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS latest_state (
+        session_id INTEGER PRIMARY KEY,
+        state_id INTEGER,
+        timestamp REAL,
+        tick INTEGER,
+        level INTEGER,
+        health INTEGER,
+        armor INTEGER,
+        x INTEGER,
+        y INTEGER,
+        z INTEGER,
+        angle INTEGER,
+        momx INTEGER,
+        momy INTEGER,
+        weapon INTEGER,
+        ammo_bullets INTEGER,
+        ammo_shells INTEGER,
+        ammo_cells INTEGER,
+        ammo_rockets INTEGER,
+        kills INTEGER,
+        items INTEGER,
+        secrets INTEGER,
+        enemy_count INTEGER,
+        enemy_data BLOB
+    )
+'''
+
+# Never moves a session backwards; an equal state_id is a run-length row
+# (state_compaction) reaching a later tick
+LATEST_STATE_UPSERT = f'''
+    INSERT INTO latest_state ({', '.join(LATEST_STATE_COLUMNS)})
+    VALUES ({', '.join('?' * len(LATEST_STATE_COLUMNS))})
+    ON CONFLICT(session_id) DO UPDATE SET
+        {', '.join(f'{c} = excluded.{c}' for c in LATEST_STATE_COLUMNS[1:])}
+    WHERE excluded.state_id >= latest_state.state_id
+'''
+
+LATEST_STATE_SELECT = f'''
+    SELECT {', '.join(LATEST_STATE_COLUMNS)} FROM latest_state
+'''
+
+
+def has_latest_state(conn) -> bool:
+    """True if the database has the latest_state table"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest_state'"
+    ).fetchone() is not None
+
+
+def ensure_latest_state(cursor):
+    """Create latest_state, seeding it from game_state on first use"""
+    if has_latest_state(cursor.connection):
+        return
+    cursor.execute(LATEST_STATE_TABLE)
+
+    game_columns = {row[1] for row in cursor.execute('PRAGMA table_info(game_state)')}
+    session = 'session_id' if 'session_id' in game_columns else 'NULL'
+    enemy_data = 'enemy_data' if 'enemy_data' in game_columns else 'NULL'
+
+    rows = cursor.execute(f'''
+        SELECT COALESCE({session}, 0), id, timestamp, tick, level, health, armor,
+               x, y, z, angle, momx, momy, weapon,
+               ammo_bullets, ammo_shells, ammo_cells, ammo_rockets,
+               kills, items, secrets, enemy_count, {enemy_data}
+        FROM game_state
+        WHERE id IN (SELECT MAX(id) FROM game_state GROUP BY {session})
+    ''').fetchall()
+
+    seeded = []
+    for row in rows:
+        if row[-1] is None:
+            enemies = cursor.execute(
+                'SELECT type, health, x, y, distance FROM enemies WHERE state_id = ? ORDER BY enemy_index',
+                (row[1],)
+            ).fetchall()
+            row = row[:-1] + (pack_enemies([dict(zip(ENEMY_FIELDS, e)) for e in enemies]),)
+        seeded.append(row)
+
+    cursor.executemany(LATEST_STATE_UPSERT, seeded)
+    if seeded:
+        logger.info(f"Seeded latest_state for {len(seeded)} sessions")
+
+
+class StateReadPool:
+    """Read-only connections shared by the read paths
+
+    Connections are opened read-only, so readers never take the write
+    lock; in WAL mode they also never wait for the writer. Each keeps
+    its own prepared-statement cache.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, cached_statements: int = 256):
+        self.db_path = db_path
+        self.size = size
+        self.cached_statements = cached_statements
+        self.pool = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, opening one if none is free"""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if not can_open:
+                conn = self.pool.get()
+            else:
+                try:
+                    conn = self._open()
+                except sqlite3.Error:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def fetchall(self, sql: str, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetchone(self, sql: str, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def latest_state(self, session_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Newest state of a session, or of any session; a primary-key lookup"""
+        if session_id is None:
+            row = self.fetchone(LATEST_STATE_SELECT + ' ORDER BY state_id DESC LIMIT 1')
+        else:
+            row = self.fetchone(LATEST_STATE_SELECT + ' WHERE session_id = ?', (session_id,))
+        return dict(zip(LATEST_STATE_COLUMNS, row)) if row else None
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self.opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        return sqlite3.connect(
+            f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+            check_same_thread=False, cached_statements=self.cached_statements
+        )
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Multi-process DOOM state ingest
+N workers share UDP 31337 via SO_REUSEPORT, each writing its own shard
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import time
+import logging
+from typing import List
+
+from doom_state_sqlite import DoomStateSQLite
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# SQLite's default compile-time limit on attached databases
+MAX_ATTACHED_SHARDS = 10
+
+MERGED_TABLES = ('game_state', 'enemies', 'sessions', 'cobol_state')
+
+
+def shard_paths(db_path: str, workers: int) -> List[str]:
+    """Shard database paths for a base database path"""
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.shard{i}{ext or '.db'}" for i in range(workers)]
+
+
+def _run_worker(shard: int, db_path: str, port: int, stop_event, options: dict):
+    """Worker process body: one capture on a shared port, one shard database"""
+    capture = DoomStateSQLite(db_path, port, reuse_port=True, per_source_sessions=True, **options)
+    capture.start_capture()
+    logger.info(f"Ingest worker {shard} (pid {os.getpid()}) writing {db_path}")
+
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.stop_capture()
+
+
+def default_workers() -> int:
+    """One worker per CPU, as many as merged_view() can attach"""
+    return min(os.cpu_count() or 1, MAX_ATTACHED_SHARDS)
+
+
+class MultiProcessIngest:
+    """Spawns and supervises SO_REUSEPORT ingest workers
+
+    There are at most MAX_ATTACHED_SHARDS workers, so every shard fits
+    in one MergedStateView.
+    """
+
+    def __init__(self, db_path="doom_state.db", port=31337, workers=None, **options):
+        workers = workers or default_workers()
+        if workers > MAX_ATTACHED_SHARDS:
+            raise ValueError(f"At most {MAX_ATTACHED_SHARDS} workers (shards) are supported")
+
+        self.db_path = db_path
+        self.port = port
+        self.workers = workers
+        self.options = options
+        self.paths = shard_paths(db_path, self.workers)
+        self.stop_event = multiprocessing.Event()
+        self.processes = []
+
+    def start(self):
+        """Start one worker process per shard"""
+        for shard, path in enumerate(self.paths):
+            process = multiprocessing.Process(
+                target=_run_worker,
+                args=(shard, path, self.port, self.stop_event, self.options),
+                name=f"ingest-{shard}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+        logger.info(f"Started {self.workers} ingest workers on UDP port {self.port}")
+
+    def stop(self):
+        """Signal workers to flush and exit"""
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    def merged_view(self) -> 'MergedStateView':
+        """Read view across every shard"""
+        return MergedStateView(self.paths)
+
+
+class MergedStateView:
+    """Read-only union over shard databases
+
+    Each shard is attached to one connection and exposed through TEMP
+    views with the original table names plus a `shard` column. Session and
+    state ids are only unique within a shard, so join on (shard, id).
+    """
+
+    def __init__(self, paths: List[str]):
+        paths = [p for p in paths if os.path.exists(p)]
+        if len(paths) > MAX_ATTACHED_SHARDS:
+            raise ValueError(f"At most {MAX_ATTACHED_SHARDS} shards can be attached")
+
+        self.paths = paths
+        self.conn = sqlite3.connect(':memory:', uri=True, check_same_thread=False)
+
+        for shard, path in enumerate(paths):
+            uri = f"file:{os.path.abspath(path)}?mode=ro"
+            self.conn.execute(f"ATTACH DATABASE ? AS shard{shard}", (uri,))
+
+        self._create_views()
+
+    def _create_views(self):
+        """Create one UNION ALL view per table"""
+        for table in MERGED_TABLES:
+            parts = [
+                f"SELECT {shard} AS shard, * FROM shard{shard}.{table}"
+                for shard in range(len(self.paths))
+            ]
+            if not parts:
+                continue
+            self.conn.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(parts)}")
+
+    def sessions(self):
+        """One row per DOOM instance across all shards"""
+        return self.conn.execute('''
+            SELECT shard, id, source_host, source_port, stream,
+                   start_time, end_time, total_packets
+            FROM sessions
+            ORDER BY start_time
+        ''').fetchall()
+
+    def query_recent_states(self, limit=10):
+        """Most recent states across all shards"""
+        return self.conn.execute('''
+            SELECT shard, session_id, tick, health, armor, x, y, enemy_count
+            FROM game_state
+            ORDER BY timestamp DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    """Run multi-worker ingest"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Multi-process DOOM state ingest')
+    parser.add_argument('--db', default='doom_state.db', help='Base database path (shards get .shardN)')
+    parser.add_argument('--port', type=int, default=31337, help='UDP state port')
+    parser.add_argument('--workers', type=int, default=default_workers(),
+                        help=f'Worker processes (at most {MAX_ATTACHED_SHARDS})')
+    parser.add_argument('--batch-size', type=int, default=64, help='Commit every N packets')
+    parser.add_argument('--batch-ms', type=float, default=50, help='Commit every T milliseconds')
+
+    args = parser.parse_args()
+    if not 1 <= args.workers <= MAX_ATTACHED_SHARDS:
+        parser.error(f"--workers must be between 1 and {MAX_ATTACHED_SHARDS}")
+
+    ingest = MultiProcessIngest(
+        args.db, args.port, args.workers,
+        batch_size=args.batch_size, batch_ms=args.batch_ms
+    )
+    ingest.start()
+
+    print(f"Ingest running with {ingest.workers} workers. Press Ctrl+C to stop")
+    print("Shards:")
+    for path in ingest.paths:
+        print(f"  {path}")
+
+    try:
+        while True:
+            time.sleep(10)
+            view = ingest.merged_view()
+            print("\nSessions:")
+            for shard, sid, host, port, stream, start, end, packets in view.sessions():
+                print(f"  shard {shard} session {sid}: {host}:{port} stream {stream}, {packets} packets")
+            view.close()
+
+    except KeyboardInterrupt:
+        print("\nStopping workers...")
+        ingest.stop()
+
+
+if __name__ == "__main__":
+    main()
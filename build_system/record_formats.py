@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+MVS record formats and blocking
+Fixed (RECFM=F/FB) and variable (RECFM=V/VB) records packed into
+BLKSIZE blocks, with the RDW/BDW descriptors z/OS uses for variable
+records, and parsed back either whole or as chunks arrive
+"""
+
+import struct
+from typing import Iterable, Iterator, List, Optional, Union
+
+from ebcdic import EBCDIC_SPACE, iter_records
+
+# Record and block descriptor words: a big-endian length that includes
+# the 4-byte descriptor itself, then two reserved zero bytes
+DESCRIPTOR = struct.Struct('>HH')
+DESCRIPTOR_SIZE = DESCRIPTOR.size
+
+# Largest block a descriptor without the extended-length bit can carry
+MAX_BLKSIZE = 32760
+
+FIXED_FORMATS = ('F', 'FB')
+VARIABLE_FORMATS = ('V', 'VB')
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def check_format(recfm: str, lrecl: int, blksize: int):
+    """Raise for record formats and sizes this module cannot block"""
+    if recfm not in FIXED_FORMATS + VARIABLE_FORMATS:
+        raise ValueError(f"Unsupported RECFM {recfm}")
+    if not DESCRIPTOR_SIZE < blksize <= MAX_BLKSIZE:
+        raise ValueError(f"BLKSIZE={blksize} out of range")
+    if recfm in FIXED_FORMATS and lrecl > blksize:
+        raise ValueError(f"LRECL={lrecl} exceeds BLKSIZE={blksize}")
+    if recfm in VARIABLE_FORMATS and not DESCRIPTOR_SIZE < lrecl <= blksize - DESCRIPTOR_SIZE:
+        raise ValueError(f"LRECL={lrecl} does not fit BLKSIZE={blksize}")
+
+
+def is_variable(recfm: str) -> bool:
+    return recfm in VARIABLE_FORMATS
+
+
+def trim_record(record: BytesLike, fill: int = EBCDIC_SPACE) -> bytes:
+    """A record without its trailing padding (at least one byte is kept)"""
+    return bytes(record).rstrip(bytes((fill,))) or bytes(record[:1])
+
+
+def iter_blocks(records: Iterable[BytesLike], recfm: str = 'FB', lrecl: int = 80,
+                blksize: int = 3200) -> Iterator[bytes]:
+    """Pack records into blocks
+
+    Fixed records must already be LRECL long. Variable records are
+    truncated to LRECL - 4 bytes of data and each gets an RDW; each
+    block starts with a BDW. Unblocked formats (F, V) put one record in
+    each block.
+    """
+    check_format(recfm, lrecl, blksize)
+
+    if recfm in FIXED_FORMATS:
+        per_block = blksize // lrecl if recfm == 'FB' else 1
+        block = []
+        for record in records:
+            block.append(record)
+            if len(block) == per_block:
+                yield b''.join(block)
+                block = []
+        if block:
+            yield b''.join(block)
+        return
+
+    limit = blksize - DESCRIPTOR_SIZE if recfm == 'VB' else 0
+    block, size = [], 0
+    for record in records:
+        data = record[:lrecl - DESCRIPTOR_SIZE]
+        length = len(data) + DESCRIPTOR_SIZE
+        if block and size + length > limit:
+            yield DESCRIPTOR.pack(size + DESCRIPTOR_SIZE, 0) + b''.join(block)
+            block, size = [], 0
+        block.append(DESCRIPTOR.pack(length, 0))
+        block.append(data)
+        size += length
+    if block:
+        yield DESCRIPTOR.pack(size + DESCRIPTOR_SIZE, 0) + b''.join(block)
+
+
+def block_records(records: Iterable[BytesLike], recfm: str = 'FB', lrecl: int = 80,
+                  blksize: int = 3200) -> bytes:
+    """A whole dataset of blocked records"""
+    return b''.join(iter_blocks(records, recfm, lrecl, blksize))
+
+
+def dataset_lrecl(recfm: str, width: int) -> int:
+    """LRECL for records of up to `width` bytes (variable LRECL counts the RDW)"""
+    return width + DESCRIPTOR_SIZE if recfm in VARIABLE_FORMATS else width
+
+
+def reblock(data: BytesLike, recfm: str = 'FB', width: int = 80, blksize: int = 3200,
+            fill: Optional[int] = EBCDIC_SPACE) -> bytes:
+    """A dataset of `width`-byte records (back to back) in another format
+
+    Variable records lose their trailing `fill` bytes (with fill=None,
+    for binary records, they are kept whole); FB data is returned
+    unchanged.
+    """
+    if recfm == 'FB':
+        return bytes(data)
+    records = iter_records(data, width, partial=True)
+    if recfm in VARIABLE_FORMATS and fill is not None:
+        records = (trim_record(record, fill) for record in records)
+    return block_records(records, recfm, dataset_lrecl(recfm, width), blksize)
+
+
+def _descriptor(view: memoryview, offset: int, end: int, what: str) -> int:
+    """Length from the RDW or BDW at `offset`, checked against `end`"""
+    if end - offset < DESCRIPTOR_SIZE:
+        raise ValueError(f"Truncated {what} at offset {offset}")
+    length, _ = DESCRIPTOR.unpack_from(view, offset)
+    if length < DESCRIPTOR_SIZE or offset + length > end:
+        raise ValueError(f"Bad {what} length {length} at offset {offset}")
+    return length
+
+
+def _block_records(view: memoryview, start: int, end: int) -> Iterator[memoryview]:
+    """Record data (without RDWs) of one variable block"""
+    offset = start
+    while offset < end:
+        length = _descriptor(view, offset, end, 'RDW')
+        yield view[offset + DESCRIPTOR_SIZE:offset + length]
+        offset += length
+
+
+def read_records(data: BytesLike, recfm: str = 'FB', lrecl: int = 80) -> Iterator[memoryview]:
+    """Zero-copy views of each record of a blocked dataset
+
+    Variable records come back without their RDWs. A short trailing
+    fixed record is yielded as is; a malformed variable dataset raises
+    ValueError.
+    """
+    if recfm in FIXED_FORMATS:
+        yield from iter_records(data, lrecl, partial=True)
+        return
+    if recfm not in VARIABLE_FORMATS:
+        raise ValueError(f"Unsupported RECFM {recfm}")
+
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        length = _descriptor(view, offset, len(view), 'BDW')
+        yield from _block_records(view, offset + DESCRIPTOR_SIZE, offset + length)
+        offset += length
+
+
+class RecordReader:
+    """Streaming record parser
+
+    feed() takes chunks as they arrive (say, from a data connection) and
+    returns the records they complete; close() returns what is left.
+    Only an incomplete record or block is ever buffered.
+    """
+
+    def __init__(self, recfm: str = 'FB', lrecl: int = 80):
+        if recfm not in FIXED_FORMATS + VARIABLE_FORMATS:
+            raise ValueError(f"Unsupported RECFM {recfm}")
+        self.recfm = recfm
+        self.lrecl = lrecl
+        self.buffer = bytearray()
+
+    def feed(self, chunk: BytesLike) -> List[bytes]:
+        """Records completed by `chunk`"""
+        self.buffer += chunk
+        view = memoryview(self.buffer)
+        try:
+            if self.recfm in FIXED_FORMATS:
+                end = len(view) - len(view) % self.lrecl
+                records = [bytes(record) for record in iter_records(view[:end], self.lrecl)]
+            else:
+                records, end = [], 0
+                while len(view) - end >= DESCRIPTOR_SIZE:
+                    length, _ = DESCRIPTOR.unpack_from(view, end)
+                    if length < DESCRIPTOR_SIZE:
+                        raise ValueError(f"Bad BDW length {length}")
+                    if len(view) - end < length:
+                        break
+                    records.extend(bytes(record) for record in
+                                   _block_records(view, end + DESCRIPTOR_SIZE, end + length))
+                    end += length
+        finally:
+            view.release()
+        del self.buffer[:end]
+        return records
+
+    def close(self) -> List[bytes]:
+        """The short trailing fixed record, if any; raises on a partial variable block"""
+        rest, self.buffer = bytes(self.buffer), bytearray()
+        if not rest:
+            return []
+        if self.recfm in VARIABLE_FORMATS:
+            raise ValueError(f"Truncated block ({len(rest)} bytes)")
+        return [rest]
+
+
+def stream_records(chunks: Iterable[BytesLike], recfm: str = 'FB', lrecl: int = 80) -> Iterator[bytes]:
+    """Records of a dataset read chunk by chunk"""
+    reader = RecordReader(recfm, lrecl)
+    for chunk in chunks:
+        yield from reader.feed(chunk)
+    yield from reader.close()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Spatial index over DOOM player positions and enemy sightings
+SQLite R*Tree tables keyed by map-unit x/y, tick and level, maintained by
+the writer, with grid heatmaps returned as NumPy arrays
+"""
+
+import os
+import sqlite3
+import logging
+from typing import Optional, Sequence, Tuple
+
+from doom_state_codec import MAX_ENEMIES, iter_enemies
+from state_writer import read_state_rows
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Every point is a degenerate box: min == max in each dimension
+PLAYER_RTREE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS player_rtree USING rtree_i32(
+        id,
+        min_x, max_x, min_y, max_y,
+        min_tick, max_tick, min_level, max_level,
+        +session_id, +health, +damage
+    )
+'''
+
+# id is state_id * 16 + enemy_index, as in the enemies view
+ENEMY_RTREE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS enemy_rtree USING rtree_i32(
+        id,
+        min_x, max_x, min_y, max_y,
+        min_tick, max_tick, min_level, max_level,
+        +state_id, +session_id, +type, +health
+    )
+'''
+
+PLAYER_INSERT = 'INSERT OR REPLACE INTO player_rtree VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+ENEMY_INSERT = 'INSERT OR REPLACE INTO enemy_rtree VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+# game_state columns the index is built from
+INDEXED_COLUMNS = ('id', 'session_id', 'tick', 'level', 'health', 'armor', 'x', 'y', 'enemy_data')
+
+
+def rtree_available(conn) -> bool:
+    """True if this SQLite build includes the R*Tree module"""
+    return any('ENABLE_RTREE' in row[0] for row in conn.execute('PRAGMA compile_options'))
+
+
+def ensure_spatial_tables(cursor):
+    """R*Tree tables in the main database"""
+    if not rtree_available(cursor.connection):
+        raise RuntimeError("SQLite was built without the R*Tree module")
+    cursor.execute(PLAYER_RTREE)
+    cursor.execute(ENEMY_RTREE)
+
+
+class SpatialIndexer:
+    """Adds each committed batch to the R*Tree tables
+
+    Player boxes carry the damage taken since the previous state of the
+    session (health + armor drop, not across level changes), so damage
+    and death locations need no second pass over game_state.
+    """
+
+    def __init__(self):
+        self.previous = {}  # session -> (level, health + armor)
+
+    def add_batch(self, conn: sqlite3.Connection, state_rows, enemy_rows=()):
+        """Insert player points and enemy sightings for one batch (caller commits)"""
+        players = []
+        sightings = []
+        states = {}
+
+        for row in state_rows:
+            session = row.session_id or 0
+            level, health = row.level, row.health
+            vitals = health + row.armor
+
+            prev = self.previous.get(session)
+            damage = max(0, prev[1] - vitals) if prev and prev[0] == level else 0
+            self.previous[session] = (level, vitals)
+
+            x, y, tick = row.x >> 16, row.y >> 16, row.tick
+            players.append((row.id, x, x, y, y, tick, tick, level, level, session, health, damage))
+            states[row.id] = (tick, level, session)
+
+            # Packed states carry their enemies in the row
+            if row.enemy_data is not None:
+                for i, (etype, ehealth, ex, ey, _) in enumerate(iter_enemies(row.enemy_data)):
+                    ex, ey = ex >> 16, ey >> 16
+                    sightings.append((row.id * MAX_ENEMIES + i, ex, ex, ey, ey,
+                                      tick, tick, level, level, row.id, session, etype, ehealth))
+
+        for state_id, i, etype, ehealth, ex, ey, _ in enemy_rows:
+            tick, level, session = states[state_id]
+            ex, ey = ex >> 16, ey >> 16
+            sightings.append((state_id * MAX_ENEMIES + i, ex, ex, ey, ey,
+                              tick, tick, level, level, state_id, session, etype, ehealth))
+
+        conn.executemany(PLAYER_INSERT, players)
+        if sightings:
+            conn.executemany(ENEMY_INSERT, sightings)
+
+
+class SpatialQueries:
+    """Box queries and heatmaps over the R*Tree tables
+
+    `reader` is anything with fetchall(sql, params), e.g. StateReadPool.
+    Bounding boxes are (min_x, min_y, max_x, max_y) in map units,
+    inclusive; `ticks` is an inclusive (first, last) tick range.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    @staticmethod
+    def _where(bbox, level, ticks, session_id) -> Tuple[str, list]:
+        min_x, min_y, max_x, max_y = bbox
+        clauses = ['min_x >= ?', 'max_x <= ?', 'min_y >= ?', 'max_y <= ?']
+        params = [min_x, max_x, min_y, max_y]
+        if level is not None:
+            clauses += ['min_level >= ?', 'max_level <= ?']
+            params += [level, level]
+        if ticks is not None:
+            clauses += ['min_tick >= ?', 'max_tick <= ?']
+            params += list(ticks)
+        if session_id is not None:
+            clauses.append('session_id = ?')
+            params.append(session_id)
+        return ' AND '.join(clauses), params
+
+    def bounds(self, level: Optional[int] = None) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding box of every player position (on one level)"""
+        where, params = ('WHERE min_level >= ? AND max_level <= ?', [level, level]) if level is not None else ('', [])
+        row = self.reader.fetchall(
+            f'SELECT MIN(min_x), MIN(min_y), MAX(max_x), MAX(max_y) FROM player_rtree {where}', params
+        )[0]
+        return None if row[0] is None else row
+
+    def player_positions(self, bbox: Sequence[int], level: Optional[int] = None,
+                         ticks: Optional[Tuple[int, int]] = None, session_id: Optional[int] = None):
+        """(state_id, x, y, tick, health, damage) for player positions in a box"""
+        where, params = self._where(bbox, level, ticks, session_id)
+        return self.reader.fetchall(
+            f'SELECT id, min_x, min_y, min_tick, health, damage FROM player_rtree WHERE {where} ORDER BY id',
+            params
+        )
+
+    def death_locations(self, bbox: Sequence[int], level: Optional[int] = None,
+                        ticks: Optional[Tuple[int, int]] = None, session_id: Optional[int] = None):
+        """(state_id, x, y, tick) where health dropped to zero"""
+        where, params = self._where(bbox, level, ticks, session_id)
+        return self.reader.fetchall(
+            f'SELECT id, min_x, min_y, min_tick FROM player_rtree '
+            f'WHERE {where} AND health <= 0 AND damage > 0 ORDER BY id',
+            params
+        )
+
+    def player_heatmap(self, bbox: Sequence[int], cell: int = 64, level: Optional[int] = None,
+                       ticks: Optional[Tuple[int, int]] = None, session_id: Optional[int] = None,
+                       weight: str = 'visits'):
+        """Grid of player visits (or damage taken) per `cell` map units
+
+        Rows are y, columns x, with [0, 0] at (min_x, min_y). Cells that
+        stay 0 under 'visits' are areas the player never reached.
+        """
+        if weight not in ('visits', 'damage'):
+            raise ValueError(f"Unknown heatmap weight: {weight}")
+        where, params = self._where(bbox, level, ticks, session_id)
+        value = '1' if weight == 'visits' else 'damage'
+        rows = self.reader.fetchall(f'SELECT min_x, min_y, {value} FROM player_rtree WHERE {where}', params)
+        return self._grid(rows, bbox, cell)
+
+    def enemy_heatmap(self, bbox: Sequence[int], cell: int = 64, level: Optional[int] = None,
+                      ticks: Optional[Tuple[int, int]] = None, session_id: Optional[int] = None,
+                      enemy_type: Optional[int] = None):
+        """Grid of enemy sightings per `cell` map units, optionally of one type"""
+        where, params = self._where(bbox, level, ticks, session_id)
+        if enemy_type is not None:
+            where += ' AND type = ?'
+            params.append(enemy_type)
+        rows = self.reader.fetchall(f'SELECT min_x, min_y, 1 FROM enemy_rtree WHERE {where}', params)
+        return self._grid(rows, bbox, cell)
+
+    @staticmethod
+    def _grid(rows, bbox: Sequence[int], cell: int):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required for heatmaps")
+
+        min_x, min_y, max_x, max_y = bbox
+        grid = np.zeros(((max_y - min_y) // cell + 1, (max_x - min_x) // cell + 1), dtype=np.int64)
+        if rows:
+            points = np.array(rows, dtype=np.int64)
+            np.add.at(grid, ((points[:, 1] - min_y) // cell, (points[:, 0] - min_x) // cell), points[:, 2])
+        return grid
+
+
+def rebuild(db_path: str, chunk: int = 10000) -> int:
+    """Rebuild the R*Tree tables from game_state (main database and partitions)
+
+    Run with the capture stopped; a running writer keeps its own
+    per-session damage deltas in memory.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        ensure_spatial_tables(cursor)
+        cursor.execute('DELETE FROM player_rtree')
+        cursor.execute('DELETE FROM enemy_rtree')
+
+        sources = [db_path]
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'partitions'").fetchone():
+            sources += [path for (path,) in cursor.execute('SELECT path FROM partitions ORDER BY key')
+                        if os.path.exists(path)]
+
+        indexer = SpatialIndexer()
+        total = 0
+        for path in sources:
+            source = conn if path == db_path else sqlite3.connect(path, timeout=30)
+            try:
+                for batch in read_state_rows(source, INDEXED_COLUMNS, chunk):
+                    enemy_rows = []
+                    unpacked = [row.id for row in batch if row.enemy_data is None]
+                    if unpacked:
+                        enemy_rows = source.execute(
+                            'SELECT state_id, enemy_index, type, health, x, y, distance FROM enemies '
+                            'WHERE state_id BETWEEN ? AND ? ORDER BY state_id, enemy_index',
+                            (unpacked[0], unpacked[-1])
+                        ).fetchall()
+                        wanted = set(unpacked)
+                        enemy_rows = [row for row in enemy_rows if row[0] in wanted]
+                    indexer.add_batch(conn, batch, enemy_rows)
+                    total += len(batch)
+            finally:
+                if source is not conn:
+                    source.close()
+
+        conn.commit()
+        return total
+    finally:
+        conn.close()
+
+
+def main():
+    """Rebuild the spatial index or print a heatmap"""
+    import argparse
+    from latest_state import StateReadPool
+
+    parser = argparse.ArgumentParser(description='DOOM state spatial index')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from game_state')
+    parser.add_argument('--level', type=int, help='Only this level')
+    parser.add_argument('--session', type=int, help='Only this session')
+    parser.add_argument('--cell', type=int, default=128, help='Heatmap cell size in map units')
+    parser.add_argument('--weight', choices=('visits', 'damage'), default='visits')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Indexed {rebuild(args.db)} states")
+
+    pool = StateReadPool(args.db, size=1)
+    queries = SpatialQueries(pool)
+    bbox = queries.bounds(args.level)
+    if bbox is None:
+        print("No indexed positions")
+        return
+
+    grid = queries.player_heatmap(bbox, args.cell, args.level, session_id=args.session, weight=args.weight)
+    print(f"{args.weight} heatmap of {bbox}, {args.cell}-unit cells ({grid.shape[1]}x{grid.shape[0]})")
+    shades = ' .:-=+*#%@'
+    peak = grid.max() or 1
+    for row in grid[::-1]:
+        print(''.join(shades[min(len(shades) - 1, int(v * (len(shades) - 1) / peak + 0.999))] for v in row))
+
+    deaths = queries.death_locations(bbox, args.level, session_id=args.session)
+    print(f"\n{len(deaths)} deaths" + (f", last at ({deaths[-1][1]}, {deaths[-1][2]})" if deaths else ''))
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained analytics aggregates for DOOM state capture
+Per-second and per-minute buckets per session, updated by the writer in
+the same transaction as the states they summarize
+"""
+
+import os
+import sqlite3
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from state_compaction import run_ticks
+from state_writer import read_state_rows
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {'second': 1, 'minute': 60}
+
+AGGREGATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        session_id INTEGER,
+        bucket INTEGER,
+        samples INTEGER,
+        tick_first INTEGER,
+        tick_last INTEGER,
+        level INTEGER,
+        health_sum INTEGER,
+        health_min INTEGER,
+        health_max INTEGER,
+        health_last INTEGER,
+        armor_sum INTEGER,
+        damage_taken INTEGER,
+        kills_gained INTEGER,
+        items_gained INTEGER,
+        secrets_gained INTEGER,
+        enemy_sum INTEGER,
+        enemy_max INTEGER,
+        PRIMARY KEY (session_id, bucket)
+    )
+'''
+
+AGGREGATE_UPSERT = '''
+    INSERT INTO {table} (
+        session_id, bucket, samples, tick_first, tick_last, level,
+        health_sum, health_min, health_max, health_last, armor_sum,
+        damage_taken, kills_gained, items_gained, secrets_gained,
+        enemy_sum, enemy_max
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(session_id, bucket) DO UPDATE SET
+        samples = samples + excluded.samples,
+        tick_last = excluded.tick_last,
+        level = excluded.level,
+        health_sum = health_sum + excluded.health_sum,
+        health_min = MIN(health_min, excluded.health_min),
+        health_max = MAX(health_max, excluded.health_max),
+        health_last = excluded.health_last,
+        armor_sum = armor_sum + excluded.armor_sum,
+        damage_taken = damage_taken + excluded.damage_taken,
+        kills_gained = kills_gained + excluded.kills_gained,
+        items_gained = items_gained + excluded.items_gained,
+        secrets_gained = secrets_gained + excluded.secrets_gained,
+        enemy_sum = enemy_sum + excluded.enemy_sum,
+        enemy_max = MAX(enemy_max, excluded.enemy_max)
+'''
+
+# Per-minute distribution of enemy_count
+ENEMY_HISTOGRAM_TABLE = '''
+    CREATE TABLE IF NOT EXISTS state_agg_enemies (
+        session_id INTEGER,
+        bucket INTEGER,
+        enemy_count INTEGER,
+        samples INTEGER,
+        PRIMARY KEY (session_id, bucket, enemy_count)
+    )
+'''
+
+ENEMY_HISTOGRAM_UPSERT = '''
+    INSERT INTO state_agg_enemies (session_id, bucket, enemy_count, samples)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(session_id, bucket, enemy_count) DO UPDATE SET
+        samples = samples + excluded.samples
+'''
+
+# game_state columns the aggregates are built from, plus the run range
+AGGREGATED_COLUMNS = (
+    'session_id', 'timestamp', 'tick', 'level', 'health', 'armor',
+    'kills', 'items', 'secrets', 'enemy_count', 'tick_last', 'timestamp_last'
+)
+
+
+def table_for(resolution: str) -> str:
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    return f"state_agg_{resolution}"
+
+
+def ensure_aggregate_tables(cursor):
+    """Aggregate tables in the main database"""
+    for resolution in RESOLUTIONS:
+        cursor.execute(AGGREGATE_TABLE.format(table=table_for(resolution)))
+    cursor.execute(ENEMY_HISTOGRAM_TABLE)
+
+
+class StateAggregator:
+    """Folds batches of game_state rows into the aggregate tables
+
+    Damage and kill/item/secret progress are deltas between consecutive
+    states of a session, so the previous state of each session is kept
+    in memory. After a restart the first state of a session starts a new
+    delta chain; level changes reset the counters and are not counted.
+    """
+
+    def __init__(self):
+        self.previous = {}  # session -> (level, health, armor, kills, items, secrets)
+
+    def add_batch(self, conn: sqlite3.Connection, state_rows):
+        """Upsert the aggregates for one batch (caller commits)"""
+        buckets = {resolution: {} for resolution in RESOLUTIONS}
+        histogram = {}
+
+        for row in state_rows:
+            session = row.session_id or 0
+            level, health, armor = row.level, row.health, row.armor
+            kills, items, secrets = row.kills, row.items, row.secrets
+            enemies = row.enemy_count
+
+            damage = kills_gained = items_gained = secrets_gained = 0
+            prev = self.previous.get(session)
+            if prev and prev[0] == level:
+                damage = max(0, (prev[1] + prev[2]) - (health + armor))
+                kills_gained = max(0, kills - prev[3])
+                items_gained = max(0, items - prev[4])
+                secrets_gained = max(0, secrets - prev[5])
+            self.previous[session] = (level, health, armor, kills, items, secrets)
+
+            second = int(row.timestamp)
+            for resolution, size in RESOLUTIONS.items():
+                key = (session, second - second % size)
+                agg = buckets[resolution].get(key)
+                if agg is None:
+                    buckets[resolution][key] = [
+                        1, row.tick, row.tick, level,
+                        health, health, health, health, armor,
+                        damage, kills_gained, items_gained, secrets_gained,
+                        enemies, enemies
+                    ]
+                    continue
+                agg[0] += 1
+                agg[2] = row.tick
+                agg[3] = level
+                agg[4] += health
+                agg[5] = min(agg[5], health)
+                agg[6] = max(agg[6], health)
+                agg[7] = health
+                agg[8] += armor
+                agg[9] += damage
+                agg[10] += kills_gained
+                agg[11] += items_gained
+                agg[12] += secrets_gained
+                agg[13] += enemies
+                agg[14] = max(agg[14], enemies)
+
+            key = (session, second - second % RESOLUTIONS['minute'], enemies)
+            histogram[key] = histogram.get(key, 0) + 1
+
+        for resolution, aggs in buckets.items():
+            conn.executemany(
+                AGGREGATE_UPSERT.format(table=table_for(resolution)),
+                [(*key, *agg) for key, agg in aggs.items()]
+            )
+        conn.executemany(ENEMY_HISTOGRAM_UPSERT, [(*key, n) for key, n in histogram.items()])
+
+
+class StateAnalytics:
+    """Dashboard queries answered from the aggregate tables only
+
+    `reader` is anything with fetchall(sql, params), e.g. StateReadPool.
+    Times are bucket start times in Unix seconds; `start`/`end` bound
+    them inclusively.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def _buckets(self, columns: str, resolution: str, session_id: Optional[int],
+                 start: Optional[float], end: Optional[float]):
+        where, params = self._where(session_id, start, end)
+        return self.reader.fetchall(
+            f"SELECT bucket, {columns} FROM {table_for(resolution)} {where} "
+            f"GROUP BY bucket ORDER BY bucket",
+            params
+        )
+
+    @staticmethod
+    def _where(session_id, start, end) -> Tuple[str, List]:
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append('session_id = ?')
+            params.append(session_id)
+        if start is not None:
+            clauses.append('bucket >= ?')
+            params.append(int(start))
+        if end is not None:
+            clauses.append('bucket <= ?')
+            params.append(int(end))
+        return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def health_over_time(self, session_id: Optional[int] = None, resolution: str = 'second',
+                         start: Optional[float] = None, end: Optional[float] = None):
+        """(bucket, avg, min, max) health"""
+        return self._buckets(
+            'CAST(SUM(health_sum) AS REAL) / SUM(samples), MIN(health_min), MAX(health_max)',
+            resolution, session_id, start, end
+        )
+
+    def progress_per_minute(self, session_id: Optional[int] = None,
+                            start: Optional[float] = None, end: Optional[float] = None):
+        """(minute, kills, items, secrets) gained in each minute"""
+        return self._buckets(
+            'SUM(kills_gained), SUM(items_gained), SUM(secrets_gained)',
+            'minute', session_id, start, end
+        )
+
+    def damage_rate(self, session_id: Optional[int] = None, resolution: str = 'minute',
+                    start: Optional[float] = None, end: Optional[float] = None):
+        """(bucket, damage taken, damage per second) from health + armor drops"""
+        size = RESOLUTIONS[resolution]
+        return self._buckets(
+            f'SUM(damage_taken), CAST(SUM(damage_taken) AS REAL) / {size}',
+            resolution, session_id, start, end
+        )
+
+    def enemy_count_distribution(self, session_id: Optional[int] = None,
+                                 start: Optional[float] = None,
+                                 end: Optional[float] = None) -> Dict[int, int]:
+        """enemy_count -> samples, over whole minutes"""
+        where, params = self._where(session_id, start, end)
+        rows = self.reader.fetchall(
+            f"SELECT enemy_count, SUM(samples) FROM state_agg_enemies {where} "
+            f"GROUP BY enemy_count ORDER BY enemy_count",
+            params
+        )
+        return dict(rows)
+
+
+def rebuild(db_path: str, chunk: int = 10000) -> int:
+    """Recompute all aggregates from game_state (main database and partitions)
+
+    Run with the capture stopped; a running writer keeps its own
+    per-session deltas in memory.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        ensure_aggregate_tables(cursor)
+        for resolution in RESOLUTIONS:
+            cursor.execute(f'DELETE FROM {table_for(resolution)}')
+        cursor.execute('DELETE FROM state_agg_enemies')
+
+        sources = [db_path]
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'partitions'").fetchone():
+            sources += [path for (path,) in cursor.execute('SELECT path FROM partitions ORDER BY key')
+                        if os.path.exists(path)]
+
+        aggregator = StateAggregator()
+        total = 0
+        for path in sources:
+            source = conn if path == db_path else sqlite3.connect(path, timeout=30)
+            try:
+                for batch in read_state_rows(source, AGGREGATED_COLUMNS, chunk):
+                    # Idle runs count once per state they stand for
+                    states = [
+                        row._replace(timestamp=timestamp, tick=tick)
+                        for row in batch
+                        for tick, timestamp in run_ticks(row.tick, row.timestamp,
+                                                         row.tick_last, row.timestamp_last)
+                    ]
+                    aggregator.add_batch(conn, states)
+                    total += len(states)
+            finally:
+                if source is not conn:
+                    source.close()
+
+        conn.commit()
+        return total
+    finally:
+        conn.close()
+
+
+def main():
+    """Rebuild or summarize the aggregates of a capture database"""
+    import argparse
+    from latest_state import StateReadPool
+
+    parser = argparse.ArgumentParser(description='DOOM state analytics aggregates')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--session', type=int, help='Session id')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute aggregates from game_state')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Aggregated {rebuild(args.db)} states")
+
+    pool = StateReadPool(args.db, size=1)
+    analytics = StateAnalytics(pool)
+
+    print("Minute               Health avg  Damage  Kills  Items  Secrets")
+    print("-" * 62)
+    health = {row[0]: row for row in analytics.health_over_time(args.session, 'minute')}
+    damage = {row[0]: row for row in analytics.damage_rate(args.session, 'minute')}
+    for minute, kills, items, secrets in analytics.progress_per_minute(args.session):
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(minute))
+        print(f"{stamp:<20} {health[minute][1]:>10.1f}  {damage[minute][1]:>6}  "
+              f"{kills:>5}  {items:>5}  {secrets:>7}")
+
+    print("\nEnemy count distribution:", analytics.enemy_count_distribution(args.session))
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
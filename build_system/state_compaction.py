@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Run-length compaction of idle DOOM states
+Consecutive states of a session that differ only in tick (and receive
+time) are stored as one game_state row covering a tick range
+"""
+
+import os
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ingest_sessions import ensure_column
+
+logger = logging.getLogger(__name__)
+
+# A row with run_length N stands for ticks tick .. tick + N - 1 (tick_last),
+# received between timestamp and timestamp_last. NULL means a single state.
+COMPACTION_COLUMNS = (
+    ('tick_last', 'INTEGER'),
+    ('timestamp_last', 'REAL'),
+    ('run_length', 'INTEGER'),
+)
+
+# Everything that must match for two states to share a row
+SIGNATURE_COLUMNS = (
+    'level', 'health', 'armor', 'x', 'y', 'z', 'angle', 'momx', 'momy', 'weapon',
+    'ammo_bullets', 'ammo_shells', 'ammo_cells', 'ammo_rockets',
+    'kills', 'items', 'secrets', 'enemy_count'
+)
+
+# One row per original state; timestamps inside a run are interpolated
+EXPANDED_VIEW = '''
+    CREATE VIEW IF NOT EXISTS game_state_expanded AS
+    WITH RECURSIVE step(n) AS (
+        SELECT 0
+        UNION ALL
+        SELECT n + 1 FROM step
+        WHERE n + 1 < (SELECT COALESCE(MAX(run_length), 1) FROM game_state)
+    )
+    SELECT g.id AS state_id, g.session_id,
+           CASE WHEN g.run_length > 1
+                THEN g.timestamp + (g.timestamp_last - g.timestamp) * step.n / (g.run_length - 1)
+                ELSE g.timestamp END AS timestamp,
+           g.tick + step.n AS tick,
+           g.level, g.health, g.armor, g.x, g.y, g.z, g.angle, g.momx, g.momy, g.weapon,
+           g.ammo_bullets, g.ammo_shells, g.ammo_cells, g.ammo_rockets,
+           g.kills, g.items, g.secrets, g.enemy_count
+    FROM game_state g JOIN step ON step.n < COALESCE(g.run_length, 1)
+'''
+
+
+def ensure_compaction_columns(cursor):
+    """Run-length columns on game_state (main database or a partition)"""
+    for name, sql_type in COMPACTION_COLUMNS:
+        ensure_column(cursor, 'game_state', name, sql_type)
+
+
+def ensure_expanded_view(cursor):
+    cursor.execute(EXPANDED_VIEW)
+
+
+def run_ticks(tick: int, timestamp: float, tick_last: Optional[int],
+              timestamp_last: Optional[float]) -> Iterator[Tuple[int, float]]:
+    """(tick, timestamp) of every state a row stands for"""
+    if tick_last is None or tick_last <= tick:
+        yield tick, timestamp
+        return
+
+    span = tick_last - tick
+    step = ((timestamp_last or timestamp) - timestamp) / span
+    for n in range(span + 1):
+        yield tick + n, timestamp + step * n
+
+
+def expand_states(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Expand run-length rows (dicts with game_state columns) into one dict per tick"""
+    for row in rows:
+        if not row.get('run_length') or row['run_length'] == 1:
+            yield row
+            continue
+
+        for tick, timestamp in run_ticks(row['tick'], row['timestamp'],
+                                         row['tick_last'], row['timestamp_last']):
+            state = dict(row)
+            state['tick'] = tick
+            state['timestamp'] = timestamp
+            state['tick_last'] = state['timestamp_last'] = state['run_length'] = None
+            yield state
+
+
+def _enemy_signatures(conn, first_id: int, last_id: int) -> Dict[int, str]:
+    """state_id -> enemies as text, for rows without enemy_data"""
+    return dict(conn.execute('''
+        SELECT state_id, group_concat(type || ',' || health || ',' || x || ',' || y || ',' || distance, ';')
+        FROM (SELECT * FROM enemies WHERE state_id BETWEEN ? AND ? ORDER BY state_id, enemy_index)
+        GROUP BY state_id
+    ''', (first_id, last_id)))
+
+
+def _object_type(conn, name: str):
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = ? AND type IN ('table', 'view')", (name,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def compact_file(conn: sqlite3.Connection, main_conn=None, chunk: int = 10000) -> Dict[str, int]:
+    """Collapse idle runs in one database file; returns counts
+
+    Only states with consecutive ticks are merged, so expanding a run
+    reproduces the original ticks exactly. Enemy and cobol_state rows
+    of removed states are deleted with them. In `main_conn` (the main
+    database, if different) their R*Tree entries are deleted and
+    latest_state is pointed at the run heads.
+    """
+    main_conn = main_conn or conn
+    ensure_compaction_columns(conn.cursor())
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(game_state)')}
+    session = 'session_id' if 'session_id' in columns else 'NULL'
+    enemy_data = 'enemy_data' if 'enemy_data' in columns else 'NULL'
+    enemies_table = _object_type(conn, 'enemies') == 'table'
+    cobol_table = _object_type(conn, 'cobol_state') == 'table'
+
+    rows = conn.execute(f'''
+        SELECT id, {session}, timestamp, tick, tick_last, timestamp_last, run_length,
+               {', '.join(SIGNATURE_COLUMNS)}, {enemy_data}
+        FROM game_state ORDER BY id
+    ''')
+
+    latest = {}
+    if _object_type(main_conn, 'latest_state'):
+        latest = {state_id: None for (state_id,) in main_conn.execute('SELECT state_id FROM latest_state')}
+
+    runs = {}      # head id -> [tick_last, timestamp_last, run_length]
+    removed = []
+    current = {}   # session -> [signature, head id, tick_last, timestamp_last, run_length]
+
+    while True:
+        batch = rows.fetchmany(chunk)
+        if not batch:
+            break
+
+        enemy_text = {}
+        if enemies_table and any(row[-1] is None for row in batch):
+            ids = [row[0] for row in batch]
+            enemy_text = _enemy_signatures(conn, min(ids), max(ids))
+
+        for row in batch:
+            state_id, sess, timestamp, tick, tick_last, timestamp_last, length = row[:7]
+            blob = row[-1]
+            signature = (row[7:-1], blob if blob is not None else enemy_text.get(state_id))
+            length = length or 1
+            tick_last = tick_last if tick_last is not None else tick
+            timestamp_last = timestamp_last if timestamp_last is not None else timestamp
+
+            run = current.get(sess)
+            if run and run[0] == signature and tick == run[2] + 1:
+                run[2] = tick_last
+                run[3] = timestamp_last
+                run[4] += length
+                runs[run[1]] = run[2:5]
+                removed.append(state_id)
+                if state_id in latest:
+                    latest[state_id] = run[1]
+                continue
+
+            current[sess] = [signature, state_id, tick_last, timestamp_last, length]
+
+    conn.executemany(
+        'UPDATE game_state SET tick_last = ?, timestamp_last = ?, run_length = ? WHERE id = ?',
+        [(*run, head) for head, run in runs.items()]
+    )
+    params = [(state_id,) for state_id in removed]
+    conn.executemany('DELETE FROM game_state WHERE id = ?', params)
+    if enemies_table:
+        conn.executemany('DELETE FROM enemies WHERE state_id = ?', params)
+    if cobol_table:
+        conn.executemany('DELETE FROM cobol_state WHERE state_id = ?', params)
+    conn.commit()
+
+    if _object_type(main_conn, 'player_rtree'):
+        main_conn.executemany('DELETE FROM player_rtree WHERE id = ?', params)
+        main_conn.executemany(
+            'DELETE FROM enemy_rtree WHERE id BETWEEN ? * 16 AND ? * 16 + 15',
+            [(state_id, state_id) for state_id in removed]
+        )
+    if latest:
+        main_conn.executemany(
+            'UPDATE latest_state SET state_id = ? WHERE state_id = ?',
+            [(head, state_id) for state_id, head in latest.items() if head is not None]
+        )
+    main_conn.commit()
+
+    return {'runs': len(runs), 'removed': len(removed)}
+
+
+def compact(db_path: str, vacuum: bool = False) -> Dict[str, int]:
+    """Compact the main database and every partition file
+
+    Run with the capture stopped (or on a copy); the writer keeps its
+    own in-memory runs.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    totals = {'runs': 0, 'removed': 0}
+    try:
+        sources: List[str] = []
+        if _object_type(conn, 'partitions'):
+            sources = [path for (path,) in conn.execute('SELECT path FROM partitions ORDER BY key')
+                       if os.path.exists(path)]
+
+        for path in [db_path, *sources]:
+            part = conn if path == db_path else sqlite3.connect(path, timeout=30)
+            try:
+                start = time.perf_counter()
+                counts = compact_file(part, main_conn=conn)
+                logger.info(f"{path}: {counts['removed']} states folded into {counts['runs']} runs "
+                            f"({time.perf_counter() - start:.1f}s)")
+                if vacuum and counts['removed']:
+                    part.execute('VACUUM')
+            finally:
+                if part is not conn:
+                    part.close()
+            for key in totals:
+                totals[key] += counts[key]
+    finally:
+        conn.close()
+    return totals
+
+
+def main():
+    """Compact idle runs in a capture database"""
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='DOOM state run-length compaction')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM files that shrank')
+    args = parser.parse_args()
+
+    totals = compact(args.db, vacuum=args.vacuum)
+    print(f"Folded {totals['removed']} states into {totals['runs']} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Columnar session export for offline analysis
+Streams a session's states and enemies out of SQLite into typed column
+files, one chunk at a time, and maps them back for NumPy/pandas
+"""
+
+import json
+import os
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from doom_state_codec import ENEMY_STRUCT
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# npy: one memory-mappable .npy file per column (the member format of .npz,
+# which itself cannot be memory-mapped); arrow: Arrow IPC files, also
+# memory-mapped; parquet: compressed, decoded on load
+EXPORT_FORMATS = ('npy', 'arrow', 'parquet')
+
+TABLES = ('states', 'enemies')
+
+STATE_COLUMNS = (
+    ('state_id', '<i8'),
+    ('session_id', '<i4'),
+    ('timestamp', '<f8'),
+    ('tick', '<i4'),
+    ('level', '<i4'),
+    ('health', '<i4'),
+    ('armor', '<i4'),
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('z', '<i4'),
+    ('angle', '<i4'),
+    ('momx', '<i4'),
+    ('momy', '<i4'),
+    ('weapon', '<i4'),
+    ('ammo_bullets', '<i4'),
+    ('ammo_shells', '<i4'),
+    ('ammo_cells', '<i4'),
+    ('ammo_rockets', '<i4'),
+    ('kills', '<i4'),
+    ('items', '<i4'),
+    ('secrets', '<i4'),
+    ('enemy_count', '<i4'),
+    # Precomputed: 16.16 fixed point >> 16, as in the COBOL records, and
+    # the binary angle in degrees
+    ('map_x', '<i4'),
+    ('map_y', '<i4'),
+    ('map_z', '<i4'),
+    ('angle_deg', '<f4'),
+)
+
+# state_row indexes the states columns of the same export
+ENEMY_COLUMNS = (
+    ('state_row', '<i8'),
+    ('state_id', '<i8'),
+    ('tick', '<i4'),
+    ('type', '<i4'),
+    ('health', '<i4'),
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('distance', '<i4'),
+    ('map_x', '<i4'),
+    ('map_y', '<i4'),
+    ('map_distance', '<i4'),
+)
+
+COLUMNS = {'states': STATE_COLUMNS, 'enemies': ENEMY_COLUMNS}
+
+# game_state columns read per chunk, in STATE_COLUMNS order up to enemy_count
+_SOURCE_COLUMNS = (
+    'level', 'health', 'armor', 'x', 'y', 'z', 'angle', 'momx', 'momy', 'weapon',
+    'ammo_bullets', 'ammo_shells', 'ammo_cells', 'ammo_rockets',
+    'kills', 'items', 'secrets', 'enemy_count'
+)
+
+MANIFEST = 'manifest.json'
+
+# npy headers are written with room for any shape, then patched on close
+_NPY_HEADER_SIZE = 128
+
+
+def _sources(db_path: str) -> List[str]:
+    """Main database first, then partition files in window order"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        paths = [db_path]
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'partitions'").fetchone():
+            paths += [path for (path,) in conn.execute('SELECT path FROM partitions ORDER BY key')
+                      if os.path.exists(path)]
+        return paths
+    finally:
+        conn.close()
+
+
+def _angle_degrees(angle):
+    """Binary angle (full circle = 2^32) in degrees, 0 <= deg < 360"""
+    return ((angle.astype(np.int64) & 0xFFFFFFFF) * (360.0 / 4294967296.0)).astype(np.float32)
+
+
+class _ChunkReader:
+    """Reads one database file in id order, a chunk of rows at a time"""
+
+    def __init__(self, path: str, session_id: Optional[int], start_tick: Optional[int],
+                 end_tick: Optional[int], chunk: int):
+        self.conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        self.chunk = chunk
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(game_state)')}
+        compacted = 'run_length' in columns
+        self.packed = 'enemy_data' in columns
+        self.enemy_rows = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'enemies'"
+        ).fetchone() is not None
+
+        where, params = [], []
+        if session_id is not None:
+            if 'session_id' not in columns:
+                where.append('0')
+            else:
+                where.append('session_id = ?')
+                params.append(session_id)
+        if start_tick is not None:
+            where.append(f"{'COALESCE(tick_last, tick)' if compacted else 'tick'} >= ?")
+            params.append(start_tick)
+        if end_tick is not None:
+            where.append('tick <= ?')
+            params.append(end_tick)
+
+        self.cursor = self.conn.execute(f'''
+            SELECT id, {'COALESCE(session_id, 0)' if 'session_id' in columns else '0'},
+                   timestamp, tick,
+                   {'COALESCE(timestamp_last, timestamp), COALESCE(run_length, 1)' if compacted else 'timestamp, 1'},
+                   {', '.join(_SOURCE_COLUMNS)},
+                   {'enemy_data' if self.packed else 'NULL'}
+            FROM game_state
+            {('WHERE ' + ' AND '.join(where)) if where else ''}
+            ORDER BY id
+        ''', params)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        rows = self.cursor.fetchmany(self.chunk)
+        if not rows:
+            raise StopIteration
+        return rows
+
+    def enemies(self, state_ids, blobs):
+        """(original row index, type, health, x, y, distance) for one chunk"""
+        parts = []
+        packed = [i for i, blob in enumerate(blobs) if blob is not None]
+        if packed:
+            counts = np.array([len(blobs[i]) // ENEMY_STRUCT.size for i in packed], dtype=np.int64)
+            values = np.frombuffer(b''.join(blobs[i][:n * ENEMY_STRUCT.size] for i, n in zip(packed, counts)),
+                                   dtype='<i4').reshape(-1, 5)
+            parts.append((np.repeat(np.array(packed, dtype=np.int64), counts), values))
+
+        if self.enemy_rows and len(packed) < len(blobs):
+            rows = self.conn.execute(
+                'SELECT state_id, type, health, x, y, distance FROM enemies '
+                'WHERE state_id BETWEEN ? AND ? ORDER BY state_id, enemy_index',
+                (int(state_ids[0]), int(state_ids[-1]))
+            ).fetchall()
+            if rows:
+                table = np.array(rows, dtype=np.int64)
+                index = np.searchsorted(state_ids, table[:, 0])
+                index = np.minimum(index, len(state_ids) - 1)
+                keep = state_ids[index] == table[:, 0]
+                parts.append((index[keep], table[keep, 1:].astype(np.int32)))
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, 5), dtype=np.int32)
+        index = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        order = np.argsort(index, kind='stable')
+        return index[order], values[order]
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_session_chunks(db_path: str, session_id: Optional[int] = None,
+                        start_tick: Optional[int] = None, end_tick: Optional[int] = None,
+                        chunk: int = 65536) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (states, enemies) column dicts of at most `chunk` states each
+
+    Run-length rows (state_compaction) are expanded into one state per
+    tick; their enemies are repeated for every state of the run. Only one
+    chunk of database rows and its expansion are held at a time.
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy is required for columnar export")
+
+    for path in _sources(db_path):
+        reader = _ChunkReader(path, session_id, start_tick, end_tick, chunk)
+        try:
+            for rows in reader:
+                blobs = [row[-1] for row in rows]
+                numeric = np.array([row[:-1] for row in rows], dtype=np.float64)
+                ids = numeric[:, 0].astype(np.int64)
+                enemy_index, enemy_values = reader.enemies(ids, blobs)
+                yield from _expand(numeric, ids, enemy_index, enemy_values, start_tick, end_tick, chunk)
+        finally:
+            reader.close()
+
+
+def _expand(numeric, ids, enemy_index, enemy_values, start_tick, end_tick, chunk):
+    """Expand one chunk of database rows into per-tick column slices"""
+    weights = numeric[:, 5].astype(np.int64)
+    ends = np.cumsum(weights)
+    starts = ends - weights
+    enemy_counts = np.bincount(enemy_index, minlength=len(ids))
+    enemy_ends = np.cumsum(enemy_counts)
+    enemy_starts = enemy_ends - enemy_counts
+
+    for first in range(0, int(ends[-1]), chunk):
+        expanded = np.arange(first, min(first + chunk, int(ends[-1])), dtype=np.int64)
+        row = np.searchsorted(ends, expanded, side='right')
+        step = expanded - starts[row]
+
+        tick = numeric[row, 3].astype(np.int64) + step
+        keep = np.ones(len(row), dtype=bool)
+        if start_tick is not None:
+            keep &= tick >= start_tick
+        if end_tick is not None:
+            keep &= tick <= end_tick
+        if not keep.all():
+            row, step, tick = row[keep], step[keep], tick[keep]
+        if not len(row):
+            continue
+
+        timestamp = numeric[row, 2]
+        span = np.maximum(weights[row] - 1, 1)
+        timestamp = timestamp + (numeric[row, 4] - timestamp) * step / span
+
+        values = numeric[row, 6:].astype(np.int64).astype(np.int32)
+        states = {
+            'state_id': ids[row],
+            'session_id': numeric[row, 1].astype(np.int32),
+            'timestamp': timestamp,
+            'tick': tick.astype(np.int32),
+        }
+        for i, name in enumerate(_SOURCE_COLUMNS):
+            states[name] = values[:, i]
+        states['map_x'] = states['x'] >> 16
+        states['map_y'] = states['y'] >> 16
+        states['map_z'] = states['z'] >> 16
+        states['angle_deg'] = _angle_degrees(states['angle'])
+
+        # Enemies of every expanded state, gathered from their source row
+        counts = enemy_counts[row]
+        total = int(counts.sum())
+        owner = np.repeat(np.arange(len(row), dtype=np.int64), counts)
+        offset = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        picked = enemy_values[enemy_starts[row][owner] + offset] if total else enemy_values[:0]
+        enemies = {
+            'state_row': owner,
+            'state_id': ids[row][owner],
+            'tick': states['tick'][owner],
+            'type': picked[:, 0],
+            'health': picked[:, 1],
+            'x': picked[:, 2],
+            'y': picked[:, 3],
+            'distance': picked[:, 4],
+        }
+        enemies['map_x'] = enemies['x'] >> 16
+        enemies['map_y'] = enemies['y'] >> 16
+        enemies['map_distance'] = enemies['distance'] >> 16
+
+        yield states, enemies
+
+
+class _NpyTableWriter:
+    """Appends chunks to one .npy file per column"""
+
+    def __init__(self, directory: str, columns):
+        os.makedirs(directory, exist_ok=True)
+        self.columns = columns
+        self.rows = 0
+        self.files = {}
+        for name, dtype in columns:
+            f = open(os.path.join(directory, f'{name}.npy'), 'wb')
+            f.write(self._header(dtype, 0))
+            self.files[name] = f
+
+    @staticmethod
+    def _header(dtype: str, rows: int) -> bytes:
+        header = repr({'descr': dtype, 'fortran_order': False, 'shape': (rows,)})
+        prefix = np.lib.format.magic(1, 0)
+        size = _NPY_HEADER_SIZE - len(prefix) - 2
+        return prefix + size.to_bytes(2, 'little') + header.ljust(size - 1).encode('latin1') + b'\n'
+
+    def write(self, columns: Dict[str, Any]):
+        for name, dtype in self.columns:
+            self.files[name].write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        self.rows += len(columns[self.columns[0][0]])
+
+    def close(self):
+        for name, dtype in self.columns:
+            f = self.files[name]
+            f.seek(0)
+            f.write(self._header(dtype, self.rows))
+            f.close()
+
+
+class _ArrowTableWriter:
+    """Appends chunks as record batches (Arrow IPC) or row groups (Parquet)"""
+
+    def __init__(self, path: str, columns, fmt: str):
+        self.columns = columns
+        self.rows = 0
+        self.schema = pa.schema([(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in columns])
+        if fmt == 'arrow':
+            self.sink = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+        else:
+            self.sink = None
+            self.writer = pa.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, columns: Dict[str, Any]):
+        batch = pa.record_batch(
+            [pa.array(np.ascontiguousarray(columns[name], dtype=dtype)) for name, dtype in self.columns],
+            schema=self.schema
+        )
+        if self.sink is not None:
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        self.rows += batch.num_rows
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+def export_session(db_path: str, output: str, session_id: Optional[int] = None, fmt: str = 'npy',
+                   start_tick: Optional[int] = None, end_tick: Optional[int] = None,
+                   chunk: int = 65536) -> Dict[str, Any]:
+    """Export one session (or everything) into the directory `output`
+
+    Returns the manifest written next to the column files.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy is required for columnar export")
+    if fmt != 'npy' and not ARROW_AVAILABLE:
+        raise ImportError(f"pyarrow is required for {fmt} export")
+
+    os.makedirs(output, exist_ok=True)
+    writers = {}
+    for table in TABLES:
+        if fmt == 'npy':
+            writers[table] = _NpyTableWriter(os.path.join(output, table), COLUMNS[table])
+        else:
+            writers[table] = _ArrowTableWriter(os.path.join(output, f'{table}.{fmt}'), COLUMNS[table], fmt)
+
+    start = time.perf_counter()
+    try:
+        for states, enemies in iter_session_chunks(db_path, session_id, start_tick, end_tick, chunk):
+            # state_row is relative to the chunk until here
+            enemies['state_row'] = enemies['state_row'] + writers['states'].rows
+            writers['states'].write(states)
+            writers['enemies'].write(enemies)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    manifest = {
+        'format': fmt,
+        'source': os.path.abspath(db_path),
+        'session_id': session_id,
+        'start_tick': start_tick,
+        'end_tick': end_tick,
+        'exported_at': time.time(),
+        'rows': {table: writer.rows for table, writer in writers.items()},
+        'columns': {table: [list(column) for column in COLUMNS[table]] for table in TABLES}
+    }
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Exported {manifest['rows']['states']} states, {manifest['rows']['enemies']} enemies "
+                f"to {output} ({fmt}, {time.perf_counter() - start:.1f}s)")
+    return manifest
+
+
+class SessionExport:
+    """An exported session, columns memory-mapped where the format allows
+
+    `states` and `enemies` map column names to NumPy arrays. npy columns
+    are read-only memory maps; Arrow columns are zero-copy when the file
+    holds a single record batch; Parquet is decoded into memory.
+    """
+
+    def __init__(self, directory: str):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required to load exports")
+
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.directory = directory
+        self.format = self.manifest['format']
+        self.tables = {}
+        for table in TABLES:
+            names = [name for name, _ in self.manifest['columns'][table]]
+            self.tables[table] = self._load(table, names)
+
+    def _load(self, table: str, names) -> Dict[str, Any]:
+        if self.format == 'npy':
+            return {
+                name: np.load(os.path.join(self.directory, table, f'{name}.npy'), mmap_mode='r')
+                for name in names
+            }
+
+        if not ARROW_AVAILABLE:
+            raise ImportError(f"pyarrow is required to load {self.format} exports")
+        path = os.path.join(self.directory, f'{table}.{self.format}')
+        if self.format == 'arrow':
+            data = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        else:
+            data = pa.parquet.read_table(path, memory_map=True)
+        return {name: data.column(name).to_numpy() for name in names}
+
+    @property
+    def states(self) -> Dict[str, Any]:
+        return self.tables['states']
+
+    @property
+    def enemies(self) -> Dict[str, Any]:
+        return self.tables['enemies']
+
+    def __len__(self):
+        return self.manifest['rows']['states']
+
+    def to_pandas(self, table: str = 'states'):
+        """One table as a pandas DataFrame"""
+        import pandas as pd
+        return pd.DataFrame(self.tables[table], copy=False)
+
+
+def load_session(directory: str) -> SessionExport:
+    return SessionExport(directory)
+
+
+def main():
+    """Export a session to columnar files, or summarize an export"""
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='DOOM session columnar export')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--session', type=int, help='Session id (default: all states)')
+    parser.add_argument('--output', help='Export directory')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='npy')
+    parser.add_argument('--start-tick', type=int, help='First tick to export')
+    parser.add_argument('--end-tick', type=int, help='Last tick to export')
+    parser.add_argument('--chunk', type=int, default=65536, help='States per chunk')
+    parser.add_argument('--load', metavar='DIR', help='Summarize an existing export instead')
+    args = parser.parse_args()
+
+    if args.load:
+        export = load_session(args.load)
+    else:
+        output = args.output or f"session_{args.session if args.session is not None else 'all'}_{args.format}"
+        export_session(args.db, output, args.session, args.format,
+                       args.start_tick, args.end_tick, args.chunk)
+        export = load_session(output)
+
+    states = export.states
+    print(f"{len(export)} states, {export.manifest['rows']['enemies']} enemies ({export.format})")
+    if len(export):
+        print(f"Ticks {states['tick'][0]}-{states['tick'][-1]}, "
+              f"health {states['health'].min()}-{states['health'].max()}, "
+              f"map x {states['map_x'].min()}..{states['map_x'].max()}, "
+              f"y {states['map_y'].min()}..{states['map_y'].max()}")
+
+
+if __name__ == "__main__":
+    main()
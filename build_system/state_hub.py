@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+DOOM State Ingest Hub
+Owns UDP port 31337 once and fans decoded state out to every consumer
+"""
+
+import asyncio
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from doom_state_codec import parse_state, MIN_PACKET_SIZE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# drop_oldest: evict the oldest queued packet to make room (default)
+# drop_newest: refuse the incoming packet when full
+# latest:      keep only the most recent packet, discard anything queued
+DROP_POLICIES = ('drop_oldest', 'drop_newest', 'latest')
+
+
+@dataclass
+class StatePacket:
+    """One decoded state packet as delivered to subscribers"""
+    state: dict
+    raw: bytes
+    source: Tuple[str, int]
+    received_at: float
+
+
+class Subscription:
+    """Bounded per-consumer queue with its own drop policy
+
+    The hub only ever calls offer(), which never blocks. Each subscription
+    drains its queue on its own thread, so a slow consumer only loses its
+    own packets.
+    """
+
+    def __init__(self, name: str, callback: Callable[[StatePacket], None],
+                 maxsize: int = 256, drop_policy: str = 'drop_oldest'):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.name = name
+        self.callback = callback
+        self.maxsize = max(1, maxsize)
+        self.drop_policy = drop_policy
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stats = {
+            'offered': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'errors': 0,
+            'max_depth': 0
+        }
+
+    def start(self):
+        """Start the consumer thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._consume_loop, name=f"hub-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the consumer thread once it has delivered what is queued
+
+        Packets it cannot deliver within the join timeout are dropped.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+        with self.cond:
+            self.stats['dropped'] += len(self.queue)
+            self.queue.clear()
+
+    def offer(self, packet: StatePacket):
+        """Enqueue a packet according to the drop policy"""
+        with self.cond:
+            self.stats['offered'] += 1
+
+            if not self.running:
+                self.stats['dropped'] += 1
+                return
+            if self.drop_policy == 'latest':
+                self.stats['dropped'] += len(self.queue)
+                self.queue.clear()
+            elif len(self.queue) >= self.maxsize:
+                self.stats['dropped'] += 1
+                if self.drop_policy == 'drop_newest':
+                    return
+                self.queue.popleft()
+
+            self.queue.append(packet)
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self.queue))
+            self.cond.notify()
+
+    def _consume_loop(self):
+        """Deliver queued packets to the callback"""
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.queue:
+                    return  # stopped and drained
+                packet = self.queue.popleft()
+
+            try:
+                self.callback(packet)
+                self.stats['delivered'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Subscriber {self.name} failed: {e}")
+
+
+class _HubProtocol(asyncio.DatagramProtocol):
+    """asyncio protocol that hands every datagram to the hub"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        self.hub._dispatch(data, addr)
+
+    def error_received(self, exc):
+        logger.error(f"UDP error: {exc}")
+
+
+class StateIngestHub:
+    """Single owner of the state port with fan-out to subscribers"""
+
+    def __init__(self, host='0.0.0.0', port=31337, rcvbuf: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.rcvbuf = rcvbuf
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.loop = None
+        self.transport = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.stats = {
+            'packets_received': 0,
+            'packets_invalid': 0,
+            'last_tick': 0,
+            'start_time': time.time()
+        }
+
+    def subscribe(self, name: str, callback: Callable[[StatePacket], None],
+                  maxsize: int = 256, drop_policy: str = 'drop_oldest') -> Subscription:
+        """Register a consumer with its own bounded queue"""
+        if name in self.subscriptions:
+            raise ValueError(f"Subscriber already registered: {name}")
+
+        subscription = Subscription(name, callback, maxsize, drop_policy)
+        subscription.start()
+        self.subscriptions[name] = subscription
+        logger.info(f"Subscriber {name} registered (maxsize={maxsize}, policy={drop_policy})")
+        return subscription
+
+    def unsubscribe(self, name: str):
+        """Remove a consumer"""
+        subscription = self.subscriptions.pop(name, None)
+        if subscription:
+            subscription.stop()
+
+    def start(self):
+        """Bind the port and start the event loop thread"""
+        self.thread = threading.Thread(target=self._run_loop, name="state-hub", daemon=True)
+        self.thread.start()
+        self.ready.wait(timeout=5)
+
+        if not self.transport:
+            raise RuntimeError(f"State hub failed to bind UDP port {self.port}")
+
+        logger.info(f"State hub listening on UDP {self.host}:{self.port}")
+
+    def stop(self):
+        """Close the socket and stop all subscribers"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+        for name in list(self.subscriptions):
+            self.unsubscribe(name)
+
+    def _make_socket(self):
+        """Create the bound UDP socket"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        sock.bind((self.host, self.port))
+        return sock
+
+    def _run_loop(self):
+        """Event loop thread body"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.transport, _ = self.loop.run_until_complete(
+                self.loop.create_datagram_endpoint(
+                    lambda: _HubProtocol(self),
+                    sock=self._make_socket()
+                )
+            )
+        except Exception as e:
+            logger.error(f"State hub bind failed: {e}")
+            self.ready.set()
+            return
+
+        self.ready.set()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            self.transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def _dispatch(self, data: bytes, addr):
+        """Decode once, then offer to every subscriber"""
+        received_at = time.time()
+        self.stats['packets_received'] += 1
+
+        if len(data) < MIN_PACKET_SIZE:
+            self.stats['packets_invalid'] += 1
+            return
+
+        try:
+            state = parse_state(data)
+        except ValueError:
+            self.stats['packets_invalid'] += 1
+            return
+
+        self.stats['last_tick'] = state['tick']
+        packet = StatePacket(state, data, addr, received_at)
+
+        for subscription in list(self.subscriptions.values()):
+            subscription.offer(packet)
+
+    def get_stats(self) -> dict:
+        """Hub and per-subscriber counters"""
+        return {
+            'hub': dict(self.stats),
+            'subscribers': {
+                name: dict(sub.stats, depth=len(sub.queue), policy=sub.drop_policy)
+                for name, sub in self.subscriptions.items()
+            }
+        }
+
+
+def main():
+    """Run the hub with the selected consumers attached"""
+    import argparse
+    import sys
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description='DOOM State Ingest Hub')
+    parser.add_argument('--port', type=int, default=31337, help='UDP state port')
+    parser.add_argument('--db', default='doom_state.db', help='SQLite database path')
+    parser.add_argument('--no-sqlite', action='store_true', help='Do not record to SQLite')
+    parser.add_argument('--cobol-bridge', action='store_true', help='Attach COBOLBridge')
+    parser.add_argument('--doom-bridge', action='store_true', help='Attach DoomCOBOLBridge')
+    parser.add_argument('--web', action='store_true', help='Serve the web UI from this process')
+
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parent.parent
+    sys.path.insert(0, str(root))
+
+    hub = StateIngestHub(port=args.port)
+    hub.start()
+
+    consumers = []
+
+    if not args.no_sqlite:
+        from doom_state_sqlite import DoomStateSQLite
+        capture = DoomStateSQLite(args.db, args.port)
+        capture.start_capture(hub=hub)
+        consumers.append(capture.stop_capture)
+
+    if args.cobol_bridge:
+        from bridge.state_receiver import COBOLBridge
+        cobol_bridge = COBOLBridge(hub=hub)
+        cobol_bridge.start()
+        consumers.append(cobol_bridge.stop)
+
+    if args.doom_bridge:
+        from bridge.integration_bridge import DoomCOBOLBridge
+        doom_bridge = DoomCOBOLBridge(hub=hub)
+        doom_bridge.start()
+        consumers.append(doom_bridge.stop)
+
+    if args.web:
+        sys.path.insert(0, str(root / 'web-ui'))
+        import app as web_app
+        web_app.attach_state_hub(hub)
+        threading.Thread(
+            target=web_app.app.run,
+            kwargs={'host': '0.0.0.0', 'port': 8080, 'debug': False},
+            daemon=True
+        ).start()
+
+    try:
+        while True:
+            time.sleep(10)
+            stats = hub.get_stats()
+            logger.info(f"Hub - Packets: {stats['hub']['packets_received']}, "
+                        f"Invalid: {stats['hub']['packets_invalid']}, "
+                        f"Last tick: {stats['hub']['last_tick']}")
+            for name, sub in stats['subscribers'].items():
+                logger.info(f"  {name}: delivered={sub['delivered']} dropped={sub['dropped']} "
+                            f"depth={sub['depth']} policy={sub['policy']}")
+
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+        for stop in consumers:
+            stop()
+        hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Latest-wins state mailbox
+Decouples state receipt from AI decisions: receivers post, deciders take
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Hashable, Optional, Tuple
+
+# Receive-to-decision latency samples kept for percentile reporting
+LATENCY_SAMPLES = 65536
+
+
+class LatestStateMailbox:
+    """Holds only the newest undecided state per DOOM instance
+
+    post() never blocks and overwrites whatever is waiting for that
+    instance, so a slow decision loop always acts on fresh state instead
+    of working through a backlog. Instances are served in the order they
+    became pending so one chatty instance cannot starve the others.
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()  # key -> (state, tick, posted_at)
+        self.newest_tick = {}         # key -> newest tick ever posted
+        self.cond = threading.Condition()
+        self.decision_latency_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {
+            'posted': 0,
+            'superseded': 0,
+            'taken': 0,
+            'decisions': 0,
+            'staleness_last': 0,
+            'staleness_max': 0,
+            'staleness_avg': 0.0,
+            'wait_ms_last': 0.0
+        }
+
+    def post(self, key: Hashable, state: Any, tick: int):
+        """Offer a new state for an instance, replacing any undecided one"""
+        with self.cond:
+            self.stats['posted'] += 1
+
+            if key in self.pending:
+                self.stats['superseded'] += 1
+                del self.pending[key]
+
+            self.pending[key] = (state, tick, time.time())
+            self.newest_tick[key] = max(tick, self.newest_tick.get(key, tick))
+            self.cond.notify()
+
+    def take(self, timeout: Optional[float] = None) -> Optional[Tuple[Hashable, Any, int]]:
+        """Wait for and remove the next pending state as (key, state, tick)"""
+        with self.cond:
+            if not self.pending:
+                self.cond.wait(timeout)
+                if not self.pending:
+                    return None
+
+            key, (state, tick, posted_at) = self.pending.popitem(last=False)
+            self.stats['taken'] += 1
+            self.stats['wait_ms_last'] = (time.time() - posted_at) * 1000.0
+            return key, state, tick
+
+    def record_decision(self, key: Hashable, tick: int, received_at: Optional[float] = None) -> int:
+        """Record how many ticks behind the instance a finished decision is
+
+        If the state's receive time is known, the receive-to-decision
+        latency is sampled as well.
+        """
+        with self.cond:
+            staleness = max(0, self.newest_tick.get(key, tick) - tick)
+            if received_at is not None:
+                self.decision_latency_ms.append((time.time() - received_at) * 1000.0)
+
+            stats = self.stats
+            stats['decisions'] += 1
+            stats['staleness_last'] = staleness
+            stats['staleness_max'] = max(stats['staleness_max'], staleness)
+            stats['staleness_avg'] += (staleness - stats['staleness_avg']) / stats['decisions']
+
+            return staleness
+
+    def get_metrics(self) -> dict:
+        """Snapshot of mailbox counters"""
+        with self.cond:
+            metrics = dict(self.stats)
+            metrics['pending'] = len(self.pending)
+            metrics['instances'] = len(self.newest_tick)
+            return metrics
@@ -46,28 +46,27 @@ class CompleteStateMonitor:
         
     def _file_writer_loop(self):
         """Write latest state to file in COBOL format"""
+        notifier = self.sqlite_capture.notifier
+        last_sequence = 0
+        
         while self.running:
             try:
-                # Get latest state from SQLite
-                states = self.sqlite_capture.query_recent_states(1)
-                if states:
-                    # Get COBOL format
-                    cursor = self.sqlite_capture.conn.cursor()
-                    cursor.execute('''
-                        SELECT record_data 
-                        FROM cobol_state 
-                        WHERE state_id = (SELECT MAX(id) FROM game_state)
-                        ORDER BY id
-                    ''')
-                    
-                    records = cursor.fetchall()
-                    if records:
-                        with open(self.state_file, 'w') as f:
-                            for record in records:
-                                f.write(record[0] + '\n')
-                                
-                time.sleep(0.1)  # 10Hz
+                # Sleep until the writer commits
+                commit = notifier.wait_for(last_sequence, timeout=0.5)
+                if commit is None:
+                    continue
+                last_sequence = commit[0]
+                
+                # COBOL format from latest_state, which also moves on when a
+                # commit only extends an idle run (--compact-idle)
+                state = self.sqlite_capture.get_latest_state()
                 
+                if state:
+                    records = self.sqlite_capture.gamestat.latest_records(state)
+                    with open(self.state_file, 'w') as f:
+                        for _, record in records:
+                            f.write(record.rstrip() + '\n')
+                            
             except Exception as e:
                 logger.error(f"File writer error: {e}")
                 time.sleep(1)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Commit notifications for DOOM state capture
+Wakes readers when the writer commits new states instead of having them poll
+"""
+
+import errno
+import hashlib
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cross-process broadcast needs Unix datagram sockets; without them
+# subscribers fall back to their poll timeout
+UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+# (commit sequence, newest committed state id); the sequence advances
+# on every commit, including ones that only extend idle runs
+NOTIFY_STRUCT = struct.Struct('<QQ')
+
+# Seconds between rescans of the subscriber directory
+SUBSCRIBER_REFRESH = 1.0
+
+
+def channel_dir(db_path: str) -> str:
+    """Directory holding one socket per subscriber of a database
+
+    Lives in the temp directory, keyed by the database path, so socket
+    paths stay short and nothing is created next to the database.
+    """
+    digest = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"doom_state_notify-{digest}")
+
+
+class CommitNotifier:
+    """Publishes each commit as (sequence, newest committed state id)
+
+    In-process readers block in wait_for() on a condition variable;
+    other processes get a datagram on their StateSubscriber socket.
+    publish() is called by the writer thread once per committed batch.
+    A batch that only extends idle runs (compact_idle) adds no state id,
+    so readers wait on the sequence rather than the id.
+    """
+
+    def __init__(self, db_path: str):
+        self.channel = channel_dir(db_path)
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.state_id = 0
+        self.socket = None
+        self.subscribers = []
+        self.scanned_at = 0.0
+        self.stats = {
+            'published': 0,
+            'sent': 0,
+            'stale_removed': 0
+        }
+        if UNIX_SOCKETS:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.socket.setblocking(False)
+
+    def publish(self, state_id: int):
+        """Announce a commit; every state up to state_id is committed"""
+        with self.condition:
+            self.sequence += 1
+            self.state_id = state_id
+            sequence = self.sequence
+            self.condition.notify_all()
+        self.stats['published'] += 1
+
+        if self.socket:
+            self._broadcast(sequence, state_id)
+
+    def wait_for(self, after_sequence: int, timeout: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """(sequence, newest state id) once a commit past after_sequence is published
+
+        None on timeout.
+        """
+        with self.condition:
+            if self.condition.wait_for(lambda: self.sequence > after_sequence, timeout):
+                return self.sequence, self.state_id
+        return None
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def _broadcast(self, sequence: int, state_id: int):
+        """Send the commit to every subscriber socket, dropping dead ones"""
+        now = time.monotonic()
+        if now - self.scanned_at >= SUBSCRIBER_REFRESH:
+            self.scanned_at = now
+            try:
+                self.subscribers = [
+                    os.path.join(self.channel, name)
+                    for name in os.listdir(self.channel) if name.endswith('.sock')
+                ]
+            except FileNotFoundError:
+                self.subscribers = []
+
+        message = NOTIFY_STRUCT.pack(sequence, state_id)
+        for path in list(self.subscribers):
+            try:
+                self.socket.sendto(message, path)
+                self.stats['sent'] += 1
+            except BlockingIOError:
+                # Subscriber has unread notifications; it will catch up
+                pass
+            except OSError as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # Subscriber exited without cleaning up
+                    self.subscribers.remove(path)
+                    try:
+                        os.unlink(path)
+                        self.stats['stale_removed'] += 1
+                    except FileNotFoundError:
+                        pass
+                else:
+                    logger.debug(f"Notify {path} failed: {e}")
+
+
+class StateSubscriber:
+    """Receives commit notifications for a database from another process"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.path = None
+        self.socket = None
+        if not UNIX_SOCKETS:
+            return
+
+        channel = channel_dir(db_path)
+        os.makedirs(channel, exist_ok=True)
+        self.path = os.path.join(channel, f"{os.getpid()}-{id(self):x}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """Block until a commit is announced; newest (sequence, state id), or None on timeout
+
+        Notifications that queued up meanwhile are drained, so a slow
+        reader wakes once with the newest commit rather than once per batch.
+        """
+        if not self.socket:
+            time.sleep(timeout or 0)
+            return None
+
+        self.socket.settimeout(timeout)
+        try:
+            data = self.socket.recv(NOTIFY_STRUCT.size)
+        except socket.timeout:
+            return None
+        newest = NOTIFY_STRUCT.unpack(data)
+
+        self.socket.setblocking(False)
+        try:
+            while True:
+                newest = NOTIFY_STRUCT.unpack(self.socket.recv(NOTIFY_STRUCT.size))
+        except BlockingIOError:
+            pass
+
+        return newest
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
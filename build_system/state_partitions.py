@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Time-partitioned storage for DOOM state capture
+Per-state rows go into one database file per time window, so retention
+drops whole files instead of running DELETE + VACUUM on doom_state.db
+"""
+
+import calendar
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from state_compaction import EXPANDED_VIEW
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default compile-time limit on attached databases
+MAX_ATTACHED = 10
+
+# Partitions the writer keeps attached (current window plus late packets)
+WRITER_ATTACHED = 2
+
+PARTITIONED_TABLES = ('game_state', 'enemies', 'cobol_state')
+
+PARTITIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS partitions (
+        key TEXT PRIMARY KEY,
+        path TEXT,
+        start_time REAL,
+        end_time REAL,
+        min_id INTEGER,
+        max_id INTEGER,
+        rows INTEGER DEFAULT 0,
+        raw_pruned INTEGER DEFAULT 0,
+        rolled_up INTEGER DEFAULT 0
+    )
+'''
+
+# Per-second downsample of game_state, kept in the main database after
+# the partition holding the full-rate rows is dropped
+ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS state_rollup (
+        session_id INTEGER NOT NULL,
+        second INTEGER,
+        samples INTEGER,
+        tick_first INTEGER,
+        tick_last INTEGER,
+        level INTEGER,
+        health_min INTEGER,
+        health_max INTEGER,
+        health_avg REAL,
+        armor_avg REAL,
+        x_avg REAL,
+        y_avg REAL,
+        enemy_count_max INTEGER,
+        kills_max INTEGER,
+        items_max INTEGER,
+        secrets_max INTEGER,
+        PRIMARY KEY (session_id, second)
+    )
+'''
+
+# Run-length rows (state_compaction) count once per state they stand for,
+# in the second the run starts. States without a session roll up under
+# session 0, since NULL keys never conflict and would insert duplicates.
+ROLLUP_INSERT = '''
+    INSERT OR REPLACE INTO main.state_rollup
+    SELECT COALESCE(session_id, 0), CAST(timestamp AS INTEGER),
+           SUM({weight}), MIN(tick), MAX({tick_last}), MAX(level),
+           MIN(health), MAX(health),
+           CAST(SUM(health * {weight}) AS REAL) / SUM({weight}),
+           CAST(SUM(armor * {weight}) AS REAL) / SUM({weight}),
+           CAST(SUM(x * {weight}) AS REAL) / SUM({weight}),
+           CAST(SUM(y * {weight}) AS REAL) / SUM({weight}),
+           MAX(enemy_count), MAX(kills), MAX(items), MAX(secrets)
+    FROM {schema}.game_state
+    GROUP BY COALESCE(session_id, 0), CAST(timestamp AS INTEGER)
+'''
+
+
+def ensure_partition_tables(cursor):
+    """Partition registry and rollup tables in the main database"""
+    cursor.execute(PARTITIONS_TABLE)
+    cursor.execute(ROLLUP_TABLE)
+    # Older rollups keyed states without a session by NULL; fold their
+    # duplicates into session 0
+    cursor.execute('UPDATE OR REPLACE state_rollup SET session_id = 0 WHERE session_id IS NULL')
+
+
+class PartitionManager:
+    """Maps receive timestamps to partition files and maintains them
+
+    A partition covers `partition_seconds` of wall-clock time and lives
+    next to the main database as <base>.<YYYYmmddTHHMM><ext>. The main
+    database keeps sessions, the partition registry and state_rollup.
+    `create_tables` builds the per-state schema in a new partition.
+
+    attach() runs on the writer thread and maintain() on another one;
+    `lock` guards the partitions known to exist and those attached to
+    the writer connection. A partition due to be dropped while still
+    attached is detached by the writer's next attach() and deleted by
+    the maintenance run after that.
+
+    The capture claim()s an advisory lock on <db>-partitions.lock for as
+    long as it writes. Maintenance in any other process (the CLI below)
+    cannot see what that writer has attached, so it only deletes
+    partition files when it can take the lock itself.
+    """
+
+    def __init__(self, db_path: str, create_tables: Callable[[sqlite3.Cursor], None],
+                 partition_seconds: int = 3600, journal_mode: str = 'WAL'):
+        self.db_path = db_path
+        self.create_tables = create_tables
+        self.partition_seconds = partition_seconds
+        self.journal_mode = journal_mode
+        self.lock = threading.Lock()
+        self.known = set()
+        self.attached = set()  # keys attached to the writer connection
+        self.retired = set()   # keys maintenance is waiting to drop
+        self.lock_path = f"{db_path}-partitions.lock"
+        self.owner = None      # lock file handle while this process owns the partitions
+
+    def key_for(self, timestamp: float) -> str:
+        """Partition key for a receive timestamp (UTC window start)"""
+        start = int(timestamp // self.partition_seconds) * self.partition_seconds
+        return time.strftime('%Y%m%dT%H%M', time.gmtime(start))
+
+    def window_for(self, key: str):
+        """(start, end) epoch seconds covered by a partition key"""
+        start = calendar.timegm(time.strptime(key, '%Y%m%dT%H%M'))
+        return start, start + self.partition_seconds
+
+    def path_for(self, key: str) -> str:
+        """Partition database path for a key"""
+        base, ext = os.path.splitext(self.db_path)
+        return f"{base}.{key}{ext or '.db'}"
+
+    @staticmethod
+    def schema_for(key: str) -> str:
+        """Schema name a partition is attached under"""
+        return f"p{key.replace('T', '_')}"
+
+    @staticmethod
+    def key_of(schema: str) -> str:
+        """Partition key of an attached schema name"""
+        return schema[1:].replace('_', 'T')
+
+    # Ownership
+
+    def claim(self) -> bool:
+        """Take the partition owner lock; False if another process holds it
+
+        Without fcntl there is no cross-process lock: the claim always
+        succeeds and only the in-process attach guard applies.
+        """
+        if self.owner is not None:
+            return True
+        if not FCNTL_AVAILABLE:
+            self.owner = True
+            return True
+
+        handle = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.owner = handle
+        return True
+
+    def release(self):
+        """Give up the owner lock taken by claim()"""
+        if self.owner is not None and self.owner is not True:
+            self.owner.close()
+        self.owner = None
+
+    # Writer side
+
+    def attach(self, conn: sqlite3.Connection, keys) -> Dict[str, str]:
+        """Attach partitions to the writer connection, creating them if needed
+
+        Must be called outside a transaction. Partitions not in `keys` are
+        detached once more than WRITER_ATTACHED would be attached, and
+        partitions maintenance wants to drop are detached right away.
+        """
+        schemas = {key: self.schema_for(key) for key in keys}
+        with self.lock:
+            attached = {self.key_of(row[1]) for row in conn.execute('PRAGMA database_list')
+                        if self._is_partition(row[1])}
+            for key in sorted((self.retired & attached) - schemas.keys()):
+                conn.execute(f'DETACH DATABASE {self.schema_for(key)}')
+                attached.discard(key)
+            self.retired.clear()
+
+            missing = [key for key in schemas if key not in attached]
+            stale = sorted(attached - schemas.keys())
+            while missing and stale and len(attached) + len(missing) > max(WRITER_ATTACHED, len(schemas)):
+                key = stale.pop(0)
+                conn.execute(f'DETACH DATABASE {self.schema_for(key)}')
+                attached.discard(key)
+
+            for key in missing:
+                path = self.path_for(key)
+                if key not in self.known:
+                    self._create(path)
+                    self.known.add(key)
+                conn.execute(f'ATTACH DATABASE ? AS {schemas[key]}', (path,))
+                attached.add(key)
+
+            self.attached = attached
+
+        return schemas
+
+    def detach_all(self, conn: sqlite3.Connection):
+        """Detach every partition before the writer closes its connection"""
+        with self.lock:
+            for row in conn.execute('PRAGMA database_list').fetchall():
+                if self._is_partition(row[1]):
+                    conn.execute(f'DETACH DATABASE {row[1]}')
+            self.attached = set()
+
+    @staticmethod
+    def _is_partition(schema: str) -> bool:
+        return schema.startswith('p') and schema[1:2].isdigit()
+
+    def _create(self, path: str):
+        """Build the per-state schema in a partition file"""
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
+            self.create_tables(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+
+    def record_batch(self, conn: sqlite3.Connection, key: str, min_id: int, max_id: int, rows: int):
+        """Update the registry row for a partition (inside the batch transaction)"""
+        start, end = self.window_for(key)
+        conn.execute('''
+            INSERT INTO main.partitions (key, path, start_time, end_time, min_id, max_id, rows)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                min_id = MIN(min_id, excluded.min_id),
+                max_id = MAX(max_id, excluded.max_id),
+                rows = rows + excluded.rows
+        ''', (key, self.path_for(key), start, end, min_id, max_id, rows))
+
+    @staticmethod
+    def max_id(conn: sqlite3.Connection) -> int:
+        """Highest state id handed out to any partition"""
+        row = conn.execute('SELECT COALESCE(MAX(max_id), 0) FROM main.partitions').fetchone()
+        return row[0]
+
+    # Maintenance side
+
+    def list_partitions(self, conn: sqlite3.Connection) -> List[Dict]:
+        """Registry rows, oldest first"""
+        cursor = conn.execute('SELECT * FROM partitions ORDER BY key')
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def maintain(self, raw_retention: Optional[float] = None, rollup_after: Optional[float] = None,
+                 retention: Optional[float] = None, now: Optional[float] = None) -> Dict[str, int]:
+        """Apply the retention policy to closed partitions
+
+        Ages are seconds since a partition's window ended:
+        - raw_retention: NULL out raw_data and VACUUM that partition file
+        - rollup_after:  downsample to per-second rows in state_rollup
+        - retention:     roll up if needed, then delete the partition file
+        Every step touches one partition file at a time; the main
+        database only sees registry updates and rollup inserts. Files are
+        only deleted by the process owning the partitions (see claim());
+        while a capture elsewhere owns them, partitions due for deletion
+        are rolled up and left to its own maintenance.
+        """
+        now = time.time() if now is None else now
+        done = {'raw_pruned': 0, 'rolled_up': 0, 'dropped': 0}
+
+        owned = self.owner is not None
+        can_drop = retention is not None and self.claim()
+        if retention is not None and not can_drop:
+            logger.warning(f"Partitions of {self.db_path} are owned by a running capture; "
+                           f"leaving deletion to its retention policy")
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for part in self.list_partitions(conn):
+                age = now - part['end_time']
+                if age <= 0:
+                    continue  # still being written
+
+                if retention is not None and age >= retention:
+                    if not part['rolled_up']:
+                        self._rollup(conn, part)
+                    if can_drop and self._drop(conn, part):
+                        done['dropped'] += 1
+                    continue
+
+                if rollup_after is not None and age >= rollup_after and not part['rolled_up']:
+                    self._rollup(conn, part)
+                    done['rolled_up'] += 1
+
+                if raw_retention is not None and age >= raw_retention and not part['raw_pruned']:
+                    self._prune_raw(conn, part)
+                    done['raw_pruned'] += 1
+        finally:
+            conn.close()
+            if not owned:
+                self.release()
+
+        if any(done.values()):
+            logger.info(f"Partition maintenance: {done}")
+        return done
+
+    def _rollup(self, conn: sqlite3.Connection, part: Dict):
+        """Per-second aggregates for one partition"""
+        if os.path.exists(part['path']):
+            conn.execute('ATTACH DATABASE ? AS rollup_src', (part['path'],))
+            try:
+                columns = {row[1] for row in conn.execute('PRAGMA rollup_src.table_info(game_state)')}
+                compacted = 'run_length' in columns
+                conn.execute(ROLLUP_INSERT.format(
+                    schema='rollup_src',
+                    weight='COALESCE(run_length, 1)' if compacted else '1',
+                    tick_last='COALESCE(tick_last, tick)' if compacted else 'tick'
+                ))
+                conn.execute('UPDATE partitions SET rolled_up = 1 WHERE key = ?', (part['key'],))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute('DETACH DATABASE rollup_src')
+        else:
+            conn.execute('UPDATE partitions SET rolled_up = 1 WHERE key = ?', (part['key'],))
+            conn.commit()
+
+    def _prune_raw(self, conn: sqlite3.Connection, part: Dict):
+        """Drop raw packets from one partition and shrink its file"""
+        if os.path.exists(part['path']):
+            source = sqlite3.connect(part['path'], timeout=30)
+            try:
+                source.execute('UPDATE game_state SET raw_data = NULL')
+                source.commit()
+                source.execute('VACUUM')
+            finally:
+                source.close()
+
+        conn.execute('UPDATE partitions SET raw_pruned = 1 WHERE key = ?', (part['key'],))
+        conn.commit()
+
+    def _drop(self, conn: sqlite3.Connection, part: Dict) -> bool:
+        """Delete one partition file and its registry row
+
+        False if the writer still has the partition attached; it is
+        detached before the writer's next batch and dropped next time.
+        """
+        with self.lock:
+            if part['key'] in self.attached:
+                self.retired.add(part['key'])
+                return False
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(part['path'] + suffix)
+                except FileNotFoundError:
+                    pass
+            self.known.discard(part['key'])
+
+        conn.execute('DELETE FROM partitions WHERE key = ?', (part['key'],))
+        conn.commit()
+        return True
+
+
+class PartitionedStateView:
+    """Read view over the main database plus its newest partitions
+
+    Like the shard MergedStateView: partitions are attached read-only and
+    exposed through TEMP views named after the original tables, so
+    existing queries work unchanged. Only the newest `recent` partitions
+    are attached; older ones are read individually or via state_rollup.
+    """
+
+    def __init__(self, db_path: str, recent: int = MAX_ATTACHED - 1):
+        self.db_path = db_path
+        self.recent = min(recent, MAX_ATTACHED - 1)
+        self.conn = sqlite3.connect(
+            f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False
+        )
+        self.keys = []
+        self.refresh()
+
+    def refresh(self):
+        """Re-attach if partitions were added or dropped since the last call"""
+        rows = self.conn.execute(
+            'SELECT key, path FROM partitions ORDER BY key DESC LIMIT ?', (self.recent,)
+        ).fetchall()
+        rows = [(key, path) for key, path in reversed(rows) if os.path.exists(path)]
+        keys = [key for key, _ in rows]
+        if keys == self.keys:
+            return
+
+        for table in (*PARTITIONED_TABLES, 'game_state_expanded'):
+            self.conn.execute(f'DROP VIEW IF EXISTS temp.{table}')
+        for schema in self._attached():
+            self.conn.execute(f'DETACH DATABASE {schema}')
+
+        for key, path in rows:
+            uri = f"file:{os.path.abspath(path)}?mode=ro"
+            self.conn.execute(f"ATTACH DATABASE ? AS {PartitionManager.schema_for(key)}", (uri,))
+
+        self.keys = keys
+        self._create_views([PartitionManager.schema_for(key) for key in keys])
+
+    def _attached(self) -> List[str]:
+        return [row[1] for row in self.conn.execute('PRAGMA database_list') if PartitionManager._is_partition(row[1])]
+
+    def _create_views(self, schemas: Sequence[str]):
+        """One UNION ALL view per per-state table, main database first"""
+        for table in PARTITIONED_TABLES:
+            # Column order differs between migrated and fresh databases, and
+            # partitions written by older versions may lack newer columns
+            columns = [row[1] for row in self.conn.execute(f'PRAGMA main.table_info({table})')]
+            parts = []
+            for schema in ['main', *schemas]:
+                present = {row[1] for row in self.conn.execute(f'PRAGMA {schema}.table_info({table})')}
+                select = ', '.join(c if c in present else f'NULL AS {c}' for c in columns)
+                parts.append(f"SELECT {select} FROM {schema}.{table}")
+            self.conn.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(parts)}")
+        self.conn.execute(EXPANDED_VIEW.replace('CREATE VIEW', 'CREATE TEMP VIEW', 1))
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    """Run partition maintenance"""
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='DOOM state partition maintenance')
+    parser.add_argument('--db', default='doom_state.db', help='Main SQLite database path')
+    parser.add_argument('--raw-retention-hours', type=float, help='Drop raw packets after N hours')
+    parser.add_argument('--rollup-after-hours', type=float, help='Roll up to per-second after N hours')
+    parser.add_argument('--retention-hours', type=float, help='Delete partitions after N hours')
+    parser.add_argument('--list', action='store_true', help='List partitions and exit')
+
+    args = parser.parse_args()
+
+    def hours(value):
+        return value * 3600 if value is not None else None
+
+    if args.retention_hours is not None and not FCNTL_AVAILABLE:
+        # No way to tell whether a running capture has the files attached
+        parser.error("--retention-hours needs advisory file locks; set retention on the capture instead")
+
+    manager = PartitionManager(args.db, create_tables=lambda cursor: None)
+
+    if args.list:
+        conn = sqlite3.connect(args.db)
+        for part in manager.list_partitions(conn):
+            size = os.path.getsize(part['path']) if os.path.exists(part['path']) else 0
+            print(f"{part['key']}  {part['rows']:>9} rows  {size / 1e6:8.1f} MB  "
+                  f"raw_pruned={part['raw_pruned']} rolled_up={part['rolled_up']}")
+        conn.close()
+        return
+
+    manager.maintain(
+        raw_retention=hours(args.raw_retention_hours),
+        rollup_after=hours(args.rollup_after_hours),
+        retention=hours(args.retention_hours)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Group-commit writer stage for DOOM state capture
+Batches parsed states off the receive thread and commits them together
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque, namedtuple
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Optional, Dict, Any, Iterator, List, Sequence, Tuple, Callable
+
+from doom_state_codec import HEADER_STRUCT, enemy_block
+from latest_state import LATEST_STATE_COLUMNS, LATEST_STATE_UPSERT
+
+logger = logging.getLogger(__name__)
+
+# Receive-to-commit latency samples kept for percentile reporting
+LATENCY_SAMPLES = 65536
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# game_state columns in insert order
+STATE_COLUMNS = (
+    'id', 'session_id', 'timestamp', 'tick', 'level', 'health', 'armor',
+    'x', 'y', 'z', 'angle', 'momx', 'momy', 'weapon',
+    'ammo_bullets', 'ammo_shells', 'ammo_cells', 'ammo_rockets',
+    'kills', 'items', 'secrets', 'enemy_count', 'raw_data', 'enemy_data',
+    'tick_last', 'timestamp_last', 'run_length'
+)
+
+# One game_state row as the writer inserts it and hands it to the
+# aggregator and spatial index; columns not read default to None
+StateRow = namedtuple('StateRow', STATE_COLUMNS, defaults=(None,) * len(STATE_COLUMNS))
+
+GAME_STATE_INSERT = f'''
+    INSERT INTO game_state ({', '.join(STATE_COLUMNS)})
+    VALUES ({', '.join('?' * len(STATE_COLUMNS))})
+'''
+
+# latest_state columns between state_id and enemy_data, taken from a StateRow
+_latest_values = attrgetter(*LATEST_STATE_COLUMNS[2:-1])
+
+# Extends a run whose head was committed in an earlier batch
+RUN_UPDATE = '''
+    UPDATE game_state SET tick_last = ?, timestamp_last = ?, run_length = ? WHERE id = ?
+'''
+
+ENEMY_INSERT = '''
+    INSERT INTO enemies (
+        state_id, enemy_index, type, health, x, y, distance
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+COBOL_INSERT = '''
+    INSERT INTO cobol_state (state_id, record_type, record_data) VALUES (?, ?, ?)
+'''
+
+
+def read_state_rows(source: sqlite3.Connection, columns: Sequence[str],
+                    chunk: int = 10000) -> Iterator[List[StateRow]]:
+    """Batches of StateRows from a game_state table, in id order
+
+    Only `columns` are read; the others, and any the table predates,
+    are None.
+    """
+    present = {row[1] for row in source.execute('PRAGMA table_info(game_state)')}
+    selected = ', '.join(c if c in columns and c in present else 'NULL' for c in STATE_COLUMNS)
+    rows = source.execute(f'SELECT {selected} FROM game_state ORDER BY id')
+    while True:
+        batch = rows.fetchmany(chunk)
+        if not batch:
+            break
+        yield [StateRow._make(row) for row in batch]
+
+
+@dataclass
+class _Run:
+    """A compact_idle run: repeats of `head` folded into its tick range"""
+    body: bytes                   # packet body every state of the run shares
+    head: StateRow                # the head row as first built
+    partition: Optional[str]      # partition key the head was written to
+    tick_last: int
+    length: int = 1
+    index: Optional[int] = None   # head's position in the current batch, if there
+
+
+def apply_pragmas(conn: sqlite3.Connection, journal_mode: str = 'WAL',
+                  synchronous: str = 'NORMAL'):
+    """Apply journal and sync settings to a connection"""
+    journal_mode = journal_mode.upper()
+    synchronous = synchronous.upper()
+
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f"Unknown journal mode: {journal_mode}")
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown synchronous mode: {synchronous}")
+
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+
+
+class StateWriter:
+    """Dedicated writer thread fed by a bounded queue
+
+    Packets are committed every `batch_size` states or every `batch_ms`
+    milliseconds, whichever comes first. The receive thread only pays
+    for a queue put; all SQL and fsync cost lands on this thread.
+    With no `cobol_formatter`, no cobol_state rows are written; with
+    `packed_enemies`, enemies go into game_state.enemy_data instead of
+    one enemies row each. With `partitions`, per-state rows go to the
+    partition database for their receive time. Without `store_raw`,
+    raw_data is left NULL (the flight recorder keeps the packets); with
+    `blocking`, submit waits for queue space instead of dropping, for
+    producers that can safely fall behind. With a `notifier`
+    (CommitNotifier), every commit is published with the newest state id.
+    Each batch also upserts the newest state of every session it touches
+    into latest_state, in the same transaction, and is folded into the
+    analytics aggregates by `aggregator` (StateAggregator) and the R*Tree
+    tables by `spatial` (SpatialIndexer) when given. With `compact_idle`,
+    a state identical to the previous one of its session except for the
+    next tick extends that row's tick range (state_compaction) instead
+    of adding a row; aggregates still count every state.
+    """
+
+    def __init__(self, db_path: str, cobol_formatter: Optional[Callable[[Dict[str, Any], float], List[Tuple[str, str]]]],
+                 batch_size: int = 64, batch_ms: float = 50, queue_size: int = 4096,
+                 journal_mode: str = 'WAL', synchronous: str = 'NORMAL',
+                 packed_enemies: bool = False, partitions=None,
+                 store_raw: bool = True, blocking: bool = False, notifier=None,
+                 aggregator=None, spatial=None, compact_idle: bool = False):
+        self.db_path = db_path
+        self.packed_enemies = packed_enemies
+        self.store_raw = store_raw
+        self.blocking = blocking
+        self.notifier = notifier
+        self.aggregator = aggregator
+        self.spatial = spatial
+        self.compact_idle = compact_idle
+        self.runs = {}  # session -> _Run
+        self.partitions = partitions  # PartitionManager, or None to write to db_path
+        self.cobol_formatter = cobol_formatter
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.conn = None
+        self.thread = None
+        self.running = False
+        self.next_id = 0
+        self.session_id = None  # default for states submitted without one
+        self.commit_latency_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {
+            'packets_queued': 0,
+            'packets_dropped': 0,
+            'packets_written': 0,
+            'batches': 0,
+            'batch_size_last': 0,
+            'batch_size_max': 0,
+            'batch_size_avg': 0.0,
+            'commit_ms_last': 0.0,
+            'commit_ms_max': 0.0,
+            'commit_ms_avg': 0.0,
+            'states_folded': 0,
+            'write_errors': 0
+        }
+
+    def start(self):
+        """Start the writer thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+        logger.info(
+            f"State writer started (batch={self.batch_size}, {self.batch_ms}ms, "
+            f"journal={self.journal_mode}, synchronous={self.synchronous})"
+        )
+
+    def submit(self, state: Dict[str, Any], raw_data: bytes,
+               timestamp: Optional[float] = None, session_id: Optional[int] = None) -> bool:
+        """Queue a parsed state for writing, never blocking the caller unless `blocking`"""
+        if timestamp is None:
+            timestamp = time.time()
+        if session_id is None:
+            session_id = self.session_id
+
+        try:
+            self.queue.put((state, raw_data, timestamp, session_id), block=self.blocking)
+        except queue.Full:
+            self.stats['packets_dropped'] += 1
+            return False
+
+        self.stats['packets_queued'] += 1
+        return True
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        self.queue.join()
+
+    def stop(self):
+        """Drain the queue and stop the writer thread"""
+        if not self.thread:
+            return
+
+        self.running = False
+        self.thread.join()
+        self.thread = None
+
+    def _connect(self):
+        """Open the writer connection on the writer thread"""
+        self.conn = sqlite3.connect(self.db_path)
+        apply_pragmas(self.conn, self.journal_mode, self.synchronous)
+
+        # Writer owns id allocation so enemy/cobol rows can be batched
+        # without a lastrowid round trip per state
+        row = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM game_state').fetchone()
+        last_id = row[0]
+        if self.partitions:
+            last_id = max(last_id, self.partitions.max_id(self.conn))
+        self.next_id = last_id + 1
+
+    def _writer_loop(self):
+        """Collect batches and commit them"""
+        self._connect()
+
+        while self.running or not self.queue.empty():
+            try:
+                first = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.batch_ms / 1000.0
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"Batch write failed ({len(batch)} states): {e}")
+                self.conn.rollback()
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+        if self.partitions:
+            self.partitions.detach_all(self.conn)
+        self.conn.close()
+        self.conn = None
+
+    def _build_rows(self, batch):
+        """Turn queued states into executemany parameter lists"""
+        state_rows = []
+        enemy_rows = []
+        cobol_rows = []
+        latest = {}
+        run_updates = {}
+        # Every state, folded or not, for the aggregator
+        sampled_rows = [] if self.compact_idle else state_rows
+
+        for run in self.runs.values():
+            run.index = None
+
+        for state, raw_data, timestamp, session_id in batch:
+            enemies = state['enemies']
+            session_key = session_id or 0
+
+            if self.compact_idle:
+                body = raw_data[HEADER_STRUCT.size:]
+                partition = self.partitions.key_for(timestamp) if self.partitions else None
+                run = self.runs.get(session_key)
+                if (run and run.body == body and state['tick'] == run.tick_last + 1
+                        and run.partition == partition):
+                    row = self._extend_run(run, state['tick'], timestamp, session_id,
+                                           state_rows, run_updates)
+                    sampled_rows.append(row)
+                    latest[session_key] = (row, raw_data, len(enemies))
+                    continue
+
+            state_id = self.next_id
+            self.next_id += 1
+
+            enemy_data = enemy_block(raw_data, len(enemies)) if self.packed_enemies else None
+
+            state_rows.append(StateRow(
+                state_id, session_id, timestamp, state['tick'], state['level'],
+                state['health'], state['armor'],
+                state['x'], state['y'], state['z'], state['angle'],
+                state['momx'], state['momy'], state['weapon'],
+                state['ammo'][0], state['ammo'][1], state['ammo'][2], state['ammo'][3],
+                state['kills'], state['items'], state['secrets'],
+                state['enemy_count'], raw_data if self.store_raw else None, enemy_data
+            ))
+            latest[session_key] = (state_rows[-1], raw_data, len(enemies))
+            if self.compact_idle:
+                sampled_rows.append(state_rows[-1])
+                self.runs[session_key] = _Run(body, state_rows[-1], partition, state['tick'],
+                                              index=len(state_rows) - 1)
+
+            for i, enemy in enumerate(enemies if not self.packed_enemies else ()):
+                enemy_rows.append((
+                    state_id, i, enemy['type'], enemy['health'],
+                    enemy['x'], enemy['y'], enemy['distance']
+                ))
+
+            if self.cobol_formatter:
+                for record_type, record_data in self.cobol_formatter(state, timestamp):
+                    cobol_rows.append((state_id, record_type, record_data))
+
+        # latest_state always carries packed enemies, so a latest-state
+        # read never needs the enemies table
+        latest_rows = [
+            (session_key, row.id, *_latest_values(row),
+             row.enemy_data if row.enemy_data is not None else enemy_block(raw_data, count))
+            for session_key, (row, raw_data, count) in latest.items()
+        ]
+
+        return (state_rows, enemy_rows, cobol_rows, latest_rows,
+                [(*update, head) for head, update in run_updates.items()], sampled_rows)
+
+    def _extend_run(self, run, tick: int, timestamp: float, session_id,
+                    state_rows, run_updates):
+        """Fold a repeated state into its run; returns the row it stands for"""
+        run.tick_last = tick
+        run.length += 1
+        self.stats['states_folded'] += 1
+
+        if run.index is not None:
+            # Head is in this batch: insert it with the run columns set
+            state_rows[run.index] = state_rows[run.index]._replace(
+                tick_last=tick, timestamp_last=timestamp, run_length=run.length)
+        else:
+            run_updates[run.head.id] = (tick, timestamp, run.length, run.partition)
+
+        # The head's values at this tick and receive time
+        return run.head._replace(session_id=session_id, timestamp=timestamp, tick=tick)
+
+    def _write_batch(self, batch):
+        """Write one batch in a single transaction"""
+        first_id = self.next_id
+        try:
+            state_rows, enemy_rows, cobol_rows, latest_rows, run_updates, sampled_rows = self._build_rows(batch)
+        except Exception:
+            self.next_id = first_id
+            self.runs.clear()
+            raise
+
+        start = time.perf_counter()
+        try:
+            if self.partitions:
+                self._insert_partitioned(state_rows, enemy_rows, cobol_rows, run_updates)
+            else:
+                self._insert(None, state_rows, enemy_rows, cobol_rows,
+                             [update[:3] + update[4:] for update in run_updates])
+            self.conn.executemany(LATEST_STATE_UPSERT, latest_rows)
+            if self.aggregator:
+                self.aggregator.add_batch(self.conn, sampled_rows)
+            if self.spatial:
+                self.spatial.add_batch(self.conn, state_rows, enemy_rows)
+            self.conn.commit()
+        except Exception:
+            self.next_id = first_id
+            # Run heads from this batch were never written
+            self.runs.clear()
+            raise
+        commit_ms = (time.perf_counter() - start) * 1000.0
+
+        # Timestamps are receive times, so this covers queueing + batching + commit
+        committed_at = time.time()
+        self.commit_latency_ms.extend((committed_at - item[2]) * 1000.0 for item in batch)
+
+        self._record_batch(len(batch), commit_ms)
+
+        if self.notifier:
+            self.notifier.publish(self.next_id - 1)
+
+    def _insert(self, schema: Optional[str], state_rows, enemy_rows, cobol_rows, run_updates=()):
+        """executemany the rows of one batch into a schema (None for main)"""
+        prefix = f'INSERT INTO {schema}.' if schema else 'INSERT INTO '
+        cursor = self.conn.cursor()
+        if state_rows:
+            cursor.executemany(GAME_STATE_INSERT.replace('INSERT INTO ', prefix, 1), state_rows)
+        if enemy_rows:
+            cursor.executemany(ENEMY_INSERT.replace('INSERT INTO ', prefix, 1), enemy_rows)
+        if cobol_rows:
+            cursor.executemany(COBOL_INSERT.replace('INSERT INTO ', prefix, 1), cobol_rows)
+        if run_updates:
+            table = f'{schema}.game_state' if schema else 'game_state'
+            cursor.executemany(RUN_UPDATE.replace('game_state', table, 1), run_updates)
+
+    def _insert_partitioned(self, state_rows, enemy_rows, cobol_rows, run_updates=()):
+        """Split a batch by receive-time partition and insert each part"""
+        key_for_state = {row.id: self.partitions.key_for(row.timestamp) for row in state_rows}
+        keys = sorted(set(key_for_state.values()) | {update[3] for update in run_updates})
+
+        # ATTACH is not allowed inside a transaction, so attach before inserting
+        schemas = self.partitions.attach(self.conn, keys)
+
+        for key in keys:
+            states = [row for row in state_rows if key_for_state[row.id] == key]
+            enemies = [row for row in enemy_rows if key_for_state[row[0]] == key]
+            cobol = [row for row in cobol_rows if key_for_state[row[0]] == key]
+            updates = [update[:3] + update[4:] for update in run_updates if update[3] == key]
+            self._insert(schemas[key], states, enemies, cobol, updates)
+            if states:
+                self.partitions.record_batch(self.conn, key, states[0].id, states[-1].id, len(states))
+
+    def _record_batch(self, size: int, commit_ms: float):
+        """Update batch size and commit latency counters"""
+        stats = self.stats
+        stats['batches'] += 1
+        stats['packets_written'] += size
+        stats['batch_size_last'] = size
+        stats['batch_size_max'] = max(stats['batch_size_max'], size)
+        stats['batch_size_avg'] = stats['packets_written'] / stats['batches']
+        stats['commit_ms_last'] = commit_ms
+        stats['commit_ms_max'] = max(stats['commit_ms_max'], commit_ms)
+        stats['commit_ms_avg'] += (commit_ms - stats['commit_ms_avg']) / stats['batches']
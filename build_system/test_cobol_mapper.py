@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the COBOL mapper
+Writes single-state GAMESTAT datasets from a compacted capture
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cobol_mapper import COBOLMapper
+from doom_state_sqlite import DoomStateSQLite
+from simulate_doom_udp import build_state_packet
+
+BASE_TIME = 1700000000.0
+
+
+def compacted_capture(db_path):
+    """Ticks 1-4 idle (one run), then tick 5 on its own row"""
+    capture = DoomStateSQLite(db_path, batch_ms=10, compact_idle=True)
+    capture.running = True
+    capture.init_database()
+    for tick, health in ((1, 100), (2, 100), (3, 100), (4, 100), (5, 90)):
+        packet = build_state_packet(tick, health, 0, 0, 0, 0, 0)
+        capture.writer.submit(capture._parse_state(packet), packet, BASE_TIME + tick / 35)
+    capture.writer.start()
+    capture.stop_capture()
+
+
+def gamestat_ticks(mapper):
+    """STATE-TICK of every STATE record in the mapper's DOOM.GAMESTAT"""
+    codec = mapper.gamestat.codecs['STATE']
+    lines = Path(mapper.datasets_dir, 'DOOM.GAMESTAT').read_text().splitlines()
+    return [codec.decode(line)['STATE-TICK'] for line in lines if line.startswith('STATE')]
+
+
+def test_single_state_of_run_uses_last_tick():
+    """--state N of a compacted run writes the run's newest tick"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            db_path = str(Path(tmp) / 'state.db')
+            compacted_capture(db_path)
+            mapper = COBOLMapper(db_path)
+
+            row, _ = mapper.fetch_state(1)
+            assert row[0] == 4
+            assert row[2] == BASE_TIME + 4 / 35
+
+            mapper.write_gamestat_dataset(1)
+            assert gamestat_ticks(mapper) == [4]
+            mapper.write_gamestat_dataset(2)
+            assert gamestat_ticks(mapper) == [5]
+
+            # The range writer expands the run
+            mapper.write_gamestat_range(1, 5)
+            assert gamestat_ticks(mapper) == [1, 2, 3, 4, 5]
+            mapper.conn.close()
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    """Run tests"""
+    print("COBOL Mapper Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll COBOL mapper tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for on-demand COBOL records
+Captures the same packets with cobol_state as a table and as a view
+"""
+
+import random
+import sqlite3
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cobol_state_view import MATERIALIZED_TABLE, ensure_cobol_state
+from doom_state_codec import MAX_ENEMIES, STATE_MAGIC
+from doom_state_sqlite import DoomStateSQLite
+
+BASE_TIME = 1700000000.0
+
+
+def sample_packet(tick, rng):
+    """A packet with full-range positions, dead players and enemies"""
+    count = rng.randint(0, MAX_ENEMIES)
+    packet = struct.pack('<III', STATE_MAGIC, 1, tick)
+    packet += struct.pack('<18i', rng.randint(-5, 200), rng.randint(0, 200),
+                          *[rng.randint(0, 600) for _ in range(4)], rng.randint(0, 9),
+                          *[rng.randint(-2 ** 31, 2 ** 31 - 1) for _ in range(4)], 0, 0,
+                          rng.randint(1, 32), 1, 2, 3, count)
+    packet += b'\0' * 4
+    for _ in range(count):
+        packet += struct.pack('<5i', rng.randint(0, 30), rng.randint(-50, 1000),
+                              *[rng.randint(-2 ** 31, 2 ** 31 - 1) for _ in range(3)])
+    return packet
+
+
+def capture(db_path, mode, ticks=300):
+    """Capture sample packets; returns cobol_state rows and the export file"""
+    doom = DoomStateSQLite(db_path, cobol_records=mode)
+    doom.init_database()
+    doom.writer.start()
+
+    rng = random.Random(1993)
+    for tick in range(1, ticks + 1):
+        doom._process_packet(sample_packet(tick, rng), BASE_TIME + tick / 35)
+    doom._store_ready(doom.sequencer.flush())
+    doom.writer.flush()
+
+    export = str(Path(db_path).with_suffix('.txt'))
+    doom.export_cobol_format(export)
+    rows = doom.conn.execute(
+        'SELECT id, state_id, record_type, record_data FROM cobol_state ORDER BY id').fetchall()
+    doom.stop_capture()
+    return rows, Path(export).read_bytes()
+
+
+def test_view_matches_table():
+    """The view yields byte-identical records, in the same order"""
+    with tempfile.TemporaryDirectory() as tmp:
+        table_rows, table_export = capture(str(Path(tmp) / 'table.db'), 'table')
+        view_rows, view_export = capture(str(Path(tmp) / 'view.db'), 'view')
+
+        # Ids differ (AUTOINCREMENT vs state_id * stride); order and content must not
+        assert [row[1:] for row in view_rows] == [row[1:] for row in table_rows]
+        assert view_export == table_export
+        assert len(table_export) > 0
+
+
+def test_switch_modes_keeps_rows():
+    """A table database switched to view mode and back keeps its rows"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'table.db')
+        table_rows, _ = capture(db_path, 'table', ticks=50)
+
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        ensure_cobol_state(cursor, 'view')
+        view_rows = cursor.execute(
+            'SELECT state_id, record_type, record_data FROM cobol_state ORDER BY id').fetchall()
+        assert view_rows == [row[1:] for row in table_rows]
+        assert cursor.execute(f'SELECT COUNT(*) FROM {MATERIALIZED_TABLE}').fetchone()[0] == len(table_rows)
+
+        ensure_cobol_state(cursor, 'table')
+        assert cursor.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'cobol_state'").fetchone() == ('table',)
+        assert cursor.execute('SELECT * FROM cobol_state ORDER BY id').fetchall() == table_rows
+        conn.close()
+
+
+def main():
+    """Run tests"""
+    print("COBOL State View Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll COBOL state view tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the dataset catalog
+Readers in another catalog (or process) follow each published generation
+"""
+
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from dataset_catalog import DatasetCatalog
+from ebcdic import encode_records
+from gamestat_publisher import read_generation
+
+FIRST = ["STATE   00000001", "PLAYER  +0000100"]
+SECOND = ["STATE   00000002", "PLAYER  +0000090", "ENEMY   09100"]
+
+
+def texts(entry):
+    return [text.rstrip() for text in entry.text_records()]
+
+
+def test_reader_catalog_follows_publishes():
+    """Publishing twice: one new generation, the repeat is skipped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, reader = DatasetCatalog(tmp), DatasetCatalog(tmp)
+        assert reader.get('DOOM.GAMESTAT') is None
+
+        writer.publish('DOOM.GAMESTAT', encode_records(FIRST))
+        entry = reader.get('DOOM.GAMESTAT')
+        assert (entry.generation, entry.record_count, texts(entry)) == (1, 2, FIRST)
+        mapping = entry.data
+
+        # Same bytes: no new file, so the reader keeps its mapping
+        writer.publish('DOOM.GAMESTAT', encode_records(FIRST))
+        assert read_generation(Path(tmp) / 'DOOM.GAMESTAT')['generation'] == 1
+        assert reader.get('DOOM.GAMESTAT').data is mapping
+
+        writer.publish('DOOM.GAMESTAT', encode_records(SECOND))
+        entry = reader.get('DOOM.GAMESTAT')
+        assert (entry.generation, entry.record_count, texts(entry)) == (2, 3, SECOND)
+        assert writer.get('DOOM.GAMESTAT').generation == 2
+
+
+def test_refresh_after_another_process_publishes():
+    """Generations and attributes come from the publisher's sidecar"""
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = DatasetCatalog(tmp)
+        reader.define('DOOM.GAMESTAT')
+        # One record, the same record again (skipped), then two records
+        publish = ("import sys; from gamestat_publisher import DatasetPublisher; "
+                   "publisher = DatasetPublisher(sys.argv[1], recfm='VB', blksize=800); "
+                   "[publisher.publish(sys.argv[2:n]) for n in (3, 3, 4)]")
+        subprocess.run([sys.executable, '-c', publish, str(Path(tmp) / 'DOOM.GAMESTAT'), *SECOND[:2]],
+                       cwd=Path(__file__).resolve().parent, check=True)
+
+        entry = reader.get('DOOM.GAMESTAT')
+        assert entry.generation == 2
+        assert (entry.recfm, entry.lrecl, entry.blksize) == ('VB', 84, 800)
+        assert entry.text_records() == SECOND[:2]
+
+
+def test_replaced_mapping_closed_once_views_dropped():
+    """A refresh unmaps the old generation, unless a reader still holds a view"""
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = DatasetCatalog(tmp)
+        catalog.publish('DOOM.GAMESTAT', encode_records(FIRST))
+        first = catalog.get('DOOM.GAMESTAT').data
+        catalog.publish('DOOM.GAMESTAT', encode_records(SECOND))
+        assert first.closed
+
+        view = catalog.get('DOOM.GAMESTAT').view()
+        second = catalog.get('DOOM.GAMESTAT').data
+        catalog.publish('DOOM.GAMESTAT', encode_records(FIRST))
+        # The transfer holding the view still reads its generation whole
+        assert not second.closed
+        assert bytes(view) == encode_records(SECOND)
+        view.release()
+        assert catalog.get('DOOM.GAMESTAT').generation == 3
+
+
+def test_rewritten_in_place_is_new_generation():
+    """A file rewritten without its publisher counts past the sidecar"""
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = DatasetCatalog(tmp)
+        catalog.define('DOOM.COMMANDS', mapped=False)
+        catalog.publish('DOOM.COMMANDS', encode_records(FIRST))
+        assert catalog.get('DOOM.COMMANDS').generation == 1
+
+        (Path(tmp) / 'DOOM.COMMANDS').write_bytes(encode_records(SECOND))
+        reader = DatasetCatalog(tmp)
+        reader.define('DOOM.COMMANDS', mapped=False)
+        for entry in (catalog.get('DOOM.COMMANDS'), reader.get('DOOM.COMMANDS')):
+            assert entry.generation == 2
+            assert texts(entry) == SECOND
+
+
+def main():
+    """Run tests"""
+    print("Dataset Catalog Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll dataset catalog tests passed")
+
+
+if __name__ == "__main__":
+    main()
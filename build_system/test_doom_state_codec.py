@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the DOOM state packet codec
+Checks the NumPy batch decoder against the per-packet parser
+"""
+
+import random
+import struct
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from doom_state_codec import (MAX_ENEMIES, NUMPY_AVAILABLE, ENEMY_STRUCT, decode_batch,
+                              parse_state, states_from_batch)
+from simulate_doom_udp import build_state_packet
+
+
+def sample_packets(count, seed=1993):
+    """Packets with every enemy count, negative fields and odd sizes"""
+    rng = random.Random(seed)
+    packets = []
+    for tick in range(count):
+        enemies = [(rng.randint(1, 9), rng.randint(-50, 400), rng.randint(0, 1 << 30),
+                    rng.randint(0, 1 << 30), rng.randint(0, 1 << 28))
+                   for _ in range(tick % (MAX_ENEMIES + 1))]
+        packets.append(build_state_packet(
+            tick, rng.randint(-20, 200), rng.randint(0, 200),
+            rng.randint(0, 1 << 30), rng.randint(0, 1 << 30), rng.randint(-(1 << 20), 1 << 20),
+            rng.randint(-(1 << 31), (1 << 31) - 1), level=rng.randint(1, 32),
+            kills=rng.randint(0, 99), enemy_count=len(enemies), enemies=enemies))
+    return packets
+
+
+def test_decode_batch_matches_parse_state():
+    """Every field of every packet decodes the same both ways"""
+    packets = sample_packets(200)
+    assert states_from_batch(decode_batch(packets)) == [parse_state(p) for p in packets]
+
+
+def test_enemy_count_beyond_packet():
+    """enemy_count larger than the entries sent is clamped like parse_state"""
+    enemies = [(3, 60, 100, 200, 300)] * 2
+    packets = [
+        build_state_packet(1, 100, 0, 0, 0, 0, 0, enemy_count=5, enemies=enemies),
+        build_state_packet(2, 100, 0, 0, 0, 0, 0, enemy_count=40,
+                           enemies=enemies * (MAX_ENEMIES // 2)),
+        # Longer than a full packet: the extra entry is ignored
+        build_state_packet(3, 100, 0, 0, 0, 0, 0, enemy_count=MAX_ENEMIES + 1,
+                           enemies=enemies * (MAX_ENEMIES // 2) + enemies[:1]),
+    ]
+    decoded = states_from_batch(decode_batch(packets))
+    assert decoded == [parse_state(p) for p in packets]
+    assert [len(state['enemies']) for state in decoded] == [2, MAX_ENEMIES, MAX_ENEMIES]
+    assert decoded[0]['enemy_count'] == 5
+
+
+def test_invalid_packets():
+    """Short and bad-magic packets are dropped, or kept with magic 0"""
+    good = sample_packets(3)
+    short = good[1][:40]
+    bad_magic = struct.pack('<I', 0x12345678) + good[2][4:]
+    packets = [good[0], short, bad_magic, good[1], good[2][:-ENEMY_STRUCT.size]]
+
+    valid = [packets[0], packets[3], packets[4]]
+    assert states_from_batch(decode_batch(packets)) == [parse_state(p) for p in valid]
+
+    kept = decode_batch(packets, drop_invalid=False)
+    assert len(kept) == len(packets)
+    assert [bool(magic) for magic in kept['magic']] == [True, False, False, True, True]
+    assert states_from_batch(kept[[0, 3, 4]]) == [parse_state(p) for p in valid]
+
+
+def main():
+    """Run tests"""
+    print("DOOM State Codec Test Script")
+    print("=" * 50)
+
+    if not NUMPY_AVAILABLE:
+        print("numpy not installed; decode_batch tests skipped")
+        return
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll codec tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for atomic dataset publishing
+Publishes successive generations and checks what a reader sees of each
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from ebcdic import decode_records, encode_records
+from gamestat_publisher import (ASCII_SUFFIX, GENERATION_SUFFIX, DatasetPublisher, atomic_write,
+                                dataset_digest, read_generation)
+
+FIRST = ["STATE   00000001", "PLAYER  +0000100"]
+SECOND = ["STATE   00000002", "PLAYER  +0000090", "ENEMY   09100"]
+
+
+def leftovers(directory):
+    """Temporary files an interrupted or failed publish would leave behind"""
+    return [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+
+def test_publish_twice_bumps_generation_once_per_change():
+    """Same bytes are skipped by digest; new bytes are the next generation"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'DOOM.GAMESTAT'
+        publisher = DatasetPublisher(path)
+        assert publisher.publish(FIRST)
+        mtime = os.stat(path).st_mtime_ns
+        assert not publisher.publish(FIRST)
+        assert os.stat(path).st_mtime_ns == mtime
+        assert publisher.generation == 1
+        assert publisher.stats == {'published': 1, 'unchanged': 1}
+
+        assert publisher.publish(SECOND)
+        assert publisher.generation == 2
+        assert [text.rstrip() for text in decode_records(path.read_bytes())] == SECOND
+        assert leftovers(tmp) == []
+
+
+def test_sidecar_records_generation():
+    """The .GEN sidecar describes the dataset as published"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'DOOM.GAMESTAT'
+        DatasetPublisher(path, recfm='VB', blksize=800).publish(SECOND)
+        data = path.read_bytes()
+        info = read_generation(path)
+        assert Path(f'{path}{GENERATION_SUFFIX}').exists()
+        assert info['generation'] == 1
+        assert info['digest'] == dataset_digest(data)
+        assert (info['bytes'], info['records']) == (len(data), len(SECOND))
+        assert (info['recfm'], info['lrecl'], info['blksize'], info['layout']) == ('VB', 84, 800, 'display')
+        assert read_generation(Path(tmp) / 'DOOM.AILOG') == {}
+
+
+def test_generation_survives_restart():
+    """A new publisher carries on from the sidecar, skip included"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'DOOM.GAMESTAT'
+        DatasetPublisher(path).publish(FIRST)
+        publisher = DatasetPublisher(path)
+        assert not publisher.publish(FIRST)
+        assert publisher.publish(SECOND)
+        assert read_generation(path)['generation'] == 2
+
+
+def test_reader_keeps_its_generation():
+    """A reader that opened generation 1 reads it whole after generation 2 lands"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'DOOM.GAMESTAT'
+        publisher = DatasetPublisher(path, ascii_copy=True)
+        publisher.publish(FIRST)
+        with open(path, 'rb') as reader:
+            publisher.publish(SECOND)
+            assert reader.read() == encode_records(FIRST)
+        assert path.read_bytes() == encode_records(SECOND)
+        ascii_copy = Path(f'{path}{ASCII_SUFFIX}').read_text().splitlines()
+        assert [line.rstrip() for line in ascii_copy] == SECOND
+
+
+def test_failed_write_leaves_dataset():
+    """A write that fails part way leaves the old generation and no temp file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'DOOM.GAMESTAT'
+        atomic_write(path, encode_records(FIRST))
+        try:
+            atomic_write(path, object())
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("no error writing an object")
+        assert path.read_bytes() == encode_records(FIRST)
+        assert leftovers(tmp) == []
+
+
+def main():
+    """Run tests"""
+    print("Dataset Publisher Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll dataset publisher tests passed")
+
+
+if __name__ == "__main__":
+    main()
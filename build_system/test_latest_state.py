@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the latest_state cache
+Writes two sessions through StateWriter and compares latest_state with
+the newest game_state row of each, plain, partitioned and compacted
+"""
+
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from doom_state_sqlite import DoomStateSQLite
+from simulate_doom_udp import build_state_packet
+from state_partitions import PartitionedStateView
+
+BASE_TIME = 1700000000.0
+MODES = ({}, {'partition_seconds': 60}, {'compact_idle': True})
+
+
+def capture_sessions(db_path, **kwargs):
+    """Two interleaved sessions with idle stretches, in several batches
+
+    Returns the running capture and its two session ids.
+    """
+    capture = DoomStateSQLite(db_path, batch_ms=10, batch_size=16, **kwargs)
+    capture.running = True
+    capture.init_database()
+    sessions = (capture.session_id, capture.session_id + 1)
+    for tick in range(1, 101):
+        for session_id in sessions:
+            # Health changes every 10 ticks, so runs of 10 compact
+            health = 100 - tick // 10 - (session_id - sessions[0]) * 5
+            packet = build_state_packet(tick, health, 0, tick // 10 << 16, 0, 0, 0)
+            capture.writer.submit(capture._parse_state(packet), packet,
+                                  BASE_TIME + tick / 35, session_id)
+    # The second session runs on alone, ending in an idle run
+    for tick in range(101, 131):
+        packet = build_state_packet(tick, 50, 0, 0, 0, 0, 0)
+        capture.writer.submit(capture._parse_state(packet), packet, BASE_TIME + tick / 35, sessions[1])
+    capture.writer.start()
+    capture.writer.flush()
+    return capture, sessions
+
+
+def newest_rows(db_path, partitioned=False):
+    """session -> (state id, last tick, health) of its newest game_state row"""
+    view = PartitionedStateView(db_path) if partitioned else None
+    conn = view.conn if view else sqlite3.connect(db_path)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(game_state)')}
+    tick = 'COALESCE(tick_last, tick)' if 'tick_last' in columns else 'tick'
+    rows = conn.execute(f'''
+        SELECT session_id, id, {tick}, health FROM game_state
+        WHERE id IN (SELECT MAX(id) FROM game_state GROUP BY session_id)
+    ''').fetchall()
+    conn.close()
+    return {row[0]: row[1:] for row in rows}
+
+
+def test_latest_state_is_newest_row():
+    """latest_state holds each session's MAX(tick) row, in every storage mode"""
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / 'state.db')
+            capture, sessions = capture_sessions(db_path, **mode)
+            newest = newest_rows(db_path, 'partition_seconds' in mode)
+            assert sorted(newest) == list(sessions), mode
+            assert [newest[session_id][1] for session_id in sessions] == [100, 130], mode
+
+            for session_id in sessions:
+                latest = capture.get_latest_state(session_id)
+                assert (latest['state_id'], latest['tick'], latest['health']) == newest[session_id], mode
+            # Without a session: the newest state of any session
+            assert capture.get_latest_state()['session_id'] == sessions[1], mode
+            capture.stop_capture()
+
+
+def test_latest_state_seeded_from_game_state():
+    """A database from before latest_state is seeded on its next open"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture, sessions = capture_sessions(db_path)
+        capture.stop_capture()
+        conn = sqlite3.connect(db_path)
+        conn.execute('DROP TABLE latest_state')
+        conn.commit()
+        conn.close()
+
+        capture = DoomStateSQLite(db_path)
+        capture.running = True
+        capture.init_database()
+        newest = newest_rows(db_path)
+        for session_id in sessions:
+            latest = capture.get_latest_state(session_id)
+            assert (latest['state_id'], latest['tick'], latest['health']) == newest[session_id]
+        capture.stop_capture()
+
+
+def main():
+    """Run tests"""
+    print("Latest State Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll latest state tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for MVS record formats
+Round-trips FB and VB datasets through reblock and the record readers
+"""
+
+import random
+
+from ebcdic import EBCDIC_SPACE, to_ebcdic
+from record_formats import (DESCRIPTOR, DESCRIPTOR_SIZE, RecordReader, iter_blocks, read_records,
+                            reblock, stream_records, trim_record)
+
+WIDTH = 80
+
+
+def sample_records(count=300, seed=1993):
+    """WIDTH-byte EBCDIC records with varying trailing blanks"""
+    rng = random.Random(seed)
+    records = [to_ebcdic('X' * rng.randint(1, WIDTH)).ljust(WIDTH, bytes((EBCDIC_SPACE,)))
+               for _ in range(count)]
+    records[0] = bytes((EBCDIC_SPACE,)) * WIDTH  # all blank
+    return records
+
+
+def binary_records(count=300, seed=1993):
+    """WIDTH-byte binary records, some ending in bytes that look like blanks"""
+    rng = random.Random(seed)
+    records = [bytes(rng.randrange(256) for _ in range(WIDTH)) for _ in range(count)]
+    records[1] = records[1][:-8] + bytes((EBCDIC_SPACE,)) * 8
+    return records
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_fb_round_trip():
+    """FB data is unchanged by reblock and reads back record for record"""
+    records = sample_records()
+    data = b''.join(records)
+    assert reblock(data, 'FB', WIDTH, 800) == data
+    assert [bytes(r) for r in read_records(data, 'FB', WIDTH)] == records
+    assert list(stream_records(chunked(data, 7), 'FB', WIDTH)) == records
+
+
+def test_vb_round_trip_trims_blanks():
+    """VB records lose trailing blanks; padding them again restores the data"""
+    records = sample_records()
+    blksize = 27998
+    data = reblock(b''.join(records), 'VB', WIDTH, blksize)
+    assert len(data) < len(records) * WIDTH
+
+    back = [bytes(r) for r in read_records(data, 'VB', WIDTH + DESCRIPTOR_SIZE)]
+    assert back == [trim_record(record) for record in records]
+    assert back[0] == bytes((EBCDIC_SPACE,))
+    assert [r.ljust(WIDTH, bytes((EBCDIC_SPACE,))) for r in back] == records
+
+    for size in (1, 3, 100, 5000):
+        assert list(stream_records(chunked(data, size), 'VB', WIDTH + DESCRIPTOR_SIZE)) == back
+
+
+def test_vb_blocks_fit_blksize():
+    """Every VB block carries its own length and fits BLKSIZE"""
+    records = [trim_record(record) for record in sample_records()]
+    lrecl = WIDTH + DESCRIPTOR_SIZE
+    for recfm, blksize in (('VB', 200), ('VB', 3200), ('V', 3200)):
+        blocks = list(iter_blocks(records, recfm, lrecl, blksize))
+        assert all(DESCRIPTOR.unpack_from(block)[0] == len(block) <= blksize for block in blocks)
+        if recfm == 'V':
+            assert len(blocks) == len(records)
+        data = b''.join(blocks)
+        assert [bytes(r) for r in read_records(data, recfm, lrecl)] == records
+
+
+def test_vb_binary_records_kept_whole():
+    """With fill=None (binary layouts) no byte is trimmed"""
+    records = binary_records()
+    data = reblock(b''.join(records), 'VB', WIDTH, 3200, fill=None)
+    assert [bytes(r) for r in read_records(data, 'VB', WIDTH + DESCRIPTOR_SIZE)] == records
+
+    # Back to FB is the original dataset
+    assert b''.join(read_records(data, 'VB', WIDTH + DESCRIPTOR_SIZE)) == b''.join(records)
+
+
+def test_malformed_vb_raises():
+    """Bad or truncated descriptors raise ValueError"""
+    data = reblock(b''.join(sample_records(20)), 'VB', WIDTH, 3200)
+    for bad in (data[:-1], DESCRIPTOR.pack(2, 0), DESCRIPTOR.pack(8, 0) + DESCRIPTOR.pack(9, 0)):
+        try:
+            list(read_records(bad, 'VB', WIDTH + DESCRIPTOR_SIZE))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"no error for {bad[:8]!r}")
+
+    try:
+        list(stream_records([data[:-1]], 'VB', WIDTH + DESCRIPTOR_SIZE))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("no error for a truncated stream")
+
+
+def test_unsupported_recfm_raises():
+    """RECFM=U (or anything but F/FB/V/VB) raises ValueError"""
+    attempts = (lambda: reblock(b'', 'U', WIDTH, 3200),
+                lambda: list(read_records(b'', 'U', WIDTH)),
+                lambda: RecordReader('U', WIDTH))
+    for attempt in attempts:
+        try:
+            attempt()
+        except ValueError as e:
+            assert str(e) == "Unsupported RECFM U"
+        else:
+            raise AssertionError("no error for RECFM=U")
+
+
+def main():
+    """Run tests"""
+    print("Record Formats Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll record format tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the state hub subscriptions
+Offers packets to a subscriber whose callback is blocked, without a socket
+"""
+
+import threading
+
+from state_hub import StatePacket, Subscription
+
+MAXSIZE = 3
+OFFERED = 10
+
+
+def packet(tick):
+    return StatePacket({'tick': tick}, b'', ('127.0.0.1', 31337), float(tick))
+
+
+def blocked_subscription(drop_policy):
+    """A started subscription whose consumer holds packet 0 in its callback
+
+    Returns the subscription, the event that releases the callback and
+    the ticks delivered so far.
+    """
+    delivered = []
+    busy, release = threading.Event(), threading.Event()
+
+    def callback(state_packet):
+        busy.set()
+        release.wait(timeout=5)
+        delivered.append(state_packet.state['tick'])
+
+    subscription = Subscription('test', callback, maxsize=MAXSIZE, drop_policy=drop_policy)
+    subscription.start()
+    subscription.offer(packet(0))
+    assert busy.wait(timeout=5)
+    for tick in range(1, OFFERED):
+        subscription.offer(packet(tick))
+    return subscription, release, delivered
+
+
+def queued_ticks(subscription):
+    return [queued.state['tick'] for queued in subscription.queue]
+
+
+def drain(subscription, release):
+    release.set()
+    subscription.stop()
+    return subscription.stats
+
+
+def test_drop_oldest_keeps_newest():
+    """A full queue evicts its oldest packet for each new one"""
+    subscription, release, delivered = blocked_subscription('drop_oldest')
+    assert queued_ticks(subscription) == [7, 8, 9]
+    assert subscription.stats['dropped'] == OFFERED - 1 - MAXSIZE
+    assert subscription.stats['max_depth'] == MAXSIZE
+
+    stats = drain(subscription, release)
+    assert delivered == [0, 7, 8, 9]
+    assert stats['delivered'] == 4 and stats['offered'] == OFFERED
+    assert stats['dropped'] == OFFERED - 4
+
+
+def test_drop_newest_keeps_oldest():
+    """A full queue refuses new packets"""
+    subscription, release, delivered = blocked_subscription('drop_newest')
+    assert queued_ticks(subscription) == [1, 2, 3]
+    assert subscription.stats['dropped'] == OFFERED - 1 - MAXSIZE
+
+    stats = drain(subscription, release)
+    assert delivered == [0, 1, 2, 3]
+    assert stats['delivered'] == 4 and stats['dropped'] == OFFERED - 4
+
+
+def test_latest_keeps_one():
+    """Only the most recent packet waits, whatever the queue size"""
+    subscription, release, delivered = blocked_subscription('latest')
+    assert queued_ticks(subscription) == [9]
+    assert subscription.stats['dropped'] == OFFERED - 2
+    assert subscription.stats['max_depth'] == 1
+
+    stats = drain(subscription, release)
+    assert delivered == [0, 9]
+    assert stats['delivered'] == 2 and stats['dropped'] == OFFERED - 2
+
+
+def test_offer_before_start_drops():
+    """A subscription that is not running drops, never queues"""
+    subscription = Subscription('test', lambda state_packet: None, maxsize=MAXSIZE)
+    subscription.offer(packet(1))
+    assert not subscription.queue
+    assert subscription.stats['dropped'] == 1 and subscription.stats['delivered'] == 0
+
+
+def main():
+    """Run tests"""
+    print("State Hub Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll state hub tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for commit notifications
+Readers in the capture process (wait_for) and on a StateSubscriber socket
+wake when StateWriter commits, with no polling
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from doom_state_sqlite import DoomStateSQLite
+from simulate_doom_udp import build_state_packet
+from state_notify import UNIX_SOCKETS, StateSubscriber
+
+BASE_TIME = 1700000000.0
+
+
+def new_capture(db_path, **kwargs):
+    capture = DoomStateSQLite(db_path, batch_ms=10, **kwargs)
+    capture.running = True
+    capture.init_database()
+    return capture
+
+
+def submit(capture, ticks, health=100):
+    for tick in ticks:
+        packet = build_state_packet(tick, health, 0, 0, 0, 0, 0)
+        capture.writer.submit(capture._parse_state(packet), packet, BASE_TIME + tick / 35)
+
+
+def max_state_id(db_path):
+    conn = sqlite3.connect(db_path)
+    state_id = conn.execute('SELECT MAX(id) FROM game_state').fetchone()[0]
+    conn.close()
+    return state_id
+
+
+def test_wait_for_wakes_on_commit():
+    """A waiting reader gets the commit's sequence and newest state id"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture = new_capture(db_path)
+        sequence = capture.notifier.sequence
+        assert capture.notifier.wait_for(sequence, timeout=0.05) is None
+
+        woken = []
+        reader = threading.Thread(target=lambda: woken.append(capture.notifier.wait_for(sequence, timeout=5)))
+        reader.start()
+        # Queued before the writer starts, so they commit as one batch
+        submit(capture, range(1, 11))
+        capture.writer.start()
+        reader.join()
+        assert woken == [(sequence + 1, max_state_id(db_path))]
+        assert woken[0][1] == 10
+        capture.stop_capture()
+
+
+def test_idle_commit_advances_sequence_only():
+    """A batch that only extends an idle run wakes readers with the same state id"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture = new_capture(db_path, compact_idle=True)
+        capture.writer.start()
+        submit(capture, range(1, 4))
+        capture.writer.flush()
+        sequence, state_id = capture.notifier.wait_for(0, timeout=5)
+
+        submit(capture, range(4, 7))
+        capture.writer.flush()
+        newer, newest_id = capture.notifier.wait_for(sequence, timeout=5)
+        assert newer > sequence and newest_id == state_id == max_state_id(db_path)
+        capture.stop_capture()
+
+
+def test_subscriber_wakes_with_newest_commit():
+    """A subscriber socket, as other processes use, wakes once with the newest commit"""
+    if not UNIX_SOCKETS:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        subscriber = StateSubscriber(db_path)
+        path = subscriber.path
+        try:
+            assert subscriber.wait(timeout=0.05) is None
+            capture = new_capture(db_path, batch_size=4)
+            submit(capture, range(1, 13))
+            capture.writer.start()
+            capture.writer.flush()
+            assert capture.notifier.sequence >= 3
+
+            assert subscriber.wait(timeout=5) == (capture.notifier.sequence, max_state_id(db_path))
+            assert subscriber.wait(timeout=0.05) is None
+            capture.stop_capture()
+        finally:
+            subscriber.close()
+        assert not os.path.exists(path)
+
+
+def test_dead_subscriber_removed():
+    """A subscriber that exited without closing is dropped on the next commit"""
+    if not UNIX_SOCKETS:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        subscriber = StateSubscriber(db_path)
+        path = subscriber.path
+        # As if its process died: the socket file stays behind
+        subscriber.socket.close()
+        subscriber.socket = None
+
+        capture = new_capture(db_path)
+        capture.writer.start()
+        submit(capture, range(1, 4))
+        capture.writer.flush()
+        assert capture.notifier.stats['stale_removed'] == 1
+        assert not os.path.exists(path)
+        capture.stop_capture()
+
+
+def main():
+    """Run tests"""
+    print("State Notify Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll state notify tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the group-commit state writer
+Queues states before the writer starts so batch boundaries are fixed
+"""
+
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from doom_state_sqlite import DoomStateSQLite
+from simulate_doom_udp import build_state_packet
+
+BASE_TIME = 1700000000.0
+
+
+def open_capture(db_path, **kwargs):
+    """A capture with its schema created and the writer not yet started"""
+    capture = DoomStateSQLite(db_path, **kwargs)
+    capture.running = True
+    capture.init_database()
+    return capture
+
+
+def queue_states(capture, states):
+    """Submit (tick, health) states straight to the writer"""
+    for tick, health in states:
+        packet = build_state_packet(tick, health, 0, 0, 0, 0, 0)
+        capture.writer.submit(capture._parse_state(packet), packet, BASE_TIME + tick / 35)
+
+
+def game_state(db_path, columns):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f'SELECT {columns} FROM game_state ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_batching_and_ids():
+    """States are committed batch_size at a time with contiguous ids"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture = open_capture(db_path, batch_size=4, batch_ms=50)
+        queue_states(capture, [(tick, 100) for tick in range(1, 11)])
+        capture.writer.start()
+        capture.writer.flush()
+
+        stats = capture.writer.stats
+        assert stats['packets_written'] == 10
+        assert stats['batches'] == 3
+        assert stats['batch_size_max'] == 4
+        assert stats['batch_size_last'] == 2
+        assert stats['write_errors'] == 0
+        assert game_state(db_path, 'id, tick') == [(i, i) for i in range(1, 11)]
+        assert capture.notifier.wait_for(0, 0) == (3, 10)
+
+        latest = capture.get_latest_state()
+        assert (latest['state_id'], latest['tick']) == (10, 10)
+        capture.stop_capture()
+
+
+def test_ids_continue_after_restart():
+    """A new writer allocates ids after the newest committed one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        for first in (1, 6):
+            capture = open_capture(db_path, batch_size=8, batch_ms=10)
+            queue_states(capture, [(tick, 100) for tick in range(first, first + 5)])
+            capture.writer.start()
+            capture.stop_capture()
+
+        assert [row[0] for row in game_state(db_path, 'id')] == list(range(1, 11))
+
+
+def test_compaction_folds_idle_states():
+    """Repeated states extend their run's head row, within and across batches"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture = open_capture(db_path, batch_size=2, batch_ms=10, compact_idle=True)
+        # Batches: [1 2] [3 4] [5 6] [7]; the second and fourth add no row
+        queue_states(capture, [(1, 100), (2, 100), (3, 100), (4, 100),
+                               (5, 90), (6, 90), (7, 90)])
+        capture.writer.start()
+        capture.writer.flush()
+
+        assert game_state(db_path, 'id, tick, tick_last, run_length, health') == [
+            (1, 1, 4, 4, 100),
+            (2, 5, 7, 3, 90),
+        ]
+        timestamps = game_state(db_path, 'timestamp, timestamp_last')
+        assert timestamps == [(BASE_TIME + 1 / 35, BASE_TIME + 4 / 35),
+                              (BASE_TIME + 5 / 35, BASE_TIME + 7 / 35)]
+        assert capture.writer.stats['states_folded'] == 5
+        assert capture.writer.stats['packets_written'] == 7
+
+        # Run-only batches are still published, under the head's id
+        assert capture.notifier.wait_for(0, 0) == (4, 2)
+        latest = capture.get_latest_state()
+        assert (latest['state_id'], latest['tick'], latest['health']) == (2, 7, 90)
+
+        conn = sqlite3.connect(db_path)
+        expanded = conn.execute(
+            'SELECT state_id, tick, health FROM game_state_expanded ORDER BY tick').fetchall()
+        conn.close()
+        assert expanded == [(1, tick, 100) for tick in range(1, 5)] + \
+                          [(2, tick, 90) for tick in range(5, 8)]
+        capture.stop_capture()
+
+
+def test_compaction_breaks_on_missing_tick():
+    """A skipped tick starts a new row even when the state is unchanged"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'state.db')
+        capture = open_capture(db_path, batch_size=8, batch_ms=10, compact_idle=True)
+        queue_states(capture, [(1, 100), (2, 100), (4, 100), (5, 100)])
+        capture.writer.start()
+        capture.stop_capture()
+
+        assert game_state(db_path, 'id, tick, tick_last, run_length') == [
+            (1, 1, 2, 2),
+            (2, 4, 5, 2),
+        ]
+
+
+def main():
+    """Run tests"""
+    print("State Writer Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll state writer tests passed")
+
+
+if __name__ == "__main__":
+    main()
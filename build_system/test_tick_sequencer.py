@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the tick sequencer
+Feeds packets with explicit receive times through the jitter window
+"""
+
+from tick_sequencer import SequenceTracker, TickSequencer
+
+
+def push_all(sequencer, ticks, now=0.0):
+    """Push ticks (the tick is the item) and return everything released"""
+    ready = []
+    for tick in ticks:
+        ready += sequencer.push(tick, tick, now)
+    return ready
+
+
+def test_in_order_released_immediately():
+    """Consecutive ticks never wait in the window"""
+    sequencer = TickSequencer(window=4, max_delay=0.1)
+    for tick in range(1, 6):
+        assert sequencer.push(tick, tick, 0.0) == [tick]
+    assert sequencer.depth == 0
+    assert sequencer.stats['gaps'] == 0
+
+
+def test_reorder_within_window():
+    """A late tick inside the window is put back in order"""
+    sequencer = TickSequencer(window=4, max_delay=0.1)
+    assert push_all(sequencer, [1, 3, 4]) == [1]
+    assert sequencer.depth == 2
+    assert sequencer.push(2, 2, 0.0) == [2, 3, 4]
+    assert sequencer.stats['reordered'] == 1
+    assert sequencer.stats['reorder_depth_max'] == 2
+    assert sequencer.stats['gaps'] == 0
+
+
+def test_gap_when_window_exceeded():
+    """A tick `window` ahead of the oldest held one declares the gap"""
+    sequencer = TickSequencer(window=4, max_delay=10.0)
+    assert push_all(sequencer, [1, 3, 4, 5]) == [1]
+    assert sequencer.push(7, 7, 0.0) == [3, 4, 5]
+    assert sequencer.stats['gaps'] == 1
+    assert sequencer.stats['missing_ticks'] == 1
+    # 6 may still arrive; 7 waits for it
+    assert sequencer.push(6, 6, 0.0) == [6, 7]
+
+
+def test_gap_when_max_delay_expires():
+    """A held tick is released once it has waited max_delay"""
+    sequencer = TickSequencer(window=4, max_delay=0.1)
+    assert push_all(sequencer, [1, 3]) == [1]
+    assert sequencer.expire(0.05) == []
+    assert sequencer.expire(0.1) == [3]
+    assert sequencer.stats['missing_ticks'] == 1
+
+
+def test_duplicates_and_late_packets_dropped():
+    """Ticks already held or released are never delivered twice"""
+    sequencer = TickSequencer(window=4, max_delay=0.1)
+    assert push_all(sequencer, [1, 3, 3]) == [1]
+    assert sequencer.stats['duplicates'] == 1
+    assert sequencer.push(1, 1, 0.0) == []
+    assert sequencer.stats['duplicates'] == 2
+
+    # Older than the recent-tick memory: counted as late
+    push_all(sequencer, range(2, 40))
+    assert sequencer.push(5, 5, 0.0) == []
+    assert sequencer.stats['late_dropped'] == 1
+    assert sequencer.stats['delivered'] == 39
+
+
+def test_engine_restart_resets():
+    """A tick far behind the stream is a restart, not a late packet"""
+    sequencer = TickSequencer(window=4, max_delay=0.1, reset_ticks=100)
+    push_all(sequencer, [1000, 1001, 1003])
+    assert sequencer.push(5, 5, 0.0) == [1003, 5]
+    assert sequencer.stats['resets'] == 1
+    assert sequencer.push(6, 6, 0.0) == [6]
+
+
+def test_tracker_sequences_sessions_separately():
+    """Each session key has its own window"""
+    tracker = SequenceTracker(window=4, max_delay=10.0)
+    assert tracker.push('a', 1, 'a1') == ['a1']
+    assert tracker.push('b', 1, 'b1') == ['b1']
+    assert tracker.push('a', 3, 'a3') == []
+    assert tracker.push('b', 2, 'b2') == ['b2']
+    assert tracker.flush() == ['a3']
+
+    metrics = tracker.get_metrics()
+    assert metrics['sessions'] == 2
+    assert metrics['delivered'] == 4
+    assert metrics['missing_ticks'] == 1
+    assert metrics['loss_rate'] == 1 / 5
+
+
+def main():
+    """Run tests"""
+    print("Tick Sequencer Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll tick sequencer tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tick sequencing for the DOOM state stream
+Detects gaps, duplicates and reordering per session before storage or AI
+"""
+
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional
+
+from ingest_sessions import STREAM_RESET_TICKS
+
+
+class TickSequencer:
+    """Sequence one session's packets by tick
+
+    Packets are held in a small jitter window and released in tick order.
+    A packet is released early once the next expected tick arrives; a gap
+    is declared when the window is full, when the newest tick is more than
+    `window` ahead, or when the oldest buffered packet has waited longer
+    than `max_delay` seconds. Anything at or before the last released
+    tick is dropped as a duplicate or a late packet.
+    """
+
+    def __init__(self, window: int = 4, max_delay: float = 0.1,
+                 reset_ticks: int = STREAM_RESET_TICKS):
+        self.window = window
+        self.max_delay = max_delay
+        self.reset_ticks = reset_ticks
+        self.heap = []
+        self.buffered = set()
+        self.recent = deque(maxlen=max(16, window * 4))
+        self.last_delivered = None
+        self.highest_seen = None
+        self.counter = 0
+        self.stats = {
+            'received': 0,
+            'delivered': 0,
+            'duplicates': 0,
+            'late_dropped': 0,
+            'gaps': 0,
+            'missing_ticks': 0,
+            'reordered': 0,
+            'reorder_depth_max': 0,
+            'resets': 0
+        }
+
+    def push(self, tick: int, item: Any, now: Optional[float] = None) -> List[Any]:
+        """Add a packet, returning whatever is now ready in tick order"""
+        if now is None:
+            now = time.monotonic()
+        stats = self.stats
+        stats['received'] += 1
+
+        if self.last_delivered is not None and tick + self.reset_ticks < self.last_delivered:
+            # Engine restarted: release what we hold and start over
+            ready = self.flush()
+            stats['resets'] += 1
+            self.last_delivered = None
+            self.highest_seen = None
+            self.recent.clear()
+            return ready + self.push(tick, item, now)
+
+        if tick in self.buffered or tick in self.recent:
+            stats['duplicates'] += 1
+            return self._release(now)
+
+        if self.last_delivered is not None and tick <= self.last_delivered:
+            stats['late_dropped'] += 1
+            return self._release(now)
+
+        if self.highest_seen is not None and tick < self.highest_seen:
+            stats['reordered'] += 1
+            stats['reorder_depth_max'] = max(stats['reorder_depth_max'], self.highest_seen - tick)
+        self.highest_seen = tick if self.highest_seen is None else max(self.highest_seen, tick)
+
+        self.counter += 1
+        heapq.heappush(self.heap, (tick, self.counter, now, item))
+        self.buffered.add(tick)
+
+        return self._release(now)
+
+    def expire(self, now: Optional[float] = None) -> List[Any]:
+        """Release packets that have waited longer than max_delay"""
+        if now is None:
+            now = time.monotonic()
+        return self._release(now)
+
+    def flush(self) -> List[Any]:
+        """Release everything buffered, declaring gaps as needed"""
+        ready = []
+        while self.heap:
+            ready.append(self._pop())
+        return ready
+
+    def _release(self, now: float) -> List[Any]:
+        """Pop packets that are in order or can no longer wait"""
+        ready = []
+
+        while self.heap:
+            tick, _, arrived, _ = self.heap[0]
+
+            in_order = self.last_delivered is None or tick == self.last_delivered + 1
+            overdue = (
+                len(self.heap) > self.window
+                or self.highest_seen - tick >= self.window
+                or now - arrived >= self.max_delay
+            )
+
+            if not (in_order or overdue):
+                break
+            ready.append(self._pop())
+
+        return ready
+
+    def _pop(self) -> Any:
+        """Release the lowest buffered tick"""
+        tick, _, _, item = heapq.heappop(self.heap)
+        self.buffered.discard(tick)
+
+        if self.last_delivered is not None and tick > self.last_delivered + 1:
+            self.stats['gaps'] += 1
+            self.stats['missing_ticks'] += tick - self.last_delivered - 1
+
+        self.last_delivered = tick
+        self.recent.append(tick)
+        self.stats['delivered'] += 1
+        return item
+
+    @property
+    def depth(self) -> int:
+        return len(self.heap)
+
+
+class SequenceTracker:
+    """TickSequencer per session key, safe to share between threads"""
+
+    def __init__(self, window: int = 4, max_delay: float = 0.1):
+        self.window = window
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.sequencers: Dict[Hashable, TickSequencer] = {}
+
+    def push(self, key: Hashable, tick: int, item: Any) -> List[Any]:
+        """Sequence a packet for a session"""
+        with self.lock:
+            sequencer = self.sequencers.get(key)
+            if sequencer is None:
+                sequencer = TickSequencer(self.window, self.max_delay)
+                self.sequencers[key] = sequencer
+            return sequencer.push(tick, item)
+
+    def expire(self) -> List[Any]:
+        """Release overdue packets across all sessions"""
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for sequencer in self.sequencers.values():
+                ready.extend(sequencer.expire(now))
+        return ready
+
+    def flush(self) -> List[Any]:
+        """Release everything buffered across all sessions"""
+        ready = []
+        with self.lock:
+            for sequencer in self.sequencers.values():
+                ready.extend(sequencer.flush())
+        return ready
+
+    def get_metrics(self) -> dict:
+        """Totals plus loss rate and reorder depth for sizing socket buffers"""
+        with self.lock:
+            totals = {
+                'received': 0, 'delivered': 0, 'duplicates': 0, 'late_dropped': 0,
+                'gaps': 0, 'missing_ticks': 0, 'reordered': 0, 'resets': 0
+            }
+            reorder_depth_max = 0
+            buffered = 0
+
+            for sequencer in self.sequencers.values():
+                for name in totals:
+                    totals[name] += sequencer.stats[name]
+                reorder_depth_max = max(reorder_depth_max, sequencer.stats['reorder_depth_max'])
+                buffered += sequencer.depth
+
+        expected = totals['delivered'] + totals['missing_ticks']
+        totals['loss_rate'] = totals['missing_ticks'] / expected if expected else 0.0
+        totals['reorder_depth_max'] = reorder_depth_max
+        totals['buffered'] = buffered
+        totals['sessions'] = len(self.sequencers)
+        return totals
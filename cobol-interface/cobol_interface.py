@@ -11,10 +11,27 @@ import time
 import json
 import logging
 import os
+import sys
 from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Optional
 import structlog
 
+# DOOM.STATE records come from the DOOMSTAT.CPY codec and EBCDIC from
+# the translate tables in build_system; an image built from this
+# directory alone falls back to fixed offsets and the cp037 codec
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from gamestat_records import decode_summary
+    GAMESTAT_CODEC_AVAILABLE = True
+except ImportError:
+    GAMESTAT_CODEC_AVAILABLE = False
+try:
+    from ebcdic import encode_records, iter_records
+    EBCDIC_TABLES_AVAILABLE = True
+except ImportError:
+    EBCDIC_TABLES_AVAILABLE = False
+
 # Import mock MVS if available
 try:
     from mock_mvs import mock_mvs
@@ -331,9 +348,10 @@ class COBOLInterface:
         if MOCK_MODE:
             # Use mock MVS
             try:
-                for cmd in commands:
-                    record = cmd.ljust(80).encode('cp037')
-                    mock_mvs.datasets['DOOM.COMMANDS'].records.append(record)
+                mock_mvs.datasets['DOOM.COMMANDS'].records.extend(
+                    iter_records(encode_records(commands)) if EBCDIC_TABLES_AVAILABLE
+                    else [cmd.ljust(80).encode('cp037') for cmd in commands]
+                )
                 return f"OK: Submitted {len(commands)} commands (MOCK)"
             except Exception as e:
                 return f"ERROR: Mock MVS failed - {str(e)}"
@@ -345,11 +363,10 @@ class COBOLInterface:
                 ftp.sendcmd('SITE RECFM=FB LRECL=80')
                 
                 # Format commands as 80-byte EBCDIC records
-                data = b''
-                for cmd in commands:
-                    # Pad to 80 characters and convert to EBCDIC
-                    record = cmd.ljust(80)
-                    data += record.encode('cp037')
+                if EBCDIC_TABLES_AVAILABLE:
+                    data = encode_records(commands)
+                else:
+                    data = b''.join(cmd.ljust(80).encode('cp037') for cmd in commands)
                     
                 # Upload to DOOM.COMMANDS dataset
                 ftp.storbinary('STOR DOOM.COMMANDS', data)
@@ -392,18 +409,22 @@ class COBOLInterface:
         except Exception as e:
             return f"ERROR: Job submission failed - {str(e)}"
             
+    def _state_summary(self, record: str) -> str:
+        """Key fields of a DOOM.STATE record (DOOM-STATE-SUMMARY)"""
+        if GAMESTAT_CODEC_AVAILABLE:
+            state = decode_summary(record)
+            return (f"Tick={state['tick']} X={state['player_x']} Y={state['player_y']} "
+                    f"Health={state['health']}")
+        return f"Tick={record[0:9]} X={record[9:19]} Y={record[19:29]} Health={record[43:46]}"
+        
     def get_game_status(self) -> str:
         """Retrieve current game state from MVS"""
         if MOCK_MODE:
             # Use mock MVS
             try:
                 if mock_mvs.datasets['DOOM.STATE'].records:
-                    record = mock_mvs.datasets['DOOM.STATE'].records[0].decode('cp037').strip()
-                    tick = record[0:9]
-                    player_x = record[9:19]
-                    player_y = record[19:29]
-                    health = record[39:42]
-                    return f"OK: Tick={tick} X={player_x} Y={player_y} Health={health} (MOCK)"
+                    record = mock_mvs.datasets['DOOM.STATE'].records[0].decode('cp037')
+                    return f"OK: {self._state_summary(record)} (MOCK)"
                 else:
                     return "ERROR: No game state available (MOCK)"
             except Exception as e:
@@ -420,14 +441,8 @@ class COBOLInterface:
                 
                 if data:
                     # Parse EBCDIC record
-                    record = b''.join(data).decode('cp037').strip()
-                    # Extract key fields (based on COBOL layout)
-                    tick = record[0:9]
-                    player_x = record[9:19]
-                    player_y = record[19:29]
-                    health = record[39:42]
-                    
-                    return f"OK: Tick={tick} X={player_x} Y={player_y} Health={health}"
+                    record = b''.join(data).decode('cp037')
+                    return f"OK: {self._state_summary(record)}"
                 else:
                     return "ERROR: No game state available"
                     
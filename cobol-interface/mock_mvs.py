@@ -8,10 +8,28 @@ import threading
 import socket
 import time
 import os
+import sys
 from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Dict
 import json
 
+# DOOM.STATE records come from the DOOMSTAT.CPY codec and EBCDIC from
+# the translate tables in build_system; an image built from this
+# directory alone falls back to fixed offsets and the cp037 codec
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from gamestat_records import encode_summary
+    GAMESTAT_CODEC_AVAILABLE = True
+except ImportError:
+    GAMESTAT_CODEC_AVAILABLE = False
+try:
+    from ebcdic import decode_records
+    EBCDIC_TABLES_AVAILABLE = True
+except ImportError:
+    EBCDIC_TABLES_AVAILABLE = False
+
+
 @dataclass
 class MockDataset:
     """Simulated MVS dataset"""
@@ -50,6 +68,16 @@ class MockMVS:
         self.game_state['tick'] += 1
         
         # Format as COBOL record
+        if GAMESTAT_CODEC_AVAILABLE:
+            state = self.game_state
+            record = encode_summary(
+                state['tick'], state['player_x'], state['player_y'], state['player_z'],
+                state['player_angle'], state['health'], state['armor'], state['ammo'],
+                state['current_weapon'], state['level']
+            )
+            self.datasets['DOOM.STATE'].records = [record.encode('cp037')]
+            return
+            
         record = (
             f"{self.game_state['tick']:09d}"
             f"{self.game_state['player_x']:+010d}"
@@ -71,8 +99,14 @@ class MockMVS:
         if not self.datasets['DOOM.COMMANDS'].records:
             return
             
-        for record in self.datasets['DOOM.COMMANDS'].records:
-            cmd = record.decode('cp037').strip()
+        records = self.datasets['DOOM.COMMANDS'].records
+        if EBCDIC_TABLES_AVAILABLE:
+            texts = decode_records(b''.join(records), partial=True)
+        else:
+            texts = [record.decode('cp037') for record in records]
+            
+        for text in texts:
+            cmd = text.strip()
             if not cmd:
                 continue
                 
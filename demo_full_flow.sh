@@ -123,7 +123,7 @@ echo -e "${BLUE}STEP 3: Starting MVS Dataset Converter${NC}"
 echo -e "${BLUE}═══════════════════════════════════════════════════════${NC}"
 
 echo "Starting game state to MVS converter..."
-python3 "$BUILD_DIR/gamestate_to_mvs.py" --monitor > "$LOG_DIR/mvs_converter.log" 2>&1 &
+python3 "$BUILD_DIR/gamestate_to_mvs.py" --monitor --ascii > "$LOG_DIR/mvs_converter.log" 2>&1 &
 CONVERTER_PID=$!
 
 sleep 2
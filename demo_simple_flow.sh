@@ -85,7 +85,7 @@ sqlite3 -header -column doom_state.db \
 # Step 4: Convert to MVS
 echo
 echo -e "${BLUE}Step 4: Converting to MVS dataset format...${NC}"
-python3 build_system/gamestate_to_mvs.py --once
+python3 build_system/gamestate_to_mvs.py --once --ascii
 
 if [ -f "$MVS_DIR/DOOM.GAMESTAT.ASCII" ]; then
     echo -e "${GREEN}✓ MVS dataset created${NC}"
@@ -5,10 +5,24 @@ Handles dataset transfers between DOOM and MVS
 """
 
 import ftplib
+import sys
 import time
 import logging
 import threading
 from io import BytesIO
+from pathlib import Path
+
+# EBCDIC comes from the translate tables in build_system; an image
+# built from this directory alone falls back to the cp037 codec
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from ebcdic import decode_records, encode_records
+    EBCDIC_TABLES_AVAILABLE = True
+except ImportError:
+    EBCDIC_TABLES_AVAILABLE = False
+
+# One empty 80-byte record (EBCDIC spaces)
+BLANK_RECORD = b'\x40' * 80
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -52,15 +66,11 @@ class MVSDatasetManager:
             return False
             
         try:
-            # Convert records to EBCDIC
-            data = BytesIO()
-            for record in state_records:
-                # Pad to 80 characters and convert to EBCDIC
-                padded = record.ljust(80)
-                ebcdic_record = padded.encode('cp037')
-                data.write(ebcdic_record)
-                
-            data.seek(0)
+            # Pad to 80 characters and convert to EBCDIC
+            if EBCDIC_TABLES_AVAILABLE:
+                data = BytesIO(encode_records(state_records))
+            else:
+                data = BytesIO(b''.join(record.ljust(80).encode('cp037') for record in state_records))
             
             # Upload to dataset
             self.ftp.storbinary("STOR 'DOOM.GAMESTAT'", data)
@@ -81,20 +91,14 @@ class MVSDatasetManager:
             data = BytesIO()
             self.ftp.retrbinary("RETR 'DOOM.COMMANDS'", data.write)
             
-            # Parse EBCDIC records
-            data.seek(0)
-            raw_data = data.read()
-            commands = []
+            # Process 80-byte EBCDIC records, converted to ASCII at once
+            raw_data = data.getvalue()
+            if EBCDIC_TABLES_AVAILABLE:
+                records = decode_records(raw_data, partial=True)
+            else:
+                records = [raw_data[i:i + 80].decode('cp037') for i in range(0, len(raw_data), 80)]
+            commands = [record.strip() for record in records if record.strip()]
             
-            # Process 80-byte records
-            for i in range(0, len(raw_data), 80):
-                record = raw_data[i:i+80]
-                if record:
-                    # Convert from EBCDIC to ASCII
-                    ascii_record = record.decode('cp037').strip()
-                    if ascii_record:
-                        commands.append(ascii_record)
-                        
             logger.info(f"Downloaded {len(commands)} commands from DOOM.COMMANDS")
             return commands
             
@@ -136,7 +140,7 @@ class MVSDatasetManager:
             self.ftp.voidcmd(f"SITE TRACKS PRIMARY=5 SECONDARY=5")
             
             # Create empty dataset
-            empty_data = BytesIO(b' ' * 80)  # One blank record
+            empty_data = BytesIO(BLANK_RECORD)  # One blank record
             self.ftp.storbinary(f"STOR '{dataset_name}'", empty_data)
             
             logger.info(f"Cleared dataset {dataset_name}")
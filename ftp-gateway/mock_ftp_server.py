@@ -11,7 +11,25 @@ import tempfile
 import logging
 import threading
 import time
+import sys
+from pathlib import Path
 
+# EBCDIC comes from the translate tables in build_system; an image
+# built from this directory alone falls back to the cp037 codec
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from dataset_catalog import dataset_catalog
+    DATASET_CATALOG_AVAILABLE = True
+except ImportError:
+    DATASET_CATALOG_AVAILABLE = False
+try:
+    from ebcdic import decode_records, encode_records
+    EBCDIC_TABLES_AVAILABLE = True
+except ImportError:
+    EBCDIC_TABLES_AVAILABLE = False
+
+# One empty 80-byte record (EBCDIC spaces)
+BLANK_RECORD = b'\x40' * 80
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -19,14 +37,20 @@ logger = logging.getLogger(__name__)
 class MVSDatasetHandler(FTPHandler):
     """FTP handler that simulates MVS dataset behavior"""
     
+    # One dataset directory (and catalog) for the whole server process,
+    # so every connection sees the same datasets
+    dataset_dir = None
+    datasets = {}
+    catalog = None
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.datasets = {}
-        self.dataset_dir = tempfile.mkdtemp(prefix='mvs_datasets_')
-        logger.info(f"Dataset directory: {self.dataset_dir}")
-        
-        # Initialize standard datasets
-        self._init_datasets()
+        if MVSDatasetHandler.dataset_dir is None:
+            MVSDatasetHandler.dataset_dir = tempfile.mkdtemp(prefix='mvs_datasets_')
+            logger.info(f"Dataset directory: {self.dataset_dir}")
+            
+            # Initialize standard datasets
+            self._init_datasets()
         
     def _init_datasets(self):
         """Initialize DOOM datasets"""
@@ -38,11 +62,19 @@ class MVSDatasetHandler(FTPHandler):
             'DOOM.LOADLIB'
         ]
         
+        if DATASET_CATALOG_AVAILABLE:
+            MVSDatasetHandler.catalog = dataset_catalog(self.dataset_dir)
+            
         for ds in datasets:
             path = os.path.join(self.dataset_dir, ds.replace('.', '_'))
-            with open(path, 'wb') as f:
-                # Write empty dataset with one blank record
-                f.write(b' ' * 80)
+            if self.catalog:
+                self.catalog.define(ds, recfm='FB', lrecl=80, path=path)
+                # Empty dataset with one blank record
+                self.catalog.publish(ds, BLANK_RECORD)
+            else:
+                with open(path, 'wb') as f:
+                    # Write empty dataset with one blank record
+                    f.write(BLANK_RECORD)
             self.datasets[ds] = path
             
     def ftp_SITE(self, line):
@@ -63,18 +95,21 @@ class MVSDatasetHandler(FTPHandler):
             
     def ftp_STOR(self, file, mode='w'):
         """Store file - handle dataset names"""
-        # Clean dataset name
-        dataset = file.strip("'").upper()
+        # Clean dataset name (pyftpdlib passes it as a filesystem path)
+        dataset = os.path.basename(file).strip("'").upper()
         
         if dataset in self.datasets:
             # Store to dataset
             path = self.datasets[dataset]
             logger.info(f"Storing to dataset {dataset}")
             
+            # Cataloged datasets are mapped by readers, so uploads land in a
+            # temporary file that replaces the dataset once complete
+            if self.catalog:
+                path += '.part'
+                
             try:
-                fd = self.run_as_current_user(self.fs.open, path, 'wb')
-                self.data_channel.file_obj = fd
-                self.data_channel.enable_receiving(self._current_type)
+                super().ftp_STOR(path, mode)
                 
                 # If it's a JCL job submission
                 if dataset == 'DOOMAI' or dataset.endswith('.JCL'):
@@ -89,8 +124,8 @@ class MVSDatasetHandler(FTPHandler):
             
     def ftp_RETR(self, file):
         """Retrieve file - handle dataset names"""
-        # Clean dataset name
-        dataset = file.strip("'").upper()
+        # Clean dataset name (pyftpdlib passes it as a filesystem path)
+        dataset = os.path.basename(file).strip("'").upper()
         
         if dataset in self.datasets:
             # Retrieve from dataset
@@ -98,9 +133,11 @@ class MVSDatasetHandler(FTPHandler):
             logger.info(f"Retrieving dataset {dataset}")
             
             try:
-                fd = self.run_as_current_user(self.fs.open, path, 'rb')
-                self.data_channel.file_obj = fd
-                self.data_channel.enable_sending(self._current_type)
+                if self.catalog and self._current_type == 'i':
+                    # Binary transfers are sent as slices of the mapped dataset
+                    self.push_dtp_data(self.catalog.get(dataset).view(), cmd="RETR")
+                else:
+                    super().ftp_RETR(path)
             except Exception as e:
                 logger.error(f"RETR error: {e}")
                 self.respond(f"550 {e}")
@@ -108,6 +145,16 @@ class MVSDatasetHandler(FTPHandler):
             # Regular file retrieve
             super().ftp_RETR(file)
             
+    def on_file_received(self, file):
+        """Swap a completed dataset upload into place"""
+        if file.endswith('.part') and file[:-len('.part')] in self.datasets.values():
+            os.replace(file, file[:-len('.part')])
+            
+    def on_incomplete_file_received(self, file):
+        """Discard a partial dataset upload"""
+        if file.endswith('.part') and file[:-len('.part')] in self.datasets.values():
+            os.remove(file)
+            
     def _process_job(self, job_name):
         """Simulate job processing"""
         logger.info(f"Processing job {job_name}")
@@ -120,22 +167,20 @@ class MVSDatasetHandler(FTPHandler):
         """Simulate COBOL AI processing"""
         try:
             # Read game state
-            gamestat_path = self.datasets['DOOM.GAMESTAT']
-            with open(gamestat_path, 'rb') as f:
-                data = f.read()
+            if self.catalog:
+                data = self.catalog.get('DOOM.GAMESTAT').view()
+            else:
+                gamestat_path = self.datasets['DOOM.GAMESTAT']
+                with open(gamestat_path, 'rb') as f:
+                    data = f.read()
                 
-            # Parse state (convert from EBCDIC)
-            records = []
-            for i in range(0, len(data), 80):
-                record = data[i:i+80]
-                if record and len(record) == 80:
-                    try:
-                        ascii_record = record.decode('cp037').strip()
-                        if ascii_record:
-                            records.append(ascii_record)
-                    except:
-                        pass
-                        
+            # Parse state (whole dataset converted from EBCDIC at once)
+            if EBCDIC_TABLES_AVAILABLE:
+                texts = decode_records(data)
+            else:
+                texts = [bytes(data[i:i + 80]).decode('cp037') for i in range(0, len(data) - len(data) % 80, 80)]
+            records = [text.strip() for text in texts if text.strip()]
+            
             logger.info(f"COBOL AI: Processing {len(records)} state records")
             
             # Simple AI logic
@@ -173,14 +218,17 @@ class MVSDatasetHandler(FTPHandler):
                     "SHOOT 001"
                 ])
                 
-            # Write commands to dataset
-            commands_path = self.datasets['DOOM.COMMANDS']
-            with open(commands_path, 'wb') as f:
-                for cmd in commands:
-                    # Pad to 80 chars and convert to EBCDIC
-                    padded = cmd.ljust(80)
-                    ebcdic = padded.encode('cp037')
-                    f.write(ebcdic)
+            # Write commands to dataset: 80-byte EBCDIC records
+            if EBCDIC_TABLES_AVAILABLE:
+                data = encode_records(commands)
+            else:
+                data = b''.join(cmd.ljust(80).encode('cp037') for cmd in commands)
+            if self.catalog:
+                self.catalog.publish('DOOM.COMMANDS', data)
+            else:
+                commands_path = self.datasets['DOOM.COMMANDS']
+                with open(commands_path, 'wb') as f:
+                    f.write(data)
                     
             logger.info(f"COBOL AI: Wrote {len(commands)} commands")
             
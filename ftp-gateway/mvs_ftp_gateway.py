@@ -5,6 +5,7 @@ Handles dataset transfers between z/OS and DOOM
 """
 
 import os
+import sys
 import socket
 import threading
 import time
@@ -13,12 +14,24 @@ from datetime import datetime
 from pathlib import Path
 import struct
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'build_system'))
+
+from ebcdic import decode_records, decode_text, encode_records, iter_records, pad_record, to_ascii, to_ebcdic
+from dataset_catalog import dataset_catalog
+from gamestat_records import DISPLAY_LAYOUT, LAYOUTS, convert_layout, gamestat_codec
+from record_formats import (DESCRIPTOR_SIZE, MAX_BLKSIZE, RecordReader, block_records, dataset_lrecl,
+                            is_variable, iter_blocks, read_records, reblock, trim_record)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class MVSDataset:
-    """Represents an MVS dataset with proper formatting"""
+    """Represents an MVS dataset with proper formatting
+
+    For RECFM=V/VB, LRECL counts the 4-byte RDW, as on z/OS (LRECL=84
+    holds the same records as FB 80); trailing blanks are not stored.
+    """
     
     def __init__(self, name, recfm='FB', lrecl=80, blksize=3200):
         self.name = name
@@ -27,37 +40,81 @@ class MVSDataset:
         self.blksize = blksize
         self.records = []
         
+    @property
+    def max_length(self):
+        """Longest record data the dataset holds"""
+        return self.lrecl - 4 if is_variable(self.recfm) else self.lrecl
+        
     def add_record(self, data):
-        """Add a record, padding/truncating to LRECL"""
+        """Add a record, padding (with EBCDIC spaces) or truncating to LRECL"""
         if isinstance(data, str):
-            data = data.encode('cp037')  # EBCDIC
+            data = to_ebcdic(data)
+        if is_variable(self.recfm):
+            self.records.append(trim_record(data[:self.max_length]))
+        else:
+            self.records.append(pad_record(data, self.lrecl))
         
-        # Pad or truncate to LRECL
-        if len(data) < self.lrecl:
-            data = data + b' ' * (self.lrecl - len(data))
-        elif len(data) > self.lrecl:
-            data = data[:self.lrecl]
-            
-        self.records.append(data)
+    def add_records(self, records):
+        """Add many text records, translated to EBCDIC in one pass"""
+        fixed = iter_records(encode_records(records, self.max_length), self.max_length)
+        if is_variable(self.recfm):
+            self.records.extend(trim_record(record) for record in fixed)
+        else:
+            self.records.extend(fixed)
+        
+    def blocks(self):
+        """The dataset as BLKSIZE blocks (BDW/RDWs included for V/VB)"""
+        return iter_blocks(self.records, self.recfm, self.lrecl, self.blksize)
         
     def to_bytes(self):
         """Convert to byte stream for FTP transfer"""
         if self.recfm == 'FB':
-            # Fixed blocked - concatenate records
+            # Fixed blocked - blocks are back to back, so just concatenate
             return b''.join(self.records)
-        else:
-            # Variable format would need RDW headers
-            raise NotImplementedError("Only FB supported")
+        return block_records(self.records, self.recfm, self.lrecl, self.blksize)
             
     def from_bytes(self, data):
-        """Parse byte stream into records"""
+        """Parse byte stream into records (views into `data`, not copies)"""
+        self.records = list(read_records(data, self.recfm, self.lrecl))
+        
+    def from_text(self, data):
+        """Parse a TYPE A (ASCII) upload into EBCDIC records
+
+        Each line (LF or CRLF) is one record; text without line ends is
+        split into back-to-back records, the form a TYPE A download of
+        an FB dataset takes. Records are padded or truncated as by
+        add_records().
+        """
+        text = bytes(data).decode('latin-1')
+        if '\n' in text:
+            lines = text.split('\n')
+            if not lines[-1]:
+                lines.pop()
+            lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+        else:
+            size = self.max_length
+            lines = [text[offset:offset + size] for offset in range(0, len(text), size)]
         self.records = []
-        if self.recfm == 'FB':
-            # Split into LRECL-sized chunks
-            for i in range(0, len(data), self.lrecl):
-                record = data[i:i+self.lrecl]
-                if record:
-                    self.records.append(record)
+        self.add_records(lines)
+        
+    def converted(self, recfm, lrecl=None, blksize=None):
+        """A copy of the dataset in another record format (FB <-> VB)"""
+        dataset = MVSDataset(self.name, recfm, lrecl or dataset_lrecl(recfm, self.max_length),
+                             blksize or self.blksize)
+        for record in self.records:
+            dataset.add_record(record)
+        return dataset
+            
+    def text_records(self):
+        """Records decoded from EBCDIC, in one pass over the dataset"""
+        if is_variable(self.recfm):
+            text = decode_text(b''.join(self.records))
+            records, offset = [], 0
+            for record in self.records:
+                records.append(text[offset:offset + len(record)])
+                offset += len(record)
+            return records
+        return decode_records(self.to_bytes(), self.lrecl, partial=True)
 
 
 class MVSFTPGateway:
@@ -69,12 +126,15 @@ class MVSFTPGateway:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
-        # Pre-defined datasets
-        self.datasets = {
-            'DOOM.GAMESTAT': MVSDataset('DOOM.GAMESTAT'),
-            'DOOM.COMMANDS': MVSDataset('DOOM.COMMANDS'),
-            'DOOM.AILOG': MVSDataset('DOOM.AILOG'),
-        }
+        # Pre-defined datasets, in the catalog shared with the converter
+        # and command monitor of this process
+        self.catalog = dataset_catalog(self.data_dir)
+        for name in ('DOOM.GAMESTAT', 'DOOM.COMMANDS', 'DOOM.AILOG'):
+            self.catalog.define(name, recfm='FB', lrecl=80)
+        
+        # Datasets converted for SITE RECFM/BLKSIZE/LAYOUT, for the
+        # current generation of each dataset only
+        self.converted = {}
         
         # Active connections
         self.connections = {}
@@ -118,6 +178,9 @@ class MVSFTPGateway:
             'pwd': '/',
             'data_conn': None,
             'passive': False,
+            'recfm': None,  # SITE RECFM; None = as cataloged
+            'blksize': None,
+            'layout': None,  # SITE LAYOUT (GAMESTAT records); None = as cataloged
         }
         
         self.connections[addr] = conn_state
@@ -230,6 +293,30 @@ class MVSFTPGateway:
             
             return "550 File not found"
             
+        elif cmd == 'SITE':
+            # z/OS style dataset attributes for the following transfers
+            for option in args.upper().split():
+                key, _, value = option.partition('=')
+                if key == 'RECFM' and value in ('FB', 'VB'):
+                    state['recfm'] = value
+                elif key == 'BLKSIZE' and value.isdigit() and 0 < int(value) <= MAX_BLKSIZE:
+                    state['blksize'] = int(value)
+                elif key == 'LAYOUT' and value.lower() in LAYOUTS:
+                    state['layout'] = value.lower()
+                else:
+                    return f"501 SITE parameter not supported: {option}"
+            return "200 SITE command was accepted"
+            
+        elif cmd == 'STAT':
+            # Dataset status: the generation lets clients skip unchanged states
+            if args == 'GAMESTAT.CURRENT' or args == 'DOOM.GAMESTAT':
+                entry = self.catalog.get('DOOM.GAMESTAT')
+                if not entry:
+                    return "550 Dataset not found"
+                return (f"213 DOOM.GAMESTAT generation {entry.generation} records {entry.record_count} "
+                        f"RECFM={entry.recfm} LRECL={entry.lrecl} LAYOUT={entry.layout.upper()}")
+            return "211 MVS FTP Gateway ready"
+            
         elif cmd == 'STOR' or cmd == 'PUT':
             # Store file/dataset
             if not state['auth']:
@@ -248,20 +335,22 @@ class MVSFTPGateway:
             
     def send_gamestat(self, state, client):
         """Send current game state as MVS dataset"""
-        # Get latest COBOL-formatted state
-        gamestat_file = self.data_dir / "DOOM.GAMESTAT"
-        
-        if not gamestat_file.exists():
+        # Latest COBOL-formatted state, mapped once per generation; the
+        # publisher renames each generation into place, so this is always
+        # one complete version
+        entry = self.catalog.get('DOOM.GAMESTAT')
+        if not entry:
             # Create dummy state
-            self.create_dummy_gamestat()
+            entry = self.create_dummy_gamestat()
             
-        # Read dataset
-        dataset = self.datasets['DOOM.GAMESTAT']
-        with open(gamestat_file, 'rb') as f:
-            dataset.from_bytes(f.read())
+        # Binary (COMP/COMP-3) records have no text form
+        layout = state['layout'] or entry.layout
+        if state['type'] == 'A' and layout != DISPLAY_LAYOUT:
+            return f"550 DOOM.GAMESTAT layout {layout.upper()} needs TYPE I"
             
         # Send via data connection
-        client.send(b"150 Opening data connection\r\n")
+        client.send(f"150 Opening data connection for DOOM.GAMESTAT generation {entry.generation}"
+                    f" layout {layout.upper()}\r\n".encode())
         
         if state['passive']:
             data_conn, _ = state['data_conn'].accept()
@@ -270,24 +359,65 @@ class MVSFTPGateway:
             return "425 Cannot open data connection"
             
         try:
-            # Send dataset records
-            data = dataset.to_bytes()
-            
-            # Convert to EBCDIC if in ASCII mode
+            # Send dataset records straight from the mapping, or as
+            # converted for the SITE record format and layout
+            recfm = state['recfm'] or entry.recfm
+            data = self.dataset_bytes(entry, recfm, state['blksize'], layout)
+            # Counted as sent: conversions may change the records
+            count = sum(1 for _ in read_records(data, recfm, gamestat_codec(layout).lrecl))
+            
+            # Datasets are kept in EBCDIC; ASCII mode transfers translate
+            # them for the client, variable records as lines of text
             if state['type'] == 'A':
-                # MVS FTP expects EBCDIC
-                data = data.decode('ascii', errors='ignore').encode('cp037')
+                if is_variable(recfm):
+                    data = b''.join(to_ascii(record) + b'\r\n' for record in read_records(data, recfm))
+                else:
+                    data = to_ascii(data)
                 
-            data_conn.send(data)
+            data_conn.sendall(data)
             data_conn.close()
             
-            logger.info(f"Sent {len(dataset.records)} records")
+            logger.info(f"Sent {count} records ({len(data)} bytes, RECFM={recfm}, {layout} layout)")
             return "226 Transfer complete"
             
         except Exception as e:
             logger.error(f"Transfer error: {e}")
             return "426 Transfer aborted"
             
+    def dataset_bytes(self, entry, recfm, blksize=None, layout=None):
+        """A cataloged dataset in record format `recfm` (and GAMESTAT `layout`)
+
+        As cataloged, this is a view of the mapping; conversions are made
+        once per generation and reused by later transfers.
+        """
+        blksize = blksize or entry.blksize
+        layout = layout or entry.layout
+        if (layout == entry.layout and recfm == entry.recfm
+                and (blksize == entry.blksize or not is_variable(recfm))):
+            return entry.view()
+            
+        key = (entry.name, entry.generation, recfm, blksize, layout)
+        data = self.converted.get(key)
+        if data is None:
+            if layout == entry.layout and entry.layout == DISPLAY_LAYOUT:
+                source = MVSDataset(entry.name, entry.recfm, entry.lrecl, entry.blksize)
+                source.from_bytes(entry.view())
+                data = source.converted(recfm, blksize=blksize).to_bytes()
+            else:
+                # Fixed records of the cataloged layout, then of the
+                # requested one; binary VB records are never trimmed
+                width = entry.lrecl - DESCRIPTOR_SIZE if is_variable(entry.recfm) else entry.lrecl
+                fixed = b''.join(pad_record(record, width) for record in entry.records())
+                if layout != entry.layout:
+                    fixed = convert_layout(fixed, entry.layout, layout)
+                codec = gamestat_codec(layout)
+                data = reblock(fixed, recfm, codec.lrecl, blksize, codec.fill)
+            # Drop older generations of this dataset, not other datasets
+            self.converted = {k: v for k, v in self.converted.items()
+                              if k[0] != entry.name or k[1] == entry.generation}
+            self.converted[key] = data
+        return data
+        
     def receive_commands(self, state, client):
         """Receive command dataset from COBOL"""
         client.send(b"150 Opening data connection\r\n")
@@ -298,37 +428,39 @@ class MVSFTPGateway:
             return "425 Cannot open data connection"
             
         try:
-            # Receive data
-            data = b''
+            # Binary uploads are records in SITE RECFM, parsed as data
+            # arrives. ASCII uploads are text, translated to EBCDIC FB 80
+            # records, one per line (see MVSDataset.from_text).
+            recfm = state['recfm'] if state['type'] == 'I' and state['recfm'] else 'FB'
+            dataset = MVSDataset('DOOM.COMMANDS', recfm, dataset_lrecl(recfm, 80))
+            reader = RecordReader(dataset.recfm, dataset.lrecl)
+            text = bytearray()
             while True:
                 chunk = data_conn.recv(4096)
                 if not chunk:
                     break
-                data += chunk
+                if state['type'] == 'A':
+                    text += chunk
+                else:
+                    dataset.records.extend(reader.feed(chunk))
+            if state['type'] == 'A':
+                dataset.from_text(text)
+            else:
+                dataset.records.extend(reader.close())
                 
             data_conn.close()
             
-            # Parse as MVS dataset
-            dataset = MVSDataset('DOOM.COMMANDS')
-            
-            # Convert from EBCDIC if needed
-            if state['type'] == 'A':
-                # Convert EBCDIC to ASCII for processing
-                data = data.decode('cp037').encode('ascii')
-                
-            dataset.from_bytes(data)
+            # Stored (and processed) as FB 80
+            if is_variable(dataset.recfm):
+                dataset = dataset.converted('FB')
             
             # Save and process
-            commands_file = self.data_dir / "DOOM.COMMANDS"
-            with open(commands_file, 'wb') as f:
-                f.write(dataset.to_bytes())
+            self.catalog.publish('DOOM.COMMANDS', dataset.to_bytes(), recfm='FB', lrecl=80)
                 
             # Also save ASCII version for processing
             ascii_file = self.data_dir / "DOOM.COMMANDS.ASCII"
             with open(ascii_file, 'w') as f:
-                for record in dataset.records:
-                    # Decode from EBCDIC
-                    text = record.decode('cp037', errors='ignore')
+                for text in dataset.text_records():
                     f.write(text + '\n')
                     
             logger.info(f"Received {len(dataset.records)} command records")
@@ -347,24 +479,21 @@ class MVSFTPGateway:
         dataset = MVSDataset('DOOM.GAMESTAT')
         
         # Add sample records
-        dataset.add_record("STATE   00001234011202501010000000000000000000000000000000000000000000000000000")
-        dataset.add_record("PLAYER  +0001024+0001024+0000000+090075050A        0000000000000000000000000000")
-        dataset.add_record("AMMO    0050002001000040200000000000000000000000000000000000000000000000000000")
-        dataset.add_record("ENEMY   09100+0001200+0001100002560000        000000000000000000000000000000000")
+        dataset.add_records([
+            "STATE   00001234011202501010000000000000000000000000000000000000000000000000000",
+            "PLAYER  +0001024+0001024+0000000+090075050A        0000000000000000000000000000",
+            "AMMO    0050002001000040200000000000000000000000000000000000000000000000000000",
+            "ENEMY   09100+0001200+0001100002560000        000000000000000000000000000000000",
+        ])
         
-        # Save to file
-        gamestat_file = self.data_dir / "DOOM.GAMESTAT"
-        with open(gamestat_file, 'wb') as f:
-            f.write(dataset.to_bytes())
+        # Save to the catalog
+        return self.catalog.publish('DOOM.GAMESTAT', dataset.to_bytes(), recfm='FB', lrecl=80)
             
     def process_commands(self, dataset):
         """Process received COBOL commands"""
         commands = []
         
-        for record in dataset.records:
-            # Decode EBCDIC record
-            text = record.decode('cp037', errors='ignore')
-            
+        for text in dataset.text_records():
             # Parse DOOM-COMMAND-RECORD
             if text[:8].strip() == 'COMMAND':
                 cmd = {
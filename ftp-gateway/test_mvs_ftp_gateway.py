@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for the MVS FTP gateway datasets
+Checks how uploads become EBCDIC records, without a data connection
+"""
+
+import tempfile
+
+from mvs_ftp_gateway import MVSDataset, MVSFTPGateway
+from ebcdic import encode_records, to_ascii
+
+COMMANDS = ["COMMAND MOVE    FORWARD 00201ENEMY APPROACHING",
+            "COMMAND TURN    RIGHT   00459SCAN FOR THREATS",
+            "COMMAND SHOOT           00037DEMON IN SIGHT"]
+
+
+def test_text_upload_one_record_per_line():
+    """TYPE A lines (LF or CRLF) become blank-padded EBCDIC records"""
+    for newline in ('\n', '\r\n'):
+        dataset = MVSDataset('DOOM.COMMANDS')
+        dataset.from_text(newline.join(COMMANDS).encode('ascii') + newline.encode('ascii'))
+        assert dataset.to_bytes() == encode_records(COMMANDS)
+        assert [text.rstrip() for text in dataset.text_records()] == COMMANDS
+
+
+def test_text_upload_without_line_ends():
+    """Fixed-width text, as a TYPE A download of an FB dataset, round-trips"""
+    data = encode_records(COMMANDS)
+    dataset = MVSDataset('DOOM.COMMANDS')
+    dataset.from_text(to_ascii(data))
+    assert dataset.to_bytes() == data
+
+
+def test_text_upload_long_lines_truncated():
+    """Lines longer than LRECL are truncated, not wrapped"""
+    dataset = MVSDataset('DOOM.COMMANDS')
+    dataset.from_text(b'X' * 100 + b'\nY\n')
+    assert len(dataset.records) == 2
+    assert dataset.text_records() == ['X' * 80, 'Y'.ljust(80)]
+
+
+def test_text_upload_variable():
+    """VB datasets keep the lines without trailing blanks"""
+    dataset = MVSDataset('DOOM.COMMANDS', 'VB', 84)
+    dataset.from_text(b'SHORT   \r\nLONGER LINE\r\n')
+    assert dataset.text_records() == ['SHORT', 'LONGER LINE']
+
+
+def test_converted_cache_per_dataset():
+    """Converting one dataset keeps the others' conversions cached"""
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway = MVSFTPGateway(data_dir=tmp)
+        for name in ('DOOM.GAMESTAT', 'DOOM.AILOG'):
+            gateway.catalog.publish(name, encode_records(COMMANDS))
+        gamestat = gateway.catalog.get('DOOM.GAMESTAT')
+        ailog = gateway.catalog.get('DOOM.AILOG')
+
+        first = gateway.dataset_bytes(gamestat, 'VB', 800)
+        gateway.dataset_bytes(ailog, 'VB', 800)
+        assert gateway.dataset_bytes(gamestat, 'VB', 800) is first
+        assert len(gateway.converted) == 2
+
+        # A new generation replaces only its own dataset's conversions
+        gateway.catalog.publish('DOOM.GAMESTAT', encode_records(COMMANDS[:1]))
+        gamestat = gateway.catalog.get('DOOM.GAMESTAT')
+        assert gateway.dataset_bytes(gamestat, 'VB', 800) is not first
+        assert sorted((name, generation) for name, generation, *_ in gateway.converted) == [
+            ('DOOM.AILOG', ailog.generation), ('DOOM.GAMESTAT', gamestat.generation)]
+
+
+def main():
+    """Run tests"""
+    print("MVS FTP Gateway Test Script")
+    print("=" * 50)
+
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"  ok  {name}")
+
+    print("\nAll MVS FTP gateway tests passed")
+
+
+if __name__ == "__main__":
+    main()
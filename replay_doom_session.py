@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded DOOM session over UDP
+Re-sends captured state packets to port 31337 with their original timing
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import struct
+import sys
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from simulate_doom_udp import STATE_PORT
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / 'build_system'))
+
+from flight_recorder import list_segments, read_records
+from state_compaction import run_ticks
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TICK_OFFSET = 8  # tick field in the packet header
+
+Packet = Tuple[float, int, bytes]  # receive timestamp, tick, raw packet
+
+
+def _columns(conn, table: str):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _open_ro(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def state_paths(db_path: str) -> List[str]:
+    """The database, then its partition files oldest first"""
+    conn = _open_ro(db_path)
+    try:
+        paths = [db_path]
+        if 'partitions' in _tables(conn):
+            paths += [path for (path,) in conn.execute('SELECT path FROM partitions ORDER BY key')
+                      if os.path.exists(path)]
+        return paths
+    finally:
+        conn.close()
+
+
+def latest_session(db_path: str) -> Optional[int]:
+    """Session of the newest captured state (None for databases without sessions)"""
+    conn = _open_ro(db_path)
+    try:
+        if 'latest_state' in _tables(conn):
+            row = conn.execute('SELECT session_id FROM latest_state ORDER BY state_id DESC LIMIT 1').fetchone()
+            if row:
+                return row[0]
+    finally:
+        conn.close()
+
+    # Newest file first: partitioned databases keep few rows in the main one
+    for path in reversed(state_paths(db_path)):
+        conn = _open_ro(path)
+        try:
+            if 'session_id' not in _columns(conn, 'game_state'):
+                continue
+            row = conn.execute('SELECT session_id FROM game_state ORDER BY id DESC LIMIT 1').fetchone()
+            if row:
+                return row[0]
+        finally:
+            conn.close()
+    return None
+
+
+def recorder_latest_session(directory: str) -> Optional[int]:
+    """Session of the newest packet in a flight recorder directory"""
+    for _, path in reversed(list_segments(directory)):
+        newest = None
+        for session, _, _, _, _, _ in read_records(path):
+            newest = session
+        if newest is not None:
+            return newest
+    return None
+
+
+def db_packets(db_path: str, session_id: Optional[int] = None,
+               start_tick: Optional[int] = None, end_tick: Optional[int] = None) -> Iterator[Packet]:
+    """Stream game_state.raw_data in capture order
+
+    Partitioned databases are read one partition file at a time after
+    any rows still in the main database. Run-length rows of idle states
+    are expanded back into one packet per tick.
+    """
+    for path in state_paths(db_path):
+        conn = _open_ro(path)
+        try:
+            columns = _columns(conn, 'game_state')
+            runs = 'tick_last, timestamp_last' if 'tick_last' in columns else 'NULL, NULL'
+            where = ['raw_data IS NOT NULL']
+            params = []
+            if session_id is not None and 'session_id' in columns:
+                where.append('session_id = ?')
+                params.append(session_id)
+            if start_tick is not None:
+                where.append(f"{'COALESCE(tick_last, tick)' if 'tick_last' in columns else 'tick'} >= ?")
+                params.append(start_tick)
+            if end_tick is not None:
+                where.append('tick <= ?')
+                params.append(end_tick)
+
+            rows = conn.execute(
+                f"SELECT timestamp, tick, raw_data, {runs} FROM game_state "
+                f"WHERE {' AND '.join(where)} ORDER BY id",
+                params
+            )
+            for timestamp, tick, raw, tick_last, timestamp_last in rows:
+                if tick_last is None:
+                    yield timestamp, tick, raw
+                    continue
+                for run_tick, run_timestamp in run_ticks(tick, timestamp, tick_last, timestamp_last):
+                    if start_tick is not None and run_tick < start_tick:
+                        continue
+                    if end_tick is not None and run_tick > end_tick:
+                        break
+                    packet = bytearray(raw)
+                    struct.pack_into('<I', packet, TICK_OFFSET, run_tick & 0xFFFFFFFF)
+                    yield run_timestamp, run_tick, bytes(packet)
+        finally:
+            conn.close()
+
+
+def recorder_packets(directory: str, session_id: Optional[int] = None,
+                     start_tick: Optional[int] = None, end_tick: Optional[int] = None) -> Iterator[Packet]:
+    """Stream packets from flight recorder segments in capture order"""
+    for _, path in list_segments(directory):
+        for session, tick, received_at, payload, _, _ in read_records(path):
+            if session_id is not None and session != session_id:
+                continue
+            if start_tick is not None and tick < start_tick:
+                continue
+            if end_tick is not None and tick > end_tick:
+                continue
+            yield received_at, tick, bytes(payload)
+
+
+def session_ticks(db_path: str) -> Dict[Optional[int], Tuple[int, int]]:
+    """session id -> (first, last) tick over the database and every partition
+
+    Run-length rows count up to the last tick of their run.
+    """
+    ranges = {}
+    for path in state_paths(db_path):
+        conn = _open_ro(path)
+        try:
+            columns = _columns(conn, 'game_state')
+            session = 'session_id' if 'session_id' in columns else 'NULL'
+            last = 'COALESCE(tick_last, tick)' if 'tick_last' in columns else 'tick'
+            for session_id, first_tick, last_tick in conn.execute(
+                    f'SELECT {session}, MIN(tick), MAX({last}) FROM game_state GROUP BY {session}'):
+                if session_id in ranges:
+                    first_tick = min(first_tick, ranges[session_id][0])
+                    last_tick = max(last_tick, ranges[session_id][1])
+                ranges[session_id] = (first_tick, last_tick)
+        finally:
+            conn.close()
+    return ranges
+
+
+def list_sessions(db_path: str):
+    """Print recorded sessions with their packet counts and tick ranges"""
+    ranges = session_ticks(db_path)
+    conn = _open_ro(db_path)
+    try:
+        if 'session_id' not in _columns(conn, 'game_state'):
+            row = conn.execute('SELECT COUNT(*) FROM game_state').fetchone()
+            ticks = ranges.get(None, (None, None))
+            print(f"(no sessions) {row[0]} states, ticks {ticks[0]}-{ticks[1]}")
+            return
+
+        print("Session  Started              Packets   Ticks")
+        print("-" * 60)
+        for session_id, start_time, total in conn.execute(
+                'SELECT id, start_time, total_packets FROM sessions ORDER BY id'):
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time)) if start_time else '-'
+            ticks = ranges.get(session_id, (None, None))
+            print(f"{session_id:<8} {started:<20} {total or 0:<9} {ticks[0]}-{ticks[1]}")
+    finally:
+        conn.close()
+
+
+class SessionReplay:
+    """Re-sends a packet stream with its original inter-packet timing
+
+    `speed` scales the timing (2.0 = twice as fast); 0 sends as fast as
+    possible. Idle gaps longer than `max_gap` seconds (capture pauses,
+    menus) are shortened to `max_gap`. With `continue_ticks`, each loop
+    shifts ticks past the end of the previous one so receivers see one
+    continuous session instead of duplicates.
+    """
+
+    def __init__(self, source, host: str = '127.0.0.1', port: int = STATE_PORT,
+                 speed: float = 1.0, max_gap: Optional[float] = 5.0,
+                 loops: int = 1, continue_ticks: bool = False):
+        self.source = source  # callable returning a fresh packet iterator
+        self.address = (host, port)
+        self.speed = speed
+        self.max_gap = max_gap
+        self.loops = loops
+        self.continue_ticks = continue_ticks
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.running = False
+        self.stats = {
+            'packets_sent': 0,
+            'loops': 0,
+            'first_tick': None,
+            'last_tick': None,
+            'behind_ms_max': 0.0
+        }
+
+    def run(self):
+        """Replay until the source (and every loop) is exhausted"""
+        self.running = True
+        started = time.perf_counter()
+        tick_offset = 0
+
+        try:
+            loop = 0
+            while self.running and (self.loops == 0 or loop < self.loops):
+                first_tick, last_tick = self._replay_once(tick_offset)
+                if first_tick is None:
+                    logger.warning("Nothing to replay")
+                    break
+
+                loop += 1
+                self.stats['loops'] = loop
+                if self.continue_ticks:
+                    tick_offset += last_tick - first_tick + 1
+        finally:
+            self.socket.close()
+
+        elapsed = time.perf_counter() - started
+        self.stats['seconds'] = round(elapsed, 3)
+        self.stats['rate'] = round(self.stats['packets_sent'] / elapsed, 1) if elapsed > 0 else 0.0
+        self.stats['behind_ms_max'] = round(self.stats['behind_ms_max'], 3)
+        return self.stats
+
+    def stop(self):
+        self.running = False
+
+    def _replay_once(self, tick_offset: int):
+        """Send one pass over the source; returns its (first, last) tick"""
+        first_tick = last_tick = None
+        previous = None
+        due = time.perf_counter()
+
+        for received_at, tick, raw in self.source():
+            if not self.running:
+                break
+
+            if self.speed > 0 and previous is not None:
+                gap = max(0.0, received_at - previous)
+                if self.max_gap is not None:
+                    gap = min(gap, self.max_gap)
+                due += gap / self.speed
+
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.stats['behind_ms_max'] = max(self.stats['behind_ms_max'], -delay * 1000)
+            previous = received_at
+
+            if tick_offset:
+                raw = bytearray(raw)
+                struct.pack_into('<I', raw, TICK_OFFSET, (tick + tick_offset) & 0xFFFFFFFF)
+
+            self.socket.sendto(raw, self.address)
+            self.stats['packets_sent'] += 1
+
+            if first_tick is None:
+                first_tick = tick
+                if self.stats['first_tick'] is None:
+                    self.stats['first_tick'] = tick
+            last_tick = tick
+            self.stats['last_tick'] = tick + tick_offset
+
+        return first_tick, last_tick
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded DOOM session over UDP')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--db', default='doom_state.db', help='Capture database (game_state.raw_data)')
+    source.add_argument('--recorder-dir', help='Flight recorder segment directory')
+    parser.add_argument('--session', type=int, help='Session id to replay (default: the newest)')
+    parser.add_argument('--list', action='store_true', help='List recorded sessions and exit')
+    parser.add_argument('--host', default='127.0.0.1', help='Destination host')
+    parser.add_argument('--port', type=int, default=STATE_PORT, help='Destination UDP port')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Timing multiplier (2 = twice as fast, 0 = as fast as possible)')
+    parser.add_argument('--max-gap', type=float, default=5.0,
+                        help='Shorten idle gaps to at most N seconds (0 = keep them)')
+    parser.add_argument('--start-tick', type=int, help='Seek: skip packets before this tick')
+    parser.add_argument('--end-tick', type=int, help='Stop after this tick')
+    parser.add_argument('--loop', type=int, default=1, metavar='N',
+                        help='Replay N times (0 = until interrupted)')
+    parser.add_argument('--continue-ticks', action='store_true',
+                        help='Shift ticks on each loop so the stream stays monotonic')
+    parser.add_argument('--output', help='Write replay stats as JSON to this file')
+    args = parser.parse_args()
+
+    if args.list:
+        list_sessions(args.db)
+        return
+
+    # Sessions are separate games; replaying them interleaved over one
+    # socket would mix them into a single stream
+    if args.session is None:
+        if args.recorder_dir:
+            args.session = recorder_latest_session(args.recorder_dir)
+        else:
+            args.session = latest_session(args.db)
+
+    if args.recorder_dir:
+        def packets():
+            return recorder_packets(args.recorder_dir, args.session, args.start_tick, args.end_tick)
+        label = args.recorder_dir
+    else:
+        def packets():
+            return db_packets(args.db, args.session, args.start_tick, args.end_tick)
+        label = args.db
+
+    replay = SessionReplay(
+        packets, args.host, args.port,
+        speed=args.speed, max_gap=args.max_gap or None,
+        loops=args.loop, continue_ticks=args.continue_ticks
+    )
+
+    speed = f"{args.speed:g}x" if args.speed > 0 else "as fast as possible"
+    logger.info(f"Replaying {label} session {'-' if args.session is None else args.session} to "
+                f"{args.host}:{args.port} ({speed})")
+
+    try:
+        stats = replay.run()
+    except KeyboardInterrupt:
+        replay.stop()
+        stats = replay.stats
+
+    logger.info(
+        f"Sent {stats['packets_sent']} packets over {stats['loops']} loop(s), "
+        f"ticks {stats['first_tick']}-{stats['last_tick']}, "
+        f"{stats.get('rate', 0)}/sec, max {stats['behind_ms_max']}ms behind schedule"
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,38 +18,34 @@ STATE_PORT = 31337
 STATE_MAGIC = 0x4D4F4F44  # 'DOOM'
 STATE_VERSION = 1
 
-def send_state_packet(sock, tick, health, armor, x, y, z, angle, level=1):
-    """Send a DOOM state packet via UDP"""
-    
-    # Build packet (must match x_state.c structure)
+def build_state_packet(tick, health, armor, x, y, z, angle, level=1,
+                       kills=0, items=0, secrets=0, enemy_count=0, enemies=(),
+                       ammo=(50, 20, 100, 40), weapon=2):
+    """Build a DOOM state packet (must match x_state.c structure)"""
     packet = struct.pack('<III', STATE_MAGIC, STATE_VERSION, tick)
     
     # Player state
     packet += struct.pack('<18i',
         health,             # health
         armor,              # armor
-        50, 20, 100, 40,   # ammo (bullets, shells, cells, rockets)
-        2,                  # weapon (shotgun)
+        *ammo,              # ammo (bullets, shells, cells, rockets)
+        weapon,             # weapon (shotgun)
         int(x) & 0x7FFFFFFF,  # x position (fixed point, avoid overflow)
         int(y) & 0x7FFFFFFF,  # y position
         int(z),               # z position
         int(angle),           # angle (BAM units)
         0, 0,                 # momentum
         level,              # level
-        random.randint(0, 10),  # kills
-        random.randint(0, 5),   # items
-        random.randint(0, 2),   # secrets
-        random.randint(0, 3)    # enemy_count
+        kills,              # kills
+        items,              # items
+        secrets,            # secrets
+        enemy_count         # enemy_count
     )
     
-    # Add a couple enemies
-    for i in range(2):
-        enemy_type = random.choice([1, 2, 4, 9])  # imp, demon, zombie, etc
-        enemy_health = random.randint(20, 100)
-        enemy_x = x + (random.randint(-100, 100) << 16)
-        enemy_y = y + (random.randint(-100, 100) << 16)
-        distance = abs(random.randint(100, 500) << 16)
-        
+    # Enemy block starts after 4 bytes of padding
+    packet += b'\0' * 4
+    
+    for enemy_type, enemy_health, enemy_x, enemy_y, distance in enemies:
         packet += struct.pack('<5i',
             enemy_type,
             enemy_health,
@@ -57,10 +53,38 @@ def send_state_packet(sock, tick, health, armor, x, y, z, angle, level=1):
             int(enemy_y) & 0x7FFFFFFF,
             int(distance) & 0x7FFFFFFF
         )
+        
+    return packet
+
+
+def send_state_packet(sock, tick, health, armor, x, y, z, angle, level=1, write_state_file=True):
+    """Send a DOOM state packet via UDP"""
+    
+    # Add a couple enemies
+    enemies = []
+    for i in range(2):
+        enemy_type = random.choice([1, 2, 4, 9])  # imp, demon, zombie, etc
+        enemy_health = random.randint(20, 100)
+        enemy_x = x + (random.randint(-100, 100) << 16)
+        enemy_y = y + (random.randint(-100, 100) << 16)
+        distance = abs(random.randint(100, 500) << 16)
+        enemies.append((enemy_type, enemy_health, enemy_x, enemy_y, distance))
+    
+    packet = build_state_packet(
+        tick, health, armor, x, y, z, angle, level,
+        kills=random.randint(0, 10),
+        items=random.randint(0, 5),
+        secrets=random.randint(0, 2),
+        enemy_count=random.randint(0, 3),
+        enemies=enemies
+    )
     
     # Send packet
     sock.sendto(packet, ('localhost', STATE_PORT))
     
+    if not write_state_file:
+        return
+        
     # Also write COBOL format to file
     with open('/tmp/doom_state.dat', 'w') as f:
         f.write(f"STATE   {tick:08d}{level:02d}{int(time.time()):08d}\n")
@@ -70,6 +94,13 @@ def send_state_packet(sock, tick, health, armor, x, y, z, angle, level=1):
         f.write(f"AMMO    0050002001000040 2\n")
 
 def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='DOOM State UDP Simulator')
+    parser.add_argument('--no-state-file', action='store_true',
+                        help='Do not rewrite /tmp/doom_state.dat on every packet')
+    args = parser.parse_args()
+    
     logger.info("DOOM State UDP Simulator")
     logger.info(f"Sending to UDP port {STATE_PORT}")
     
@@ -113,7 +144,8 @@ def main():
                 armor = min(100, armor + 25)
             
             # Send state
-            send_state_packet(sock, tick, health, armor, x, y, z, angle)
+            send_state_packet(sock, tick, health, armor, x, y, z, angle,
+                              write_state_file=not args.no_state_file)
             
             if tick % 10 == 0:
                 logger.info(f"Tick {tick}: Health={health}, Pos=({x>>16},{y>>16})")
@@ -65,7 +65,7 @@ fi
 
 # Start MVS converter
 echo -e "${BLUE}Starting MVS converter...${NC}"
-python3 build_system/gamestate_to_mvs.py --monitor > logs/mvs.log 2>&1 &
+python3 build_system/gamestate_to_mvs.py --monitor --ascii > logs/mvs.log 2>&1 &
 CONVERTER_PID=$!
 sleep 2
 
@@ -9,9 +9,20 @@ import socket
 import ftplib
 import os
 import time
+import sys
 import json
 import threading
 from datetime import datetime
+from pathlib import Path
+
+# DOOM.STATE records come from the DOOMSTAT.CPY codec in build_system;
+# an image built from this directory alone falls back to fixed offsets
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'build_system'))
+try:
+    from gamestat_records import decode_summary
+    GAMESTAT_CODEC_AVAILABLE = True
+except ImportError:
+    GAMESTAT_CODEC_AVAILABLE = False
 
 app = Flask(__name__)
 
@@ -125,28 +136,31 @@ def get_game_state():
         
         if data:
             # Parse EBCDIC record
-            record = b''.join(data).decode('cp037').strip()
+            record = b''.join(data).decode('cp037')
             
             # Parse based on COBOL layout
-            state = {
-                'tick': int(record[0:9]),
-                'player_x': int(record[9:19]),
-                'player_y': int(record[19:29]),
-                'player_z': int(record[29:39]),
-                'player_angle': int(record[39:43]),
-                'health': int(record[43:46]),
-                'armor': int(record[46:49]),
-                'ammo': [
-                    int(record[49:52]),
-                    int(record[52:55]),
-                    int(record[55:58]),
-                    int(record[58:61]),
-                    int(record[61:64]),
-                    int(record[64:67])
-                ],
-                'current_weapon': int(record[67:68]),
-                'level': int(record[68:70])
-            }
+            if GAMESTAT_CODEC_AVAILABLE:
+                state = decode_summary(record)
+            else:
+                state = {
+                    'tick': int(record[0:9]),
+                    'player_x': int(record[9:19]),
+                    'player_y': int(record[19:29]),
+                    'player_z': int(record[29:39]),
+                    'player_angle': int(record[39:43]),
+                    'health': int(record[43:46]),
+                    'armor': int(record[46:49]),
+                    'ammo': [
+                        int(record[49:52]),
+                        int(record[52:55]),
+                        int(record[55:58]),
+                        int(record[58:61]),
+                        int(record[61:64]),
+                        int(record[64:67])
+                    ],
+                    'current_weapon': int(record[67:68]),
+                    'level': int(record[68:70])
+                }
             
             # Update cache
             state_cache['game_state'] = state
@@ -191,6 +205,29 @@ def check_system_status():
         state_cache['system_status']['doom'] = 'unknown'
 
 
+def attach_state_hub(hub):
+    """Feed live state into the cache from an in-process StateIngestHub"""
+    def on_state(packet):
+        state = packet.state
+        state_cache['game_state'] = {
+            'tick': state['tick'],
+            'player_x': state['x'] >> 16,
+            'player_y': state['y'] >> 16,
+            'player_z': state['z'] >> 16,
+            'player_angle': (state['angle'] * 360) // 0xFFFFFFFF,
+            'health': state['health'],
+            'armor': state['armor'],
+            'ammo': state['ammo'],
+            'current_weapon': state['weapon'],
+            'level': state['level'],
+            'enemy_count': state['enemy_count']
+        }
+        state_cache['last_update'] = datetime.now().isoformat()
+        
+    # The dashboard only ever shows the newest state
+    hub.subscribe('web-ui', on_state, maxsize=1, drop_policy='latest')
+
+
 def background_updater():
     """Background thread to update game state"""
     while True: